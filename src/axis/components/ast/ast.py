@@ -1,14 +1,15 @@
 from __future__ import annotations
 
-from pathlib import Path
+from decimal import Decimal
 from sys import intern
 from typing import Callable, Optional
 
 import lark
 from protobase import Object, traits, fields_of
 
-from axis.front.syn.val import Value
-from axis.front.syn import op
+from . import op
+from .tables import axis_lark
+from .val import Value
 
 
 class AST(traits.Cmp, traits.Hash, traits.Inmutable, traits.Repr, traits.Init):
@@ -29,14 +30,16 @@ class Span(Object, AST):
         return cls(start=ast.start_pos, end=ast.end_pos)
 
 
-class Lit[T](Object, AST):
+class Lit(Object, AST):
     prior = 0
 
-    value: T
+    # protobase resuelve las anotaciones de los campos: un parametro de tipo
+    # (Lit[T]) no se puede resolver
+    value: Value
     span: Optional[Span] = None
 
     @classmethod
-    def from_ast(cls, ast, as_type: type[T]):
+    def from_ast(cls, ast, as_type: Callable[[str], Value]):
         return cls(value=as_type(ast.value), span=Span.from_ast(ast))
 
 
@@ -101,79 +104,226 @@ class Range(Object, AST):
     end: Expr
 
 
+class Fields(Object, AST):
+    expr: Expr
+    fields: tuple[Item, ...]
+
+
+class Lambda(Object, AST):
+    parameters: Optional[Expr]
+    body: Expr
+
+
+class Assign(Object, AST):
+    target: Expr
+    value: Expr
+
+
+class Shape(Object, AST):
+    items: tuple[Item, ...]
+
+
+class Suite(Object, AST):
+    statements: tuple[Expr, ...]
+    items: tuple[Item, ...]
+
+
+class If(Object, AST):
+    condition: Expr
+    then: Suite
+    otherwise: Optional[Suite] = None
+
+
+class For(Object, AST):
+    target: Expr
+    iterable: Expr
+    body: Suite
+
+
 class Pair(Object, AST):
-    key: str
+    key: Expr
     value: Expr
 
 
 class Spread(Object, AST):
     expr: Expr
+    key: Optional[Expr] = None
 
 
-type Expr = Value | Id | Infix | Prefix | Postfix | Range | Call | Method | Index | GetAttr | Member
-type Item = Expr | Pair | Spread
+class Placeholder(Object, AST):
+    pass
 
 
-class Parser:
-    GRAMMAR_PATH: Path = Path(__file__).parent / "grammar"
-    GRAMMAR_IMPORT_PATHS: Path = [GRAMMAR_PATH]
-
-    class SyntaxTreeBuilder(lark.Transformer):
-        """Builds a syntax tree from a Lark parse tree."""
-
-        # identifiers
-        def id(self, children) -> Id:
-            return Id.from_ast(children[0])
-
-        # literals
-        def nat(self, children) -> Lit[int]:
-            return Lit.from_ast(children[0], as_type=int)
-
-        # containers
-        def tuple(self, children) -> tuple[Item, ...]:
-            return tuple(children)
-
-        # items
-        pair = Pair.builder()
-        spread = Spread.builder()
-
-        # primary expressions
-        field = GetAttr.builder()
-        method = Method.builder()
-        call = Call.builder()
-        index = Index.builder()
-
-        # expressions
-        range = Range.builder()
-
-        # operators
-        add = Infix.builder(op=op.ADD)
-        sub = Infix.builder(op=op.SUB)
-        mul = Infix.builder(op=op.MUL)
-        div = Infix.builder(op=op.DIV)
-        mod = Infix.builder(op=op.MOD)
-        pow = Infix.builder(op=op.POW)
-        bitwise_and = Infix.builder(op=op.BITWISE_AND)
-        bitwise_or = Infix.builder(op=op.BITWISE_OR)
-        bitwise_xor = Infix.builder(op=op.BITWISE_XOR)
-        bitwise_lshift = Infix.builder(op=op.BITWISE_LSHIFT)
-        bitwise_rshift = Infix.builder(op=op.BITWISE_RSHIFT)
-
-        bitwise_not = Prefix.builder(op=op.BITWISE_NOT)
-        neg = Prefix.builder(op=op.NEG)
-        not_ = Prefix.builder(op=op.NOT)
+class Wild(Object, AST):
+    pass
+
 
+class Statement(Object, AST):
+    # solo durante la construccion: Suite separa sentencias y elementos
+    expr: Expr
+
+
+type Expr = (
+    Lit
+    | Id
+    | Infix
+    | Prefix
+    | Postfix
+    | Range
+    | Call
+    | Method
+    | Index
+    | GetAttr
+    | Fields
+    | Member
+    | Lambda
+    | Assign
+    | Shape
+    | Suite
+    | If
+    | For
+    | tuple[Item, ...]
+)
+type Item = Expr | Pair | Spread | Placeholder | Wild
+
+
+def _number(text: str) -> int | Decimal:
+    try:
+        return int(text)
+    except ValueError:
+        return Decimal(text)
+
+
+class SyntaxTreeBuilder(lark.Transformer):
+    """
+    Builds a syntax tree from the rules of axis.lark. Passed inline to the LALR
+    parser, so no intermediate parse tree is built.
+    """
+
+    # identifiers
+    def id(self, children) -> Id:
+        return Id.from_ast(children[0])
+
+    # literals
+    def num(self, children) -> Lit:
+        return Lit.from_ast(children[0], as_type=_number)
+
+    # containers
+    def tuple(self, children) -> tuple[Item, ...]:
+        return tuple(children)
+
+    def shape(self, children) -> Shape:
+        return Shape(items=tuple(children))
+
+    def suite(self, children) -> Suite:
+        statements = tuple(c.expr for c in children if isinstance(c, Statement))
+        items = tuple(c for c in children if not isinstance(c, Statement | None))
+        return Suite(statements=statements, items=items)
+
+    def statement(self, children) -> None:
+        return None  # sentencia vacia
+
+    def expr(self, children) -> Statement:
+        return Statement(expr=children[0])
+
+    # items
+    def element(self, children) -> Item:
+        key, value = children
+        return value if key is None else Pair(key=key, value=value)
+
+    def spread(self, children) -> Spread:
+        key, expr = children
+        return Spread(expr=expr, key=key)
+
+    def placeholder(self, children) -> Placeholder:
+        return Placeholder()
+
+    def wild(self, children) -> Wild:
+        return Wild()
+
+    # primary expressions
+    def field(self, children) -> GetAttr:
+        expr, name = children
+        return GetAttr(expr=expr, attr=Id.from_ast(name))
+
+    def member(self, children) -> Member:
+        expr, name = children
+        return Member(expr=expr, field=Id.from_ast(name))
+
+    fields = Fields.builder()
+    check = Postfix.builder(op=op.CHECK)
+    unwrap = Postfix.builder(op=op.UNWRAP)
+
+    def apply(self, children) -> Call | Index:
+        function, argument = children
+        if isinstance(argument, Shape):
+            return Index(expr=function, index=argument.items)
+        if isinstance(argument, Suite):
+            return Call(function=function, argument=(argument,))
+        return Call(function=function, argument=argument)
+
+    def apply_bw(self, children) -> Call:
+        function, argument = children
+        return Call(function=function, argument=(argument,))
+
+    # constructs
+    range = Range.builder()
+    lambda_ = Lambda.builder()
+    assign = Assign.builder()
+    if_ = If.builder()
+    for_ = For.builder()
+
+
+class OperatorsBuilder(lark.Transformer):
+    """
+    Builders for the rules of operators.lark, imported in the `operators`
+    namespace (see lark.merge_transformers).
+    """
+
+    logic_and = Infix.builder(op=op.LOGICAL_AND)
+    logic_or = Infix.builder(op=op.LOGICAL_OR)
+
+    eq = Infix.builder(op=op.EQ)
+    neq = Infix.builder(op=op.NE)
+    diff = Infix.builder(op=op.DIFF)
+    lt = Infix.builder(op=op.LT)
+    gt = Infix.builder(op=op.GT)
+    le = Infix.builder(op=op.LE)
+    ge = Infix.builder(op=op.GE)
+
+    add = Infix.builder(op=op.ADD)
+    sub = Infix.builder(op=op.SUB)
+    mul = Infix.builder(op=op.MUL)
+    div = Infix.builder(op=op.DIV)
+    mod = Infix.builder(op=op.MOD)
+    pow = Infix.builder(op=op.POW)
+    bitwise_and = Infix.builder(op=op.BITWISE_AND)
+    bitwise_or = Infix.builder(op=op.BITWISE_OR)
+    bitwise_xor = Infix.builder(op=op.BITWISE_XOR)
+
+    neg = Prefix.builder(op=op.NEG)
+    not_ = Prefix.builder(op=op.NOT)
+
+
+# reglas cuyo nombre es una palabra reservada de Python
+for _builder, _name in (
+    (SyntaxTreeBuilder, "lambda"),
+    (SyntaxTreeBuilder, "if"),
+    (SyntaxTreeBuilder, "for"),
+    (OperatorsBuilder, "not"),
+):
+    setattr(_builder, _name, getattr(_builder, f"{_name}_"))
+
+BUILDER = lark.visitors.merge_transformers(
+    SyntaxTreeBuilder(), operators=OperatorsBuilder()
+)
+
+
+class Parser:
     def __init__(self):
-        with (self.GRAMMAR_PATH / "axis.lark").open() as grammar_file:
-            self.lark = lark.Lark(
-                grammar_file,
-                start="expr",
-                strict=True,
-                parser="lalr",
-                propagate_positions=True,
-                # transformer=self.SyntaxTreeBuilder(),
-                import_paths=[str(path) for path in self.GRAMMAR_IMPORT_PATHS],
-            )
+        # tablas LALR precompiladas y compartidas, con el arbol sintactico
+        # construido en linea por BUILDER
+        self.lark = axis_lark(BUILDER)
 
     def expr(self, text: str) -> Expr:
         return self.lark.parse(text, start="expr")
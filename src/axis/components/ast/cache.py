@@ -0,0 +1,378 @@
+"""
+Serializacion de arboles sintacticos y cache en disco de los parseos.
+
+El formato es, como el de dfg.persist, una tabla de nodos en postorden
+codificada con marshal: cada nodo distinto aparece una sola vez y los demas lo
+referencian por su indice. Los campos de cada nodo se guardan en el orden de
+`fields_of`; los valores que no son nodos son literales (None, bool, int, str,
+bytes), tuplas, Decimal y operadores (por nombre). Las raices son indices de la
+tabla, salvo las expresiones tupla, que se guardan como valor.
+
+ParseCache guarda los arboles de cada texto en un directorio bajo una clave que
+combina el hash del texto con el de la gramatica (ver tables.grammar_hash), de
+forma que cambiar la gramatica invalida todas las entradas. El tamano del
+directorio esta acotado: al superar `max_size` se eliminan las entradas usadas
+hace mas tiempo (cada acierto actualiza la fecha de modificacion de su entrada).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import marshal
+import os
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, Optional
+
+from protobase import fields_of
+
+from . import op
+from .ast import (
+    AST,
+    Assign,
+    Call,
+    Expr,
+    Fields,
+    For,
+    GetAttr,
+    Id,
+    If,
+    Index,
+    Infix,
+    Lambda,
+    Lit,
+    Member,
+    Method,
+    Pair,
+    Parser,
+    Placeholder,
+    Postfix,
+    Prefix,
+    Range,
+    Shape,
+    Span,
+    Spread,
+    Suite,
+    Wild,
+)
+from .tables import grammar_hash
+
+__all__ = [
+    "FORMAT_VERSION",
+    "dumps",
+    "loads",
+    "ParseCache",
+]
+
+FORMAT_VERSION = 1
+
+# codigo de cada tipo de nodo en la tabla: su posicion
+_NODES: tuple[type[AST], ...] = (
+    Span,
+    Lit,
+    Id,
+    Prefix,
+    Infix,
+    Postfix,
+    Call,
+    Method,
+    Index,
+    GetAttr,
+    Member,
+    Range,
+    Fields,
+    Lambda,
+    Assign,
+    Shape,
+    Suite,
+    If,
+    For,
+    Pair,
+    Spread,
+    Placeholder,
+    Wild,
+)
+_CODES = {cls: code for code, cls in enumerate(_NODES)}
+_FIELDS = tuple(tuple(fields_of(cls)) for cls in _NODES)
+
+_NONE = -1  # raiz ausente
+
+# los valores especiales se codifican como listas etiquetadas (marshal distingue
+# listas de tuplas): [indice] referencia a un nodo de la tabla
+_LITERALS = (type(None), bool, int, str, bytes)
+
+
+def _nodes(value: Any) -> Iterator[AST]:
+    if isinstance(value, tuple):
+        for item in value:
+            yield from _nodes(item)
+    elif type(value) in _CODES:
+        yield value
+
+
+def _operands(node: AST) -> Iterator[AST]:
+    for name in _FIELDS[_CODES[type(node)]]:
+        yield from _nodes(getattr(node, name))
+
+
+class _Encoder:
+    def __init__(self):
+        self.index: dict[AST, int] = {}
+        self.table: list[tuple] = []
+
+    def root(self, tree: Optional[Expr]) -> Any:
+        # las expresiones tupla (p.ej. "(a, b)") no son nodos: se guardan como
+        # valor, con sus elementos en la tabla
+        if tree is None:
+            return _NONE
+        if isinstance(tree, tuple):
+            for node in _nodes(tree):
+                self.add(node)
+            return self.value(tree)
+        return self.add(tree)
+
+    def add(self, root: AST) -> int:
+        # recorrido en postorden con pila explicita
+        stack = [(root, _operands(root))]
+        while stack:
+            node, pending = stack[-1]
+            for operand in pending:
+                if operand not in self.index:
+                    stack.append((operand, _operands(operand)))
+                    break
+            else:
+                stack.pop()
+                if node not in self.index:
+                    self.index[node] = len(self.table)
+                    self.table.append(self.record(node))
+        return self.index[root]
+
+    def record(self, node: AST) -> tuple:
+        code = _CODES[type(node)]
+        return code, *(self.value(getattr(node, name)) for name in _FIELDS[code])
+
+    def value(self, value: Any) -> Any:
+        if isinstance(value, _LITERALS):
+            return value
+        if isinstance(value, tuple):
+            return tuple(map(self.value, value))
+        if type(value) in _CODES:
+            return [self.index[value]]
+        if isinstance(value, Decimal):
+            return ["D", str(value)]
+        if isinstance(value, op.Unary | op.Binary):
+            return ["O", value.name]
+        raise TypeError(f"Cannot serialize value {value!r}")
+
+
+def _decode_value(value: Any, nodes: list[AST]) -> Any:
+    if isinstance(value, tuple):
+        return tuple(_decode_value(item, nodes) for item in value)
+    if not isinstance(value, list):
+        return value
+
+    match value:
+        case [int(index)]:
+            return nodes[index]
+        case ["D", text]:
+            return Decimal(text)
+        case ["O", name]:
+            return op.operator(name)
+    raise ValueError(f"Invalid serialized value {value!r}")
+
+
+def _decode_root(root: Any, nodes: list[AST]) -> Optional[Expr]:
+    if type(root) is not int:  # expresion tupla
+        return _decode_value(root, nodes)
+    return None if root == _NONE else nodes[root]
+
+
+def dumps(*trees: Optional[Expr]) -> bytes:
+    """
+    Serializa `trees` (None para los ausentes) en una unica tabla de nodos.
+    """
+    encoder = _Encoder()
+    roots = tuple(map(encoder.root, trees))
+    return marshal.dumps((FORMAT_VERSION, tuple(encoder.table), roots))
+
+
+def loads(data: bytes) -> list[Optional[Expr]]:
+    """
+    Reconstruye los arboles serializados con `dumps`, en el mismo orden.
+    """
+    version, table, roots = marshal.loads(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported format version {version}")
+
+    nodes: list[AST] = []
+    append = nodes.append
+    for code, *values in table:
+        fields = {}
+        for name, value in zip(_FIELDS[code], values):
+            # los literales, la mayoria de los campos, se usan tal cual
+            if type(value) is list or type(value) is tuple:
+                value = _decode_value(value, nodes)
+            fields[name] = value
+        append(_NODES[code](**fields))
+    return [_decode_root(root, nodes) for root in roots]
+
+
+class ParseCache:
+    """
+    Directorio con los arboles sintacticos de textos ya parseados.
+
+    Por defecto se usa $AXIS_CACHE_DIR/ast o ~/.cache/axis/ast. `hits` y
+    `misses` cuentan las cargas con `load(..., count=True)` que encuentran o no
+    la entrada, `evicted` las entradas eliminadas para no superar `max_size`
+    bytes.
+
+    El tamano del directorio se calcula una vez y despues se estima con lo que
+    escribe esta instancia: varios procesos sobre el mismo directorio pueden
+    superar temporalmente el limite.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_size: int = 512 * 2**20):
+        if directory is None:
+            root = os.environ.get("AXIS_CACHE_DIR") or os.path.join(
+                os.path.expanduser("~"), ".cache", "axis"
+            )
+            directory = os.path.join(root, "ast")
+        self.directory = directory
+        self.max_size = max_size
+        self.grammar = grammar_hash()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._size: Optional[int] = None
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def key(self, text: str, *context: str) -> str:
+        """
+        Hash de `text`, de la gramatica, del formato y de `context` (la regla
+        inicial, las reglas de outline...).
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{FORMAT_VERSION}:{self.grammar}".encode())
+        for part in context:
+            digest.update(b"\0" + part.encode())
+        digest.update(b"\0\0" + text.encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.ast")
+
+    def load(self, key: str, count: bool = False) -> Optional[list[Optional[Expr]]]:
+        """
+        Arboles guardados bajo `key`, o None si no estan. Con `count` la carga se
+        cuenta en `hits` o `misses`: la usa quien parsea el texto si falta.
+        """
+        trees = self._read(key)
+        if count:
+            if trees is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return trees
+
+    def _read(self, key: str) -> Optional[list[Optional[Expr]]]:
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+
+        try:
+            trees = loads(data)
+        except (ValueError, EOFError, TypeError, IndexError, KeyError):
+            return None  # corrupta u obsoleta
+        try:
+            os.utime(path)  # usada recientemente, la ultima en desalojarse
+        except OSError:
+            pass
+        return trees
+
+    def store(self, key: str, trees: Iterable[Optional[Expr]]) -> bool:
+        """
+        Guarda `trees` bajo `key`. Devuelve False si contienen valores que no se
+        pueden serializar.
+        """
+        try:
+            data = dumps(*trees)
+        except TypeError:
+            return False
+
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        # escritura atomica: otro proceso nunca lee una entrada a medias
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(data) - replaced
+        if self._size > self.max_size:
+            self.evict()
+        return True
+
+    def expr(self, text: str) -> Expr:
+        """
+        Como `Parser().expr`, pero carga el arbol del disco si ya fue parseado.
+        """
+        key = self.key(text, "expr")
+        if (trees := self.load(key, count=True)) is not None:
+            return trees[0]
+
+        tree = Parser().expr(text)
+        self.store(key, [tree])
+        return tree
+
+    def _entries(self) -> Iterator[tuple[float, int, str]]:
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".ast"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:  # desalojada por otro proceso
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def evict(self, size: Optional[int] = None):
+        """
+        Elimina las entradas usadas hace mas tiempo hasta que el directorio
+        ocupe como mucho `size` bytes (por defecto el 90% de max_size).
+        """
+        if size is None:
+            size = self.max_size * 9 // 10
+        entries = sorted(self._entries())
+        total = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in entries:
+            if total <= size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= entry_size
+            self.evicted += 1
+        self._size = total
+
+    def clear(self):
+        self.evict(0)
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.directory!r}, hits={self.hits}, "
+            f"misses={self.misses}, evicted={self.evicted})"
+        )
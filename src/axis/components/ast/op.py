@@ -2,7 +2,7 @@ from typing import Callable
 
 from protobase import Object, traits
 
-from axis.front.syn.val import Value
+from .val import Value
 
 
 class Unary(Object, traits.Inmutable, traits.Repr):
@@ -13,6 +13,9 @@ class Unary(Object, traits.Inmutable, traits.Repr):
     eval: Callable[[Value], Value]
     # priority: int
 
+    def __reduce__(self):
+        return operator, (self.name,)
+
 
 class Binary(Object, traits.Inmutable, traits.Repr):
     """An infix operator."""
@@ -21,16 +24,40 @@ class Binary(Object, traits.Inmutable, traits.Repr):
     symbol: str
     eval: Callable[[Value, Value], Value]
 
+    def __reduce__(self):
+        return operator, (self.name,)
+
+
+def operator(name: str) -> Unary | Binary:
+    """
+    Operador por nombre. Los operadores se serializan (pickle) por nombre: sus
+    funciones `eval` son lambdas.
+    """
+    return globals()[name.upper()]
+
 
 # Unary
 NOT = Unary(name="not", symbol="!", eval=lambda a: not a)
 NEG = Unary(name="neg", symbol="-", eval=lambda a: -a)
 BITWISE_NOT = Unary(name="bitwise_not", symbol="~", eval=lambda a: ~a)
 
+# Postfix
+CHECK = Unary(name="check", symbol="?", eval=lambda a: a is not None)
+UNWRAP = Unary(name="unwrap", symbol="!", eval=lambda a: a)
+
 # Logical
 LOGICAL_AND = Binary(name="logical_and", symbol="&&", eval=lambda a, b: a and b)
 LOGICAL_OR = Binary(name="logical_or", symbol="||", eval=lambda a, b: a or b)
 
+# Comparison
+EQ = Binary(name="eq", symbol="==", eval=lambda a, b: a == b)
+NE = Binary(name="ne", symbol="!=", eval=lambda a, b: a != b)
+DIFF = Binary(name="diff", symbol="<>", eval=lambda a, b: a != b)
+LT = Binary(name="lt", symbol="<", eval=lambda a, b: a < b)
+GT = Binary(name="gt", symbol=">", eval=lambda a, b: a > b)
+LE = Binary(name="le", symbol="<=", eval=lambda a, b: a <= b)
+GE = Binary(name="ge", symbol=">=", eval=lambda a, b: a >= b)
+
 # Arithmetic
 
 ADD = Binary(name="add", symbol="+", eval=lambda a, b: a + b)
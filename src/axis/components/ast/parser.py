@@ -4,24 +4,17 @@ from __future__ import annotations
 from pathlib import Path
 from sys import intern
 
-import lark
 from rich import print
 
+from axis.components.ast.tables import axis_lark
+
 GRAMMAR_PATH: Path = Path(__file__).parent / "grammar"
 GRAMMAR_IMPORT_PATHS: Path = [GRAMMAR_PATH]
 
 class Parser:
     def __init__(self):
-        with (GRAMMAR_PATH / "axis.lark").open() as grammar_file:
-            self.lark = lark.Lark(
-                grammar_file,
-                start="expr",
-                strict=True,
-                parser="lalr",
-                propagate_positions=True,
-                # transformer=self.SyntaxTreeBuilder(),
-                import_paths=[str(path) for path in GRAMMAR_IMPORT_PATHS],
-            )
+        # tablas LALR precompiladas, compartidas por todo el proceso
+        self.lark = axis_lark()
 
     def expr(self, text: str):
         ast = self.lark.parse(text, start="expr")
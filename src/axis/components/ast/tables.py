@@ -0,0 +1,163 @@
+"""
+Tablas LALR precompiladas de la gramatica de AXIS.
+
+Construir el parser de Lark a partir de axis.lark (y de los .lark que importa)
+cuesta cerca de un segundo por instancia. Las tablas se serializan con
+Lark.save en un fichero versionado cuyo nombre es un hash de todos los ficheros
+de la gramatica, de la version de Lark y de las opciones del parser, de forma
+que cualquier cambio en la gramatica produce otro fichero y los antiguos no se
+vuelven a leer.
+
+Se buscan primero en el directorio de tablas del paquete (generadas de antemano
+con `python -m axis.components.ast.tables`) y despues en el de cache del usuario
+($AXIS_CACHE_DIR o ~/.cache/axis, bajo grammar/), donde se guardan si hay que
+construirlas. `axis_lark` devuelve el parser compartido por todo el proceso.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+import lark
+
+__all__ = [
+    "GRAMMAR_PATH",
+    "TABLES_VERSION",
+    "grammar_hash",
+    "build_lark",
+    "save_tables",
+    "load_tables",
+    "load_lark",
+    "axis_lark",
+]
+
+GRAMMAR_PATH: Path = Path(__file__).parent / "grammar"
+TABLES_PATH: Path = GRAMMAR_PATH / "tables"
+TABLES_VERSION = 1
+
+LARK_OPTIONS: dict[str, Any] = dict(
+    start="expr",
+    strict=True,
+    parser="lalr",
+    propagate_positions=True,
+)
+
+_MAGIC = b"AXIS-LALR"
+
+_parsers: dict[Optional[lark.Transformer], lark.Lark] = {}
+
+
+def grammar_hash() -> str:
+    """
+    Hash de los ficheros .lark de la gramatica, la version de Lark, las opciones
+    del parser y la version del formato de las tablas.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{TABLES_VERSION}:{lark.__version__}".encode())
+    digest.update(repr(sorted(LARK_OPTIONS.items())).encode())
+    for path in sorted(GRAMMAR_PATH.glob("*.lark")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _user_directory() -> Path:
+    directory = os.environ.get("AXIS_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "axis"
+    )
+    return Path(directory) / "grammar"
+
+
+def _tables_name(key: str) -> str:
+    return f"axis-{key[:32]}.lalr"
+
+
+def build_lark(transformer: Optional[lark.Transformer] = None) -> lark.Lark:
+    """
+    Construye el parser a partir de la gramatica, sin usar las tablas. Con
+    `transformer` el parser construye en linea su resultado en lugar del arbol.
+    """
+    with (GRAMMAR_PATH / "axis.lark").open() as grammar_file:
+        return lark.Lark(
+            grammar_file,
+            import_paths=[str(GRAMMAR_PATH)],
+            **(LARK_OPTIONS | _load_options(transformer)),
+        )
+
+
+def _load_options(transformer: Optional[lark.Transformer]) -> dict[str, Any]:
+    # sin arbol no hay nodos a los que propagar posiciones: el transformer las
+    # toma de los tokens
+    return dict(transformer=transformer, propagate_positions=transformer is None)
+
+
+def save_tables(parser: lark.Lark, path: Path, key: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # escritura atomica: otro proceso nunca lee unas tablas a medias
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with temporary.open("wb") as file:
+        file.write(b"%s %d %s\n" % (_MAGIC, TABLES_VERSION, key.encode()))
+        # las tablas no dependen del transformer, que se indica al cargarlas
+        parser.save(file, exclude_options=("transformer",))
+    os.replace(temporary, path)
+
+
+def load_tables(
+    path: Path, key: str, transformer: Optional[lark.Transformer] = None
+) -> Optional[lark.Lark]:
+    """
+    Carga las tablas de `path`, o None si no existen, son de otra version o de
+    otra gramatica, o estan corruptas.
+    """
+    try:
+        with path.open("rb") as file:
+            header = file.readline().split()
+            if header != [_MAGIC, b"%d" % TABLES_VERSION, key.encode()]:
+                return None
+            # Lark.load no admite opciones; _load es lo que usa la cache de Lark
+            parser = lark.Lark.__new__(lark.Lark)
+            return parser._load(file, **_load_options(transformer))
+    except Exception:  # inexistentes o corruptas, se reconstruyen
+        return None
+
+
+def load_lark(
+    directory: Optional[Path] = None, transformer: Optional[lark.Transformer] = None
+) -> lark.Lark:
+    """
+    Parser de la gramatica cargado de las tablas precompiladas, construyendolas
+    y guardandolas en `directory` (por defecto el de cache del usuario) si no
+    existen.
+    """
+    key = grammar_hash()
+    name = _tables_name(key)
+    directory = _user_directory() if directory is None else Path(directory)
+
+    for candidate in (TABLES_PATH / name, directory / name):
+        if (parser := load_tables(candidate, key, transformer)) is not None:
+            return parser
+
+    parser = build_lark(transformer)
+    try:
+        save_tables(parser, directory / name, key)
+    except OSError:  # directorio de cache no escribible
+        pass
+    return parser
+
+
+def axis_lark(transformer: Optional[lark.Transformer] = None) -> lark.Lark:
+    """
+    Parser de Lark compartido por todo el proceso (uno por `transformer`).
+    """
+    if (parser := _parsers.get(transformer)) is None:
+        parser = _parsers[transformer] = load_lark(transformer=transformer)
+    return parser
+
+
+if __name__ == "__main__":
+    key = grammar_hash()
+    save_tables(build_lark(), TABLES_PATH / _tables_name(key), key)
+    print(TABLES_PATH / _tables_name(key))
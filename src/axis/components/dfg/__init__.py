@@ -1,3 +1,19 @@
 from .model import *
 from .eval import *
+from .loop import *
+from .linear import *
+from .batch import *
+from .cache import *
+from .transform import *
+from .dispatch import *
+from .profile import *
+from .codegen import *
+from .parallel import *
+from .aio import *
+from .persist import *
+from .store import *
+from .incremental import *
+from .analysis import *
+from .stream import *
+from .binding import *
 # from .visualization import *
@@ -0,0 +1,221 @@
+"""
+Evaluacion asincrona de un Trunk con asyncio.
+
+Las entidades del scope pueden ser funciones corutina (`async def`): cada Apply
+listo cuya funcion lo sea se lanza como tarea en cuanto sus operandos estan
+disponibles, de forma que las llamadas independientes se solapan y el grafo
+termina aproximadamente en el tiempo de su camino critico. Los nodos sincronos
+se evaluan en linea; los Apply de entidades declaradas caras en el scope
+(scope[EXPENSIVE], ver parallel) se ejecutan en un hilo con asyncio.to_thread
+para no bloquear el bucle de eventos.
+
+`concurrency` limita el numero de llamadas simultaneas de cada entidad.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from inspect import iscoroutinefunction
+from typing import Any, Coroutine, Mapping, Optional
+
+from ..tuple import Tuple
+from .analysis import graph_index
+from .dispatch import dispatcher
+from .loop import NO_LOOP_LIMITS, LoopGuard, LoopLimits, loop_step
+from .model import (
+    Apply,
+    Composition,
+    Constant,
+    Entity,
+    Leaf,
+    Loop,
+    Node,
+    Switch,
+    Trunk,
+    Use,
+)
+from .parallel import EXPENSIVE
+
+__all__ = [
+    "AsyncScheduler",
+    "eval_async",
+]
+
+_MISSING = object()
+
+
+class AsyncScheduler:
+    """
+    Evalua trunks en el bucle de eventos actual, lanzando como tareas los Apply
+    de funciones corutina, las aplicaciones de trunks y los Loop.
+    """
+
+    def __init__(
+        self,
+        scope: dict[Entity, Any],
+        concurrency: Optional[Mapping[Entity, int]] = None,
+        limits: LoopLimits = NO_LOOP_LIMITS,
+    ):
+        self.scope = scope
+        self.limits = limits
+        self.blocking = set(scope.get(EXPENSIVE, {}))
+        self.semaphores = {
+            entity: asyncio.Semaphore(limit)
+            for entity, limit in (concurrency or {}).items()
+        }
+
+    async def run(self, trunk: Trunk, argument: Any) -> Any:
+        graph = graph_index(trunk)
+        values: dict[Node, Any] = {}
+        pending = graph.indegree.copy()
+        ready = deque(graph.sources)
+        tasks: dict[asyncio.Task, Node] = {}
+
+        def release(node: Node):
+            for dependent in graph.users[node]:
+                pending[dependent] -= 1
+                if not pending[dependent]:
+                    ready.append(dependent)
+
+        try:
+            while ready or tasks:
+                while ready:
+                    node = ready.popleft()
+                    try:
+                        if (coroutine := self.start(node, values)) is not None:
+                            tasks[asyncio.ensure_future(coroutine)] = node
+                            continue
+                        values[node] = self.evaluate(node, values, argument)
+                    except Exception as e:
+                        e.add_note(f"Error while processing {node}")
+                        raise
+                    release(node)
+
+                if tasks:
+                    done, _ = await asyncio.wait(
+                        tasks, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        node = tasks.pop(task)
+                        try:
+                            values[node] = task.result()
+                        except Exception as e:
+                            e.add_note(f"Error while processing {node}")
+                            raise
+                        release(node)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return values[trunk.result]
+
+    def start(self, node: Node, values: dict[Node, Any]) -> Optional[Coroutine]:
+        """
+        Devuelve la corutina que calcula `node` si su evaluacion debe esperarse,
+        o None si se evalua en linea.
+        """
+        match node:
+            case Apply(function=function_node, argument=argument):
+                function = values[function_node]
+                argument = values[argument]
+                if isinstance(function, Trunk):
+                    return self.run(function, argument)
+
+                entity = (
+                    function_node.entity if isinstance(function_node, Use) else None
+                )
+                if iscoroutinefunction(function):
+                    return self.call(entity, function, argument)
+                if entity in self.blocking:
+                    return self.call(entity, function, argument, blocking=True)
+            case Switch(input=input, selector=selector):
+                branch = dispatcher(node).select(values[selector])
+                if isinstance(branch, Trunk):
+                    return self.run(branch, None if input is None else values[input])
+            case Loop(input=input, iteration=iteration):
+                return self.loop(iteration, None if input is None else values[input])
+        return None
+
+    async def call(
+        self,
+        entity: Optional[Entity],
+        function: Any,
+        argument: Any,
+        blocking: bool = False,
+    ) -> Any:
+        if not isinstance(argument, Tuple):
+            raise TypeError(
+                f"Invalid argument type {argument.__class__} for function {function}"
+            )
+        args, kwargs = argument.to_args()
+
+        if (semaphore := self.semaphores.get(entity)) is None:
+            if blocking:
+                return await asyncio.to_thread(function, *args, **kwargs)
+            return await function(*args, **kwargs)
+
+        async with semaphore:
+            if blocking:
+                return await asyncio.to_thread(function, *args, **kwargs)
+            return await function(*args, **kwargs)
+
+    async def loop(self, iteration: Trunk, state: Any) -> Any:
+        guard = LoopGuard(self.limits)
+        while True:
+            done, state = loop_step(await self.run(iteration, state), state)
+            if done:
+                return state
+            guard.tick()
+
+    def evaluate(self, node: Node, values: dict[Node, Any], argument: Any) -> Any:
+        match node:
+            case Leaf():
+                return argument
+            case Constant(value=value):
+                return value
+            case Use(entity=entity):
+                if (value := self.scope.get(entity, _MISSING)) is _MISSING:
+                    raise NotImplementedError(f"Use {entity} not found in scope")
+                return value
+            case Composition(inputs=inputs):
+                return inputs.map(values.__getitem__)
+            case Apply(function=function, argument=argument):
+                return self.apply(values[function], values[argument])
+            case Switch(selector=selector):
+                return values[dispatcher(node).select(values[selector])]
+            case Trunk(result=result):
+                return values[result]
+        raise TypeError(f"Invalid node type {node.__class__}")
+
+    def apply(self, function: Any, argument: Any) -> Any:
+        if callable(function):
+            if isinstance(argument, Tuple):
+                args, kwargs = argument.to_args()
+                return function(*args, **kwargs)
+
+            raise TypeError(
+                f"Invalid argument type {argument.__class__} for function {function}"
+            )
+        raise TypeError(f"Invalid function type {function.__class__}")
+
+
+async def eval_async[T](
+    trunk: Trunk,
+    argument: T,
+    /,
+    scope: dict[Entity, T],
+    concurrency: Optional[Mapping[Entity, int]] = None,
+    max_iterations: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> T:
+    """
+    Evalua `trunk` en el bucle de eventos actual, esperando concurrentemente los
+    Apply independientes de funciones corutina del scope.
+
+    `concurrency` limita las llamadas simultaneas por entidad, p.ej.
+    `{"fetch": 4}` si scope["fetch"] es una corutina de entrada/salida.
+    `max_iterations` y `timeout` limitan cada ejecucion de un Loop.
+    """
+    scheduler = AsyncScheduler(scope, concurrency, LoopLimits(max_iterations, timeout))
+    return await scheduler.run(trunk, argument)
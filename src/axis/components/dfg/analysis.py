@@ -9,14 +9,34 @@ visualizar el grafo.
 
 from __future__ import annotations
 
-from ast import Constant
 from contextlib import contextmanager
-from typing import Optional
+from typing import Any, Optional
+from weakref import WeakKeyDictionary
 
 import frozendict
 
+from axis.components.entity import know
+
 from ..tuple import Tuple
-from .model import Apply, Composition, Entity, Leaf, Loop, Node, Switch, Trunk, Use
+from .linear import operands, schedule
+from .model import (
+    Apply,
+    Composition,
+    Constant,
+    Entity,
+    Leaf,
+    Loop,
+    Node,
+    Switch,
+    Trunk,
+    Use,
+)
+
+__all__ = [
+    "WHOLE_ARGUMENT",
+    "GraphIndex",
+    "graph_index",
+]
 
 _analysis_context: AnalysisContext | None = None
 
@@ -198,3 +218,154 @@ def analyze(node: Node):
     ctx.visited(node, result)
 
     return result
+
+
+## Indice de dependencias
+
+WHOLE_ARGUMENT = "$argument"
+
+type Fields = frozenset[Any]
+
+_NO_FIELDS: Fields = frozenset()
+
+_indices: WeakKeyDictionary[Trunk, GraphIndex] = WeakKeyDictionary()
+
+
+def _field(node: Node, leaf: Leaf) -> Optional[Any]:
+    # nombre del campo de `leaf` que lee `node`, o None si no es un acceso
+    match node:
+        case Apply(
+            function=Use(entity=know.GET_ATTR), argument=Composition(inputs=inputs)
+        ) if tuple(inputs.keys()) == (0, 1):
+            source, name = inputs[0], inputs[1]
+            if source is leaf and isinstance(name, Constant):
+                return name.value
+    return None
+
+
+class GraphIndex:
+    """
+    Indice precalculado de los nodos de un trunk (sin entrar en sus trunks
+    anidados, que tienen su propio indice):
+
+    - `order`: orden topologico (el de `schedule`) y `position` de cada nodo,
+    - `operands` (use-def) y `users` (def-use), sin repetidos,
+    - `uses`: nodos Use de cada entidad,
+    - `depth`: longitud del camino mas largo desde un nodo sin operandos,
+    - `fields`: campos del argumento (Leaf) de los que depende cada nodo; un
+      know.GET_ATTR del Leaf con nombre constante depende de ese campo y el
+      Leaf de todos (WHOLE_ARGUMENT),
+    - `nested`: trunks anidados (Constant, ramas de Switch, iteraciones de Loop).
+
+    Los nodos son inmutables, por lo que el indice de un trunk nunca queda
+    obsoleto: una transformacion que reescribe el grafo produce un trunk nuevo
+    con su propio indice, y el del trunk original se libera con el.
+    """
+
+    def __init__(self, trunk: Trunk):
+        self.trunk = trunk
+        self.order: list[Node] = list(schedule(trunk))
+        self.position: dict[Node, int] = {}
+        self.operands: dict[Node, tuple[Node, ...]] = {}
+        self.users: dict[Node, list[Node]] = {}
+        self.indegree: dict[Node, int] = {}
+        self.uses: dict[Entity, list[Use]] = {}
+        self.depth: dict[Node, int] = {}
+        self.fields: dict[Node, Fields] = {}
+        self.nested: list[Trunk] = []
+
+        leaf = trunk.leaf
+        for position, node in enumerate(self.order):
+            dependencies = tuple(dict.fromkeys(operands(node)))
+            self.position[node] = position
+            self.operands[node] = dependencies
+            self.users[node] = []
+            self.indegree[node] = len(dependencies)
+            for dependency in dependencies:
+                self.users[dependency].append(node)
+
+            self.depth[node] = 1 + max(
+                (self.depth[dependency] for dependency in dependencies), default=-1
+            )
+
+            if node is leaf:
+                self.fields[node] = frozenset({WHOLE_ARGUMENT})
+            elif (field := _field(node, leaf)) is not None:
+                self.fields[node] = frozenset({field})
+            else:
+                self.fields[node] = _NO_FIELDS.union(
+                    *(self.fields[dependency] for dependency in dependencies)
+                )
+
+            match node:
+                case Use(entity=entity):
+                    self.uses.setdefault(entity, []).append(node)
+                case Constant(value=Trunk() as nested):
+                    self.nested.append(nested)
+                case Switch(branches=branches):
+                    self.nested.extend(
+                        branch
+                        for branch in branches.values()
+                        if isinstance(branch, Trunk)
+                    )
+                case Loop(iteration=iteration):
+                    self.nested.append(iteration)
+
+        self.sources: list[Node] = [
+            node for node in self.order if not self.indegree[node]
+        ]
+
+    def fan_out(self, node: Node) -> int:
+        return len(self.users[node])
+
+    def applications(self, entity: Entity) -> list[Apply]:
+        """
+        Apply cuya funcion es un Use de `entity`.
+        """
+        return [
+            user
+            for use in self.uses.get(entity, ())
+            for user in self.users[use]
+            if isinstance(user, Apply) and user.function is use
+        ]
+
+    def dependencies(self, node: Node) -> set[Node]:
+        """
+        Nodos de los que depende `node`, directa o indirectamente.
+        """
+        return self._closure(node, self.operands)
+
+    def dependents(self, node: Node) -> set[Node]:
+        """
+        Nodos que dependen de `node`, directa o indirectamente.
+        """
+        return self._closure(node, self.users)
+
+    def _closure(self, node: Node, edges: dict[Node, Any]) -> set[Node]:
+        reached = set()
+        pending = list(edges[node])
+        while pending:
+            current = pending.pop()
+            if current not in reached:
+                reached.add(current)
+                pending.extend(edges[current])
+        return reached
+
+    @property
+    def result_fields(self) -> Fields:
+        return self.fields[self.trunk.result]
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({len(self.order)} nodes, "
+            f"depth {self.depth[self.trunk.result]}, {len(self.uses)} entities)"
+        )
+
+
+def graph_index(trunk: Trunk) -> GraphIndex:
+    """
+    Devuelve el GraphIndex de `trunk`, construyendolo la primera vez.
+    """
+    if (index := _indices.get(trunk)) is None:
+        index = _indices[trunk] = GraphIndex(trunk)
+    return index
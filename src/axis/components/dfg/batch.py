@@ -0,0 +1,249 @@
+"""
+Evaluacion vectorizada de un dfg sobre columnas de NumPy.
+
+Cada atributo del Leaf se enlaza a un array, de modo que una unica evaluacion
+del grafo procesa todas las filas: los Apply que resuelven a un builtin de know
+se ejecutan como ufuncs sobre el array completo y los Switch se convierten en
+selecciones enmascaradas (np.select).
+
+Los Tuple son hash-consed y no pueden contener arrays, por lo que durante la
+evaluacion por lotes las composiciones se representan con dicts.
+"""
+
+from __future__ import annotations
+
+import operator as op
+from typing import Any, Mapping, Optional, Self
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from axis.components.entity import know
+
+from ..tuple import Tuple
+from .dispatch import Below, Condition, IsInstance, Pattern
+from .eval import Evaluator
+from .model import Apply, Composition, Entity, Switch, Trunk, Use
+
+__all__ = [
+    "BatchEvaluator",
+    "eval_batch",
+]
+
+type Columns = dict[int | str, Any]
+
+
+def _ufuncs() -> dict[Entity, Any]:
+    return {
+        know.EQ: np.equal,
+        know.NE: np.not_equal,
+        know.LT: np.less,
+        know.LE: np.less_equal,
+        know.GT: np.greater,
+        know.GE: np.greater_equal,
+        know.ADD: np.add,
+        know.SUB: np.subtract,
+        know.MUL: np.multiply,
+        know.TRUEDIV: np.true_divide,
+        know.FLOORDIV: np.floor_divide,
+        know.MOD: np.remainder,
+        know.POW: np.power,
+        know.LSHIFT: np.left_shift,
+        know.RSHIFT: np.right_shift,
+        know.AND: np.bitwise_and,
+        know.OR: np.bitwise_or,
+        know.XOR: np.bitwise_xor,
+        know.GET_ATTR: op.getitem,
+    }
+
+
+class BatchEvaluator(Evaluator[Any]):
+    """
+    Evaluator cuyos valores son columnas (arrays) en lugar de escalares.
+
+    Las entidades presentes en `ufuncs` tienen prioridad sobre el scope; el
+    resto de builtins se invocan directamente con los arrays como argumentos.
+    """
+
+    def __init__(
+        self,
+        argument: Columns,
+        parent: Optional[Self] = None,
+        scope: Optional[dict[Entity, Any]] = None,
+        ufuncs: Optional[dict[Entity, Any]] = None,
+    ):
+        super().__init__(argument, parent, scope)
+        if ufuncs is None:
+            ufuncs = parent._ufuncs if parent is not None else _ufuncs()
+        self._ufuncs = ufuncs
+
+    def process_use(self, use: Use) -> Any:
+        if (ufunc := self._ufuncs.get(use.entity)) is not None:
+            return ufunc
+        return super().process_use(use)
+
+    def process_composition(self, composition: Composition) -> Columns:
+        return {key: self(input) for key, input in composition.inputs.items()}
+
+    def process_apply(self, apply: Apply) -> Any:
+        function = self(apply.function)
+        argument = self(apply.argument)
+
+        if isinstance(function, Trunk):
+            return self.apply_trunk(function, argument)
+
+        if callable(function):
+            if isinstance(argument, dict):
+                args, kwargs = _to_args(argument)
+                return function(*args, **kwargs)
+
+            raise TypeError(
+                f"Invalid argument type {argument.__class__} for function {function}"
+            )
+        raise TypeError(f"Invalid function type {function.__class__}")
+
+    def process_switch(self, switch: Switch) -> Any:
+        selector = self(switch.selector)
+
+        if not isinstance(selector, np.ndarray) or selector.ndim == 0:
+            return super().process_switch(switch)
+
+        input = None if switch.input is None else self(switch.input)
+
+        conditions = []
+        choices = []
+        matched = np.zeros(selector.shape, dtype=bool)
+        default = None
+
+        for match, branch in switch.branches.items():
+            if match is Switch.DEFAULT:
+                default = branch
+                continue
+            # gana la primera rama que encaja: cada fila solo se asigna una vez
+            mask = _match_mask(match, selector) & ~matched
+            matched |= mask
+            conditions.append(mask)
+            choices.append(self._select_masked(branch, input, mask))
+
+        if default is not None:
+            otherwise = self._select_masked(default, input, ~matched)
+        elif not matched.all():
+            raise ValueError(
+                f"No branch matched in switch {switch} with selector "
+                f"{selector[~matched][0]}"
+            )
+        else:
+            otherwise = 0
+
+        return np.select(conditions, choices, otherwise)
+
+    def select_branch(self, switch: Switch, selector: Any) -> Any:
+        # selector escalar: los patrones comparan valores de Python
+        if isinstance(selector, np.ndarray | np.generic):
+            selector = selector.item()
+        return super().select_branch(switch, selector)
+
+    def _select_masked(self, branch: Any, input: Any, mask: np.ndarray) -> Any:
+        """
+        Evalua una rama de un Switch. Las ramas Trunk solo se evaluan sobre las
+        filas seleccionadas por `mask` y el resultado se expande a todas las filas.
+        """
+        if not isinstance(branch, Trunk):
+            return self(branch)
+
+        result = np.asarray(self.subevaluator(_take(input, mask))(branch))
+        if result.ndim == 0:
+            return result
+
+        expanded = np.zeros(mask.shape, dtype=result.dtype)
+        expanded[mask] = result
+        return expanded
+
+
+# tipo de Python de los elementos de un array, por el kind de su dtype
+_KIND_TYPES = {"b": bool, "i": int, "u": int, "f": float, "U": str, "S": bytes}
+
+
+def _elementwise(test, selector: np.ndarray) -> np.ndarray:
+    # con los valores de Python, como en la evaluacion escalar
+    values = selector.tolist()
+    return np.fromiter(map(test, values), dtype=bool, count=len(values))
+
+
+def _condition_mask(condition: Condition, selector: np.ndarray) -> np.ndarray:
+    match condition:
+        case Below(bound=bound) if selector.dtype.kind in "buif":
+            try:
+                return np.asarray(selector < bound, dtype=bool)
+            except TypeError:  # limite no numerico
+                pass
+        case IsInstance(types=types) if selector.dtype.kind in _KIND_TYPES:
+            matches = issubclass(_KIND_TYPES[selector.dtype.kind], types)
+            return np.full(selector.shape, matches)
+    return _elementwise(condition.test, selector)
+
+
+def _match_mask(match: Switch.Match, selector: np.ndarray) -> np.ndarray:
+    """
+    Filas de `selector` que encajan con la clave `match` de una rama: igualdad
+    para los literales y las condiciones de dispatch para los patrones.
+    """
+    if not isinstance(match, Pattern):
+        return np.asarray(selector == match, dtype=bool)
+
+    mask = np.ones(selector.shape, dtype=bool)
+    for condition, expected in match.conditions().items():
+        tested = _condition_mask(condition, selector)
+        mask &= tested if expected else ~tested
+    return mask
+
+
+def _to_args(columns: Columns) -> tuple[list, dict]:
+    # equivalente a Tuple.to_args, los Tuple no admiten arrays como valores
+    args = []
+    kwargs = {}
+
+    for k, v in columns.items():
+        if isinstance(k, int):
+            if k != len(args):
+                raise ValueError(
+                    "Tuple keys must be contiguous integers starting from 0."
+                )
+            args.append(v)
+        elif isinstance(k, str):
+            kwargs[k] = v
+        else:
+            raise ValueError("Tuple keys must be either integers or strings.")
+    return args, kwargs
+
+
+def _take(value: Any, mask: np.ndarray) -> Any:
+    if isinstance(value, np.ndarray) and value.shape == mask.shape:
+        return value[mask]
+    if isinstance(value, dict):
+        return {key: _take(item, mask) for key, item in value.items()}
+    return value
+
+
+def eval_batch(
+    trunk: Trunk,
+    columns: Mapping[int | str, Any] | Tuple,
+    /,
+    scope: dict[Entity, Any],
+) -> Any:
+    """
+    Evalua `trunk` una vez sobre todas las filas de `columns`, donde cada atributo
+    del argumento es un array de NumPy (o un escalar que se difunde).
+    """
+    if np is None:
+        raise ImportError("eval_batch requires numpy, install axis[batch]")
+
+    argument = {key: np.asarray(column) for key, column in columns.items()}
+
+    lengths = {len(column) for column in argument.values() if column.ndim > 0}
+    if len(lengths) > 1:
+        raise ValueError(f"Columns must have the same length, got {sorted(lengths)}")
+
+    return BatchEvaluator(argument=argument, parent=None, scope=scope)(trunk)
@@ -0,0 +1,95 @@
+"""
+Resolucion anticipada de los Use de un Trunk.
+
+Evaluator.process_use busca la entidad de un Use en el scope de cada evaluador
+de la cadena de ancestros, que crece con cada aplicacion de un trunk anidado.
+`bind` resuelve una sola vez cada Use del trunk (y de los trunks que alcanza:
+Constant, ramas de Switch, iteraciones de Loop y trunks del propio scope) a su
+valor en el scope, de forma que el evaluador lo obtiene con una unica busqueda
+sea cual sea la profundidad.
+
+Un scope congelado con `freeze` es un Environment inmutable y hashable: las
+Bindings de cada (trunk, Environment) se cachean, y `eval` las usa
+automaticamente cuando recibe un Environment como scope.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Mapping
+from weakref import WeakKeyDictionary
+
+from frozendict import frozendict
+
+from .analysis import graph_index
+from .model import Entity, Trunk, Use
+
+__all__ = [
+    "Environment",
+    "Bindings",
+    "freeze",
+    "bind",
+]
+
+type Bindings = dict[Use, Any]
+
+_bindings: WeakKeyDictionary[Trunk, dict[Environment, Bindings]] = WeakKeyDictionary()
+
+
+class Environment(frozendict):
+    """
+    Scope inmutable. Es hashable si lo son sus valores (las funciones y los
+    trunks lo son).
+    """
+
+
+def freeze(scope: Mapping[Entity, Any]) -> Environment:
+    """
+    Congela `scope` en un Environment.
+    """
+    if isinstance(scope, Environment):
+        return scope
+    return Environment(scope)
+
+
+def bind(trunk: Trunk, scope: Mapping[Entity, Any]) -> Bindings:
+    """
+    Valor de cada Use alcanzable desde `trunk` cuya entidad esta en `scope`.
+    Los Use de entidades ausentes no se enlazan y se siguen resolviendo (o
+    fallando) al evaluarlos.
+
+    Con un Environment el resultado se cachea por (trunk, scope).
+    """
+    if not isinstance(scope, Environment):
+        return _bind(trunk, scope)
+
+    if (cached := _bindings.get(trunk)) is None:
+        cached = _bindings[trunk] = {}
+    try:
+        if (bindings := cached.get(scope)) is None:
+            bindings = cached[scope] = _bind(trunk, scope)
+    except TypeError:  # valores no hashables
+        return _bind(trunk, scope)
+    return bindings
+
+
+def _bind(trunk: Trunk, scope: Mapping[Entity, Any]) -> Bindings:
+    bindings: Bindings = {}
+    visited = set()
+    pending = [trunk]
+    while pending:
+        current = pending.pop()
+        if current in visited:
+            continue
+        visited.add(current)
+
+        index = graph_index(current)
+        pending.extend(index.nested)
+        for entity, uses in index.uses.items():
+            if entity not in scope:
+                continue
+            value = scope[entity]
+            for use in uses:
+                bindings[use] = value
+            if isinstance(value, Trunk):
+                pending.append(value)
+    return bindings
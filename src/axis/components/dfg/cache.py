@@ -0,0 +1,242 @@
+"""
+Cache de resultados para aplicaciones de Trunks puros.
+
+Los Node, Tuple y Constant son hash-consed, por lo que el par (trunk, argument)
+identifica una aplicacion de forma barata y estable entre evaluaciones. Un trunk
+es puro si todas las entidades que usa (directamente o a traves de los trunks que
+aplica) estan anotadas como puras en la cache y no aplica funciones calculadas
+en tiempo de evaluacion.
+
+El resultado de un trunk puro depende ademas del valor de esas entidades en el
+scope, por lo que la clave incluye los valores que tienen en el scope de la
+evaluacion: la misma cache sirve para varios scopes (o un scope modificado) sin
+devolver resultados calculados con otras definiciones.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Collection, Iterable, Mapping, NamedTuple, Optional
+from weakref import WeakKeyDictionary
+
+from axis.components.entity import know
+
+from .model import Apply, Composition, Constant, Entity, Loop, Node, Switch, Trunk, Use
+
+__all__ = [
+    "PURE_BUILTINS",
+    "is_pure",
+    "CacheInfo",
+    "CallCache",
+]
+
+PURE_BUILTINS: frozenset[Entity] = frozenset(
+    {
+        know.EQ,
+        know.NE,
+        know.LT,
+        know.LE,
+        know.GT,
+        know.GE,
+        know.ADD,
+        know.SUB,
+        know.MUL,
+        know.TRUEDIV,
+        know.FLOORDIV,
+        know.MOD,
+        know.POW,
+        know.LSHIFT,
+        know.RSHIFT,
+        know.AND,
+        know.OR,
+        know.XOR,
+        know.GET_ATTR,
+    }
+)
+
+
+def is_pure(node: Node, pure: Collection[Entity]) -> bool:
+    """
+    Indica si evaluar `node` solo usa entidades de `pure`, incluyendo los trunks
+    que aplica, y no aplica funciones calculadas en tiempo de evaluacion.
+    """
+    return _pure_entities(node, pure) is not None
+
+
+def _pure_entities(
+    node: Node, pure: Collection[Entity]
+) -> Optional[tuple[Entity, ...]]:
+    # entidades que usa `node` si es puro, None si no lo es
+    pending: list[Node] = [node]
+    visited = set()
+    entities = set()
+
+    while pending:
+        node = pending.pop()
+        if node in visited:
+            continue
+        visited.add(node)
+
+        match node:
+            case Use(entity=entity):
+                if entity not in pure:
+                    return None
+                entities.add(entity)
+            case Constant(value=value):
+                if isinstance(value, Trunk):
+                    pending.append(value)
+            case Composition(inputs=inputs):
+                pending.extend(inputs.values())
+            case Apply(function=function, argument=argument):
+                # funciones calculadas en evaluacion pueden ser cualquier cosa
+                match function:
+                    case Use() | Constant(value=Trunk()):
+                        pass
+                    case _:
+                        return None
+                pending.append(function)
+                pending.append(argument)
+            case Switch(input=input, selector=selector, branches=branches):
+                if input is not None:
+                    pending.append(input)
+                pending.append(selector)
+                pending.extend(branches.values())
+            case Loop(input=input, iteration=iteration):
+                if input is not None:
+                    pending.append(input)
+                pending.append(iteration)
+            case Trunk(children=children, result=result):
+                pending.extend(children)
+                pending.append(result)
+
+    return tuple(entities)
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: Optional[int]
+    currsize: int
+
+
+class CallCache:
+    """
+    Cache LRU acotada de aplicaciones (trunk, argument, scope) -> resultado.
+
+    Solo se cachean aplicaciones de trunks puros con argumentos hashables; el
+    resto se evaluan siempre. Del scope solo cuentan los valores de las entidades
+    que usa el trunk, que tambien deben ser hashables. `maxsize=None` desactiva
+    el limite.
+    """
+
+    MISSING = object()
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = 1024,
+        pure: Iterable[Entity] = PURE_BUILTINS,
+    ):
+        self.maxsize = maxsize
+        self._pure = set(pure)
+        self._entities: WeakKeyDictionary[Trunk, Optional[tuple[Entity, ...]]] = (
+            WeakKeyDictionary()
+        )
+        self._results: OrderedDict[tuple[Trunk, Any, tuple], Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def mark_pure(self, *entities: Entity):
+        self._pure.update(entities)
+        self._entities.clear()
+
+    def mark_impure(self, *entities: Entity):
+        self._pure.difference_update(entities)
+        self._entities.clear()
+        # los resultados cacheados pueden depender de entidades ya no puras
+        self._results.clear()
+
+    def is_pure(self, trunk: Trunk) -> bool:
+        return self._pure_entities(trunk) is not None
+
+    def _pure_entities(self, trunk: Trunk) -> Optional[tuple[Entity, ...]]:
+        try:
+            return self._entities[trunk]
+        except KeyError:
+            entities = self._entities[trunk] = _pure_entities(trunk, self._pure)
+            return entities
+
+    def _key(
+        self, trunk: Trunk, argument: Any, scope: Optional[Mapping[Entity, Any]]
+    ) -> Optional[tuple[Trunk, Any, tuple]]:
+        if (entities := self._pure_entities(trunk)) is None:
+            return None
+        if scope is None:
+            scope = {}
+        return trunk, argument, tuple(scope.get(e, self.MISSING) for e in entities)
+
+    def get(
+        self,
+        trunk: Trunk,
+        argument: Any,
+        scope: Optional[Mapping[Entity, Any]] = None,
+    ) -> Any:
+        """
+        Devuelve el resultado de aplicar `trunk` a `argument` con `scope`, o
+        CallCache.MISSING si no esta cacheado.
+        """
+        if (key := self._key(trunk, argument, scope)) is None:
+            return self.MISSING
+
+        try:
+            result = self._results.get(key, self.MISSING)
+        except TypeError:  # argumento o valores del scope no hashables
+            return self.MISSING
+
+        if result is self.MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._results.move_to_end(key)
+
+        return result
+
+    def put(
+        self,
+        trunk: Trunk,
+        argument: Any,
+        result: Any,
+        scope: Optional[Mapping[Entity, Any]] = None,
+    ) -> Any:
+        if (key := self._key(trunk, argument, scope)) is None:
+            return result
+
+        try:
+            self._results[key] = result
+        except TypeError:  # argumento o valores del scope no hashables
+            return result
+
+        if self.maxsize is not None and len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+            self.evictions += 1
+
+        return result
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            maxsize=self.maxsize,
+            currsize=len(self._results),
+        )
+
+    def clear(self):
+        self._results.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.info()})"
@@ -0,0 +1,426 @@
+"""
+Generacion de codigo Python a partir de un Trunk.
+
+Cada nodo se traduce a una asignacion a una variable local en el orden de
+`schedule`; los Switch se emiten como if/elif con las ramas Trunk en linea y los
+Loop como while, con sus invariantes calculados antes del bucle. Las entidades
+de los Use se resuelven en el scope al crear la funcion y se enlazan como
+variables locales de la closure, y las Composition que solo son argumento de un
+Apply se convierten en una llamada directa.
+
+El codigo fuente (y su code object) se genera una vez por trunk y se cachea; cada
+llamada a `to_python` solo enlaza los valores de un scope.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from typing import Any, Callable, Optional
+from weakref import WeakKeyDictionary
+
+from ..tuple import Tuple
+from .dispatch import Pattern, dispatcher
+from .linear import loop_invariants, operands, schedule
+from .loop import LoopGuard, LoopLimits, loop_step
+from .model import (
+    Apply,
+    Composition,
+    Constant,
+    Entity,
+    Leaf,
+    Loop,
+    Node,
+    Switch,
+    Trunk,
+    Use,
+)
+
+__all__ = [
+    "python_source",
+    "to_python",
+]
+
+# numero maximo de literales que se comparan con if/elif, por encima se usa el
+# Dispatcher del Switch
+MAX_LITERAL_BRANCHES = 8
+
+# valores de soporte enlazados en todas las funciones generadas
+_RUNTIME = ("Tuple", "_apply", "_limits", "_loop_step", "_LoopGuard")
+
+_generated: WeakKeyDictionary[Trunk, _Generated] = WeakKeyDictionary()
+
+
+def _is_literal(value: Any) -> bool:
+    if value is None or isinstance(value, (bool, int, str)):
+        return True
+    return isinstance(value, float) and math.isfinite(value)
+
+
+class _Generated:
+    """
+    Codigo generado de un trunk: fuente, factoria y valores que enlaza.
+    """
+
+    def __init__(self, trunk: Trunk):
+        self.trunk = trunk
+        self.lines: list[str] = []
+        # nombre local -> ("use", entity) | ("constant", value) | ("trunk", trunk)
+        # | ("dispatcher", switch)
+        self.bindings: dict[str, tuple[str, Any]] = {}
+        self._uses: dict[Entity, str] = {}
+        self._materialized: dict[Trunk, set[Composition]] = {}
+        self._count = 0
+
+        result = self.emit_trunk(trunk, "argument", 2)
+        self.lines.append(f"        return {result}")
+
+        name = re.sub(r"\W", "_", trunk.leaf.name) or "trunk"
+        header = ["def _make(env):"]
+        header.extend(
+            f"    {local} = env[{local!r}]" for local in (*_RUNTIME, *self.bindings)
+        )
+        header.append(f"    def {name}(argument):")
+        self.source = "\n".join([*header, *self.lines, f"    return {name}", ""])
+
+        namespace = {}
+        exec(compile(self.source, f"<dfg {name}>", "exec"), namespace)
+        self.factory = namespace["_make"]
+
+    def local(self, prefix: str = "v") -> str:
+        self._count += 1
+        return f"{prefix}{self._count}"
+
+    def bind(self, kind: str, value: Any, prefix: str) -> str:
+        local = self.local(prefix)
+        self.bindings[local] = kind, value
+        return local
+
+    def emit(self, indent: int, line: str):
+        self.lines.append("    " * indent + line)
+
+    def emit_trunk(self, trunk: Trunk, leaf: str, indent: int) -> str:
+        names: dict[Node, str] = {}
+        self.emit_nodes(list(schedule(trunk)), trunk, names, {}, leaf, indent)
+        return names[trunk.result]
+
+    def materialized(self, trunk: Trunk) -> set[Composition]:
+        """
+        Composition de `trunk` que deben construirse como Tuple: las que usa algun
+        nodo distinto de un Apply que las recibe como argumentos de una llamada.
+        """
+        if (compositions := self._materialized.get(trunk)) is not None:
+            return compositions
+
+        compositions = set()
+        if isinstance(trunk.result, Composition):
+            compositions.add(trunk.result)
+        for node in schedule(trunk):
+            for operand in operands(node):
+                if isinstance(operand, Composition) and not _is_direct_call(
+                    node, operand
+                ):
+                    compositions.add(operand)
+
+        self._materialized[trunk] = compositions
+        return compositions
+
+    def emit_nodes(
+        self,
+        order: list[Node],
+        trunk: Trunk,
+        names: dict[Node, str],
+        calls: dict[Node, str],
+        leaf: str,
+        indent: int,
+    ):
+        materialized = self.materialized(trunk)
+
+        for node in order:
+            match node:
+                case Leaf():
+                    names[node] = leaf
+                case Constant(value=value):
+                    if _is_literal(value):
+                        names[node] = repr(value)
+                    else:
+                        names[node] = self.bind("constant", value, "c")
+                case Use(entity=entity):
+                    if (local := self._uses.get(entity)) is None:
+                        local = self._uses[entity] = self.bind("use", entity, "u")
+                    names[node] = local
+                case Composition(inputs=inputs):
+                    # argumentos de las llamadas directas que la reciben
+                    if (arguments := _call_arguments(inputs, names)) is not None:
+                        calls[node] = arguments
+                    if arguments is None or node in materialized:
+                        names[node] = self.assign(
+                            indent, _tuple_expression(inputs, names)
+                        )
+                case Apply(function=function, argument=argument):
+                    names[node] = self.assign(
+                        indent, self.apply_expression(function, argument, names, calls)
+                    )
+                case Switch():
+                    names[node] = self.emit_switch(node, names, indent)
+                case Loop():
+                    names[node] = self.emit_loop(node, names, indent)
+                case Trunk(result=result):
+                    names[node] = names[result]
+
+    def assign(self, indent: int, expression: str) -> str:
+        local = self.local()
+        self.emit(indent, f"{local} = {expression}")
+        return local
+
+    def apply_expression(
+        self,
+        function: Node,
+        argument: Node,
+        names: dict[Node, str],
+        calls: dict[Node, str],
+    ) -> str:
+        match function:
+            case Constant(value=Trunk() as trunk):
+                local = self.bind("trunk", trunk, "t")
+                return f"{local}({names[argument]})"
+            case Use() | Constant() if argument in calls:
+                return f"{names[function]}({calls[argument]})"
+        return f"_apply({names[function]}, {names[argument]})"
+
+    def emit_switch(self, switch: Switch, names: dict[Node, str], indent: int) -> str:
+        target = self.local()
+        selector = names[switch.selector]
+        input = "None" if switch.input is None else names[switch.input]
+
+        keys = [key for key in switch.branches if key is not Switch.DEFAULT]
+        if len(keys) <= MAX_LITERAL_BRANCHES and not any(
+            isinstance(key, Pattern) for key in keys
+        ):
+            tests = [
+                (
+                    f"{selector} == {key!r}"
+                    if _is_literal(key)
+                    else f"{selector} == {self.bind('constant', key, 'c')}"
+                )
+                for key in keys
+            ]
+        else:
+            local = self.bind("dispatcher", switch, "d")
+            index = self.assign(indent, f"{local}.index({selector})")
+            keys = dispatcher(switch).keys
+            tests = [f"{index} == {n}" for n in range(len(keys))]
+
+        for n, (key, test) in enumerate(zip(keys, tests)):
+            self.emit(indent, f"{'if' if n == 0 else 'elif'} {test}:")
+            self.emit_branch(switch.branches[key], target, names, input, indent + 1)
+
+        if (default := switch.branches.get(Switch.DEFAULT)) is not None:
+            if keys:
+                self.emit(indent, "else:")
+                self.emit_branch(default, target, names, input, indent + 1)
+            else:
+                self.emit_branch(default, target, names, input, indent)
+        elif keys:
+            self.emit(indent, "else:")
+            self.emit(
+                indent + 1,
+                "raise ValueError(f'No branch matched in switch with selector "
+                f"{{{selector}!r}}')",
+            )
+        else:
+            self.emit(indent, "raise ValueError('Switch without branches')")
+        return target
+
+    def emit_branch(
+        self,
+        branch: Node,
+        target: str,
+        names: dict[Node, str],
+        input: str,
+        indent: int,
+    ):
+        if isinstance(branch, Trunk):
+            result = self.emit_trunk(branch, input, indent)
+        else:
+            result = names[branch]
+        self.emit(indent, f"{target} = {result}")
+
+    def emit_loop(self, loop: Loop, names: dict[Node, str], indent: int) -> str:
+        iteration = loop.iteration
+        state = self.local("s")
+        done = self.local("done")
+        guard = self.local("guard")
+        self.emit(
+            indent, f"{state} = {'None' if loop.input is None else names[loop.input]}"
+        )
+
+        # los invariantes se calculan una vez, antes del bucle
+        invariants = loop_invariants(iteration)
+        order = list(schedule(iteration))
+        body: dict[Node, str] = {}
+        calls: dict[Node, str] = {}
+        self.emit_nodes(
+            [node for node in order if node in invariants],
+            iteration,
+            body,
+            calls,
+            state,
+            indent,
+        )
+
+        self.emit(indent, f"{guard} = _LoopGuard(_limits)")
+        self.emit(indent, "while True:")
+        self.emit_nodes(
+            [node for node in order if node not in invariants],
+            iteration,
+            body,
+            calls,
+            state,
+            indent + 1,
+        )
+        self.emit(
+            indent + 1,
+            f"{done}, {state} = _loop_step({body[iteration.result]}, {state})",
+        )
+        self.emit(indent + 1, f"if {done}:")
+        self.emit(indent + 2, "break")
+        self.emit(indent + 1, f"{guard}.tick()")
+        return state
+
+    def make(
+        self,
+        scope: dict[Entity, Any],
+        limits: LoopLimits,
+        converted: dict[Trunk, Callable],
+    ) -> Callable:
+        def convert(trunk: Trunk) -> Callable:
+            return _convert(trunk, scope, limits, converted)
+
+        def apply(function: Any, argument: Any) -> Any:
+            if isinstance(function, Trunk):
+                return convert(function)(argument)
+            if callable(function):
+                if isinstance(argument, Tuple):
+                    args, kwargs = argument.to_args()
+                    return function(*args, **kwargs)
+                raise TypeError(
+                    f"Invalid argument type {argument.__class__} for function {function}"
+                )
+            raise TypeError(f"Invalid function type {function.__class__}")
+
+        env = {
+            "Tuple": Tuple,
+            "_apply": apply,
+            "_limits": limits,
+            "_loop_step": loop_step,
+            "_LoopGuard": LoopGuard,
+        }
+        for local, (kind, value) in self.bindings.items():
+            match kind:
+                case "use":
+                    if value not in scope:
+                        raise NotImplementedError(f"Use {value} not found in scope")
+                    env[local] = scope[value]
+                    if isinstance(env[local], Trunk):
+                        env[local] = _as_function(convert(env[local]))
+                case "constant":
+                    env[local] = value
+                case "trunk":
+                    env[local] = convert(value)
+                case "dispatcher":
+                    env[local] = dispatcher(value)
+        return self.factory(env)
+
+
+def _is_direct_call(node: Node, composition: Composition) -> bool:
+    match node:
+        case Apply(function=Constant(value=Trunk())):
+            return False
+        case Apply(function=Use() | Constant(), argument=argument):
+            return argument is composition
+    return False
+
+
+def _call_arguments(inputs: Tuple[Node], names: dict[Node, str]) -> Optional[str]:
+    positional = []
+    keyword = []
+    for key, input in inputs.items():
+        if isinstance(key, int):
+            if key != len(positional) or keyword:
+                return None
+            positional.append(names[input])
+        elif isinstance(key, str) and key.isidentifier():
+            keyword.append(f"{key}={names[input]}")
+        else:
+            return None
+    return ", ".join(positional + keyword)
+
+
+def _tuple_expression(inputs: Tuple[Node], names: dict[Node, str]) -> str:
+    items = ", ".join(f"{key!r}: {names[input]}" for key, input in inputs.items())
+    return f"Tuple({{{items}}})"
+
+
+def _as_function(function: Callable[[Tuple], Any]) -> Callable:
+    # las llamadas directas pasan los argumentos sueltos, un trunk recibe un Tuple
+    def call(*args, **kwargs):
+        return function(Tuple.from_args(*args, **kwargs))
+
+    return call
+
+
+class _Pending:
+    """
+    Funcion de un trunk que aun se esta convirtiendo: las referencias recursivas
+    (un trunk que se llama a si mismo a traves del scope) la invocan a traves de
+    este objeto, que se completa al terminar la conversion.
+    """
+
+    __slots__ = ("function",)
+
+    def __call__(self, argument: Any) -> Any:
+        return self.function(argument)
+
+
+def _convert(
+    trunk: Trunk,
+    scope: dict[Entity, Any],
+    limits: LoopLimits,
+    converted: dict[Trunk, Callable],
+) -> Callable:
+    # cada trunk se convierte una sola vez por scope, tambien los que solo se
+    # conocen al evaluar (valores de un Apply)
+    if (function := converted.get(trunk)) is None:
+        pending = converted[trunk] = _Pending()
+        function = _generate(trunk).make(scope, limits, converted)
+        pending.function = converted[trunk] = function
+    return function
+
+
+def _generate(trunk: Trunk) -> _Generated:
+    if (generated := _generated.get(trunk)) is None:
+        generated = _generated[trunk] = _Generated(trunk)
+    return generated
+
+
+def python_source(trunk: Trunk) -> str:
+    """
+    Codigo fuente generado para `trunk`.
+    """
+    return _generate(trunk).source
+
+
+def to_python(
+    trunk: Trunk,
+    scope: dict[Entity, Any],
+    max_iterations: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Callable[[Any], Any]:
+    """
+    Devuelve una funcion Python equivalente a evaluar `trunk` en `scope`.
+
+    Las entidades se leen del scope al crear la funcion. `max_iterations` y
+    `timeout` limitan cada ejecucion de un Loop, como en `eval`.
+    """
+    return _convert(trunk, scope, LoopLimits(max_iterations, timeout), {})
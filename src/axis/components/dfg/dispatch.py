@@ -0,0 +1,363 @@
+"""
+Despacho de Switch mediante arboles de decision (ver docs/matching is dispatching.md).
+
+Las ramas de un Switch pueden ser literales (se comparan por igualdad, como en un
+dict) o patrones (Range, InstanceOf, Guard). Cada patron se reduce a un conjunto
+de condiciones con la polaridad esperada; las condiciones compartidas entre ramas
+se prueban una unica vez recorriendo un arbol de decision.
+
+Gana la primera rama, en el orden del Switch, cuyo patron encaja con el selector;
+Switch.DEFAULT se usa cuando ninguna encaja. Los literales se resuelven en una
+tabla hash precalculada (teniendo en cuenta los patrones que les preceden) y el
+resto en el arbol, cuya profundidad es logaritmica para rangos disjuntos.
+
+En cada nivel se elige la condicion de mayor peso (numero de ramas que la
+requieren, o frecuencia observada de esas ramas con `profile`) y, a igual peso,
+la que reparte las ramas de forma mas equilibrada.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Mapping, Optional
+from weakref import WeakKeyDictionary
+
+from protobase import Object, traits
+
+from ..tuple.model import MatchPattern
+from .model import Switch
+
+__all__ = [
+    "Pattern",
+    "Range",
+    "InstanceOf",
+    "Guard",
+    "Dispatcher",
+    "dispatcher",
+]
+
+_MISSING = object()
+
+_dispatchers: WeakKeyDictionary[Switch, Dispatcher] = WeakKeyDictionary()
+
+
+## Condiciones
+
+
+class Below(Object, traits.Basic):
+    """selector < bound"""
+
+    bound: Any
+
+    def test(self, value: Any) -> bool:
+        try:
+            return value < self.bound
+        except TypeError:
+            return False
+
+
+class IsInstance(Object, traits.Basic):
+    types: type | tuple[type, ...]
+
+    def test(self, value: Any) -> bool:
+        return isinstance(value, self.types)
+
+
+class Matches(Object, traits.Basic):
+    pattern: MatchPattern
+
+    def test(self, value: Any) -> bool:
+        return self.pattern.match(value) is not None
+
+
+type Condition = Below | IsInstance | Matches
+type Conditions = dict[Condition, bool]
+
+
+## Patrones
+
+
+class Pattern(Switch.MatchPatter):
+    """
+    Patron de una rama de Switch, reducido a condiciones con su polaridad.
+    """
+
+    __slots__ = ()
+
+    def conditions(self) -> Conditions:
+        raise NotImplementedError(f"conditions not implemented in {self.__class__}")
+
+    def match(self, value: Any) -> bool:
+        return all(
+            condition.test(value) == expected
+            for condition, expected in self.conditions().items()
+        )
+
+    def _key(self) -> tuple:
+        raise NotImplementedError(f"_key not implemented in {self.__class__}")
+
+    def __eq__(self, other):
+        return self.__class__ is other.__class__ and self._key() == other._key()
+
+    def __hash__(self):
+        return hash((self.__class__, self._key()))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}{self._key()!r}"
+
+
+class Range(Pattern):
+    """
+    Numeros en [lower, upper); un limite None no acota.
+    """
+
+    __slots__ = ("lower", "upper")
+
+    NUMBERS = (int, float)
+
+    def __init__(self, lower: Any = None, upper: Any = None):
+        self.lower = lower
+        self.upper = upper
+
+    def conditions(self) -> Conditions:
+        conditions = {IsInstance(types=self.NUMBERS): True}
+        if self.lower is not None:
+            conditions[Below(bound=self.lower)] = False
+        if self.upper is not None:
+            conditions[Below(bound=self.upper)] = True
+        return conditions
+
+    def _key(self) -> tuple:
+        return self.lower, self.upper
+
+
+class InstanceOf(Pattern):
+    __slots__ = ("types",)
+
+    def __init__(self, *types: type):
+        self.types = types
+
+    def conditions(self) -> Conditions:
+        return {IsInstance(types=self.types): True}
+
+    def _key(self) -> tuple:
+        return self.types
+
+
+class Guard(Pattern):
+    """
+    Encaja cuando `pattern.match(selector)` no es None.
+    """
+
+    __slots__ = ("pattern",)
+
+    def __init__(self, pattern: MatchPattern):
+        self.pattern = pattern
+
+    def conditions(self) -> Conditions:
+        return {Matches(pattern=self.pattern): True}
+
+    def _key(self) -> tuple:
+        return (self.pattern,)
+
+
+## Arbol de decision
+
+
+class Test:
+    __slots__ = ("condition", "if_true", "if_false")
+
+    def __init__(self, condition: Condition, if_true: Any, if_false: Any):
+        self.condition = condition
+        self.if_true = if_true
+        self.if_false = if_false
+
+
+type Row = tuple[Switch.Match, Conditions]
+
+
+def _decide(condition: Condition, known: Conditions) -> Optional[bool]:
+    if (value := known.get(condition)) is not None:
+        return value
+
+    # los limites conocidos deciden otras comparaciones
+    if isinstance(condition, Below):
+        for other, value in known.items():
+            if isinstance(other, Below):
+                if value and other.bound <= condition.bound:
+                    return True
+                if not value and condition.bound <= other.bound:
+                    return False
+    return None
+
+
+def _simplify(rows: list[Row], known: Conditions) -> list[Row]:
+    simplified = []
+    for key, conditions in rows:
+        remaining = {}
+        for condition, expected in conditions.items():
+            decided = _decide(condition, known)
+            if decided is None:
+                remaining[condition] = expected
+            elif decided != expected:
+                break
+        else:
+            simplified.append((key, remaining))
+    return simplified
+
+
+def _build(rows: list[Row], known: Conditions, weights: Mapping) -> Any:
+    rows = _simplify(rows, known)
+    if not rows:
+        return _MISSING
+
+    key, conditions = rows[0]
+    if not conditions:
+        return key
+
+    def weight(rows: list[Row]) -> float:
+        return sum(weights.get(key, 1) for key, _ in rows)
+
+    def required(condition: Condition) -> float:
+        return weight([row for row in rows if condition in row[1]])
+
+    def largest(condition: Condition) -> float:
+        return max(
+            weight(_simplify(rows, known | {condition: True})),
+            weight(_simplify(rows, known | {condition: False})),
+        )
+
+    # mayor peso y, entre las de mayor peso, el reparto mas equilibrado
+    candidates = list(dict.fromkeys(c for _, conditions in rows for c in conditions))
+    required_weights = {condition: required(condition) for condition in candidates}
+    heaviest = max(required_weights.values())
+    condition = min(
+        (c for c in candidates if required_weights[c] == heaviest), key=largest
+    )
+
+    return Test(
+        condition,
+        _build(rows, known | {condition: True}, weights),
+        _build(rows, known | {condition: False}, weights),
+    )
+
+
+def _depth(node: Any) -> int:
+    if isinstance(node, Test):
+        return 1 + max(_depth(node.if_true), _depth(node.if_false))
+    return 0
+
+
+class Dispatcher:
+    """
+    Seleccion compilada de la rama de un Switch.
+
+    `match` devuelve la clave de la rama que corresponde a un selector, `select`
+    su destino en `branches` e `index` su posicion en `keys`. `weights` da la
+    frecuencia relativa de cada rama para ordenar el arbol.
+    """
+
+    def __init__(
+        self,
+        branches: Mapping[Switch.Match, Any],
+        weights: Optional[Mapping[Switch.Match, float]] = None,
+    ):
+        self.branches = branches
+        self.counts: Optional[dict[Switch.Match, int]] = None
+        self.default = branches.get(Switch.DEFAULT, _MISSING)
+        self.compile(weights if weights is not None else {})
+
+    def compile(self, weights: Mapping[Switch.Match, float]):
+        # las hojas del arbol y la tabla de literales guardan indices en `keys`
+        self.keys = [key for key in self.branches if key is not Switch.DEFAULT]
+        self.targets = [self.branches[key] for key in self.keys]
+
+        # cada literal se resuelve por la primera rama que lo acepta
+        self.literals = {}
+        preceding: list[int] = []
+        for index, key in enumerate(self.keys):
+            if isinstance(key, Pattern):
+                preceding.append(index)
+            elif key not in self.literals:
+                self.literals[key] = next(
+                    (i for i in preceding if self.keys[i].match(key)), index
+                )
+
+        rows = [(index, self.keys[index].conditions()) for index in preceding]
+        indexed = {i: weights[key] for i, key in enumerate(self.keys) if key in weights}
+        self.tree = _build(rows, {}, indexed)
+
+    @property
+    def depth(self) -> int:
+        return _depth(self.tree)
+
+    def index(self, selector: Any) -> int:
+        """
+        Devuelve el indice en `keys` de la rama seleccionada o -1 para la rama
+        Switch.DEFAULT.
+        """
+        try:
+            index = self.literals.get(selector, _MISSING)
+        except TypeError:  # selector no hashable
+            index = _MISSING
+
+        if index is _MISSING:
+            node = self.tree
+            while node.__class__ is Test:
+                node = node.if_true if node.condition.test(selector) else node.if_false
+            index = node
+
+        if index is _MISSING:
+            if self.default is _MISSING:
+                raise ValueError(f"No branch matched with selector {selector}")
+            return -1
+        return index
+
+    def match(self, selector: Any) -> Switch.Match:
+        """
+        Devuelve la clave de la rama seleccionada o Switch.DEFAULT.
+        """
+        index = self.index(selector)
+        return Switch.DEFAULT if index < 0 else self.keys[index]
+
+    def select(self, selector: Any) -> Any:
+        index = self.index(selector)
+        return self.default if index < 0 else self.targets[index]
+
+    def _index_profiled(self, selector: Any) -> int:
+        index = Dispatcher.index(self, selector)
+        key = Switch.DEFAULT if index < 0 else self.keys[index]
+        self.counts[key] = self.counts.get(key, 0) + 1
+        return index
+
+    def profile(self, enabled: bool = True):
+        """
+        Activa (o desactiva) el recuento de ramas seleccionadas en `counts`.
+        """
+        if enabled:
+            if self.counts is None:
+                self.counts = {}
+            self.index = self._index_profiled
+        else:
+            self.__dict__.pop("index", None)
+
+    def reorder(self):
+        """
+        Recompila el arbol usando las frecuencias observadas como pesos.
+        """
+        if self.counts:
+            self.compile({key: count + 1 for key, count in self.counts.items()})
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({len(self.literals)} literals, "
+            f"depth {self.depth})"
+        )
+
+
+def dispatcher(switch: Switch) -> Dispatcher:
+    """
+    Devuelve el Dispatcher de un Switch, compilandolo la primera vez.
+    """
+    if (compiled := _dispatchers.get(switch)) is None:
+        compiled = _dispatchers[switch] = Dispatcher(switch.branches)
+    return compiled
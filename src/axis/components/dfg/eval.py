@@ -1,13 +1,34 @@
 from __future__ import annotations
 
-from ast import Constant
-from typing import Optional, Self
+from typing import Any, Optional, Self
 
 from ..tuple import Tuple
-from .model import Apply, Composition, Entity, Leaf, Loop, Node, Switch, Trunk, Use
-from .processor import BasicProcessor
+from .binding import Bindings, Environment, bind
+from .cache import CallCache
+from .dispatch import dispatcher
+from .linear import loop_invariants
+from .loop import NO_LOOP_LIMITS, LoopGuard, LoopLimits, loop_step
+from .model import (
+    Apply,
+    Composition,
+    Constant,
+    Entity,
+    Leaf,
+    Loop,
+    Node,
+    Switch,
+    Trunk,
+    Use,
+)
+from .processor import BasicProcessor, Step
 
-'''
+__all__ = [
+    "Evaluator",
+    "LoopRun",
+    "eval",
+]
+
+"""
 tras un nodo loop siempre podriamos contar con un switch que cortocircuita el resto 
 del programa si el loop finalizo con return, o si se alcanzo una orden raise dentro del mismo
 
@@ -15,7 +36,7 @@ este mecanismo de short-circuiting deberia ser algo generalizado en el modelo
 
 short-circuit desde un return de una funcion, retornando un continuator
 
-'''
+"""
 
 NOT_VISITED = object()
 
@@ -26,18 +47,45 @@ class Evaluator[T](BasicProcessor[T]):
         argument: T,
         parent: Optional[Self] = None,
         scope: Optional[dict[Entity, T]] = None,
+        cache: Optional[CallCache] = None,
+        limits: Optional[LoopLimits] = None,
+        bindings: Optional[Bindings] = None,
     ):
         super().__init__(parent)
         self._argument = argument
         self._scope = scope if scope is not None else {}
+        # scope de la evaluacion, el de la raiz: forma parte de la clave de la cache
+        self._globals = self._scope if parent is None else parent._globals
+        if parent is not None:
+            cache = cache if cache is not None else parent._cache
+            limits = limits if limits is not None else parent._limits
+            bindings = bindings if bindings is not None else parent._bindings
+        self._cache = cache
+        self._limits = limits if limits is not None else NO_LOOP_LIMITS
+        self._bindings = bindings
 
     def subevaluator(self, argument: T) -> Evaluator[T]:
         return self.__class__(argument, self)
 
+    def apply_trunk(self, trunk: Trunk, argument: T) -> T:
+        if (cache := self._cache) is None:
+            return self.subevaluator(argument)(trunk)
+
+        scope = self._globals
+        if (result := cache.get(trunk, argument, scope)) is CallCache.MISSING:
+            result = self.subevaluator(argument)(trunk)
+            cache.put(trunk, argument, result, scope)
+        return result
+
     def process_leaf(self, leaf: Leaf) -> T:
         return self._argument
 
     def process_use(self, use: Use) -> T:
+        # Use enlazado por `bind`: una unica busqueda sea cual sea la profundidad
+        if (bindings := self._bindings) is not None:
+            if (value := bindings.get(use, NOT_VISITED)) is not NOT_VISITED:
+                return value
+
         for ctx in self.ancestors():
             if use.entity in ctx._scope:
                 return ctx._scope[use.entity]
@@ -55,8 +103,11 @@ class Evaluator[T](BasicProcessor[T]):
         argument = self(apply.argument)
 
         if isinstance(function, Trunk):
-            return self.subevaluator(argument)(function)
+            return self.apply_trunk(function, argument)
+
+        return self.apply_function(function, argument)
 
+    def apply_function(self, function: T, argument: T) -> T:
         if callable(function):
             if isinstance(argument, Tuple):
                 args, kwargs = argument.to_args()
@@ -67,45 +118,169 @@ class Evaluator[T](BasicProcessor[T]):
             )
         raise TypeError(f"Invalid function type {function.__class__}")
 
+    def select_branch(self, switch: Switch, selector: T) -> Node:
+        return dispatcher(switch).select(selector)
+
     def process_switch(self, switch: Switch):
         selector = self(switch.selector)
-
-        ## TODO complex branch matching
-        if (branch := switch.branches.get(selector, None)) is None:
-            if (branch := switch.branches.get(Switch.DEFAULT, None)) is None:
-                raise ValueError(
-                    f"No branch matched in switch {switch} with selector {selector}"
-                )
+        branch = self.select_branch(switch, selector)
 
         if isinstance(branch, Trunk):
             input = self(switch.input)
-            return self.subevaluator(input)(branch)
+            return self.apply_trunk(branch, input)
 
         assert switch.input is None
 
         return self(branch)
 
     def process_loop(self, loop: Loop) -> T:
-        input = self(loop.input)
+        state = None if loop.input is None else self(loop.input)
 
-        while True:
-            result = self.subevaluator(input)(loop.iteration)
-            ctrl, result = result.pop("$ctrl")
-            # extrae $ctrl de result
-            if result == input:
-                break
-            input = result
+        run = LoopRun(self, loop, state)
+        while not run.advance(run.frame(loop.iteration)):
+            pass
+        return run.state
 
     def process_trunk(self, trunk: Trunk) -> T:
         for node in trunk.children:
             self(node)
         return self(trunk.result)
 
+    ## Pasos para walk, equivalentes a los process_* recursivos
+
+    def step_composition(self, composition: Composition) -> Step[T]:
+        inputs = composition.inputs
+        values = []
+        for input in inputs.values():
+            values.append((yield self, input))
+        return Tuple(dict(zip(inputs.keys(), values)))
+
+    def step_apply(self, apply: Apply) -> Step[T]:
+        function = yield self, apply.function
+        argument = yield self, apply.argument
+
+        if isinstance(function, Trunk):
+            return (yield from self.step_apply_trunk(function, argument))
+
+        return self.apply_function(function, argument)
+
+    def step_switch(self, switch: Switch) -> Step[T]:
+        selector = yield self, switch.selector
+        branch = self.select_branch(switch, selector)
+
+        if isinstance(branch, Trunk):
+            input = yield self, switch.input
+            return (yield from self.step_apply_trunk(branch, input))
+
+        assert switch.input is None
+
+        return (yield self, branch)
+
+    def step_apply_trunk(self, trunk: Trunk, argument: T) -> Step[T]:
+        if (cache := self._cache) is None:
+            return (yield self.subevaluator(argument), trunk)
+
+        scope = self._globals
+        if (result := cache.get(trunk, argument, scope)) is CallCache.MISSING:
+            result = yield self.subevaluator(argument), trunk
+            cache.put(trunk, argument, result, scope)
+        return result
+
+    def step_loop(self, loop: Loop) -> Step[T]:
+        state = None if loop.input is None else (yield self, loop.input)
+
+        run = LoopRun(self, loop, state)
+        while not run.advance((yield run.frame, loop.iteration)):
+            pass
+        return run.state
+
+    def step_trunk(self, trunk: Trunk) -> Step[T]:
+        for node in trunk.children:
+            yield self, node
+        return (yield self, trunk.result)
+
+
+class LoopRun[T]:
+    """
+    Ejecucion de un Loop sobre un unico marco (subevaluator) reutilizado entre
+    iteraciones.
+
+    Tras cada iteracion se descartan los valores visitados del marco salvo los de
+    los invariantes del loop (`loop_invariants`), que se calculan la primera vez
+    que se necesitan y se conservan el resto de iteraciones.
+    """
+
+    def __init__(self, evaluator: Evaluator[T], loop: Loop, state: T):
+        self.state = state
+        self.frame = evaluator.subevaluator(state)
+        self.invariants = loop_invariants(loop.iteration)
+        self.hoisted: dict[Node, T] = {}
+        self.guard = LoopGuard(evaluator._limits)
+
+    def advance(self, result: Any) -> bool:
+        """
+        Registra el resultado de una iteracion y prepara el marco para la
+        siguiente. Devuelve True si el loop ha terminado; su valor queda en `state`.
+        """
+        visited = self.frame._visited_nodes
+        if len(self.hoisted) < len(self.invariants):
+            self.hoisted.update(
+                (node, visited[node]) for node in self.invariants if node in visited
+            )
+
+        done, self.state = loop_step(result, self.state)
+        if done:
+            return True
+
+        self.guard.tick()
+        visited.clear()
+        visited.update(self.hoisted)
+        self.frame._argument = self.state
+        return False
+
 
 def eval[T](
     node: Node,
     argument: T,
     /,
     scope: dict[Entity, T],
+    iterative: bool = False,
+    cache: Optional[CallCache] = None,
+    max_iterations: Optional[int] = None,
+    timeout: Optional[float] = None,
 ) -> T:
-    return Evaluator(argument=argument, parent=None, scope=scope)(node)
+    """
+    Evalua `node` con `argument` como valor del Leaf.
+
+    Con `iterative=True` el grafo se recorre con una pila explicita (Processor.walk),
+    sin limite de profundidad por recursion.
+
+    Con `cache` las aplicaciones de trunks puros (incluida la evaluacion de `node`
+    si es un Trunk) se resuelven en la cache cuando ya fueron calculadas.
+
+    `max_iterations` y `timeout` (en segundos) limitan cada ejecucion de un Loop;
+    al superarlos se lanza LoopLimitError.
+
+    Si `scope` es un Environment (ver freeze) los Use de un Trunk se resuelven con
+    sus Bindings, calculadas una vez por (trunk, scope).
+    """
+    evaluator = Evaluator(
+        argument=argument,
+        parent=None,
+        scope=scope,
+        cache=cache,
+        limits=LoopLimits(max_iterations, timeout),
+        bindings=(
+            bind(node, scope)
+            if isinstance(scope, Environment) and isinstance(node, Trunk)
+            else None
+        ),
+    )
+    run = evaluator.walk if iterative else evaluator
+
+    if cache is not None and isinstance(node, Trunk):
+        if (result := cache.get(node, argument, scope)) is CallCache.MISSING:
+            result = cache.put(node, argument, run(node), scope)
+        return result
+
+    return run(node)
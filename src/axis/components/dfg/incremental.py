@@ -0,0 +1,151 @@
+"""
+Reevaluacion incremental de un Trunk cuando su argumento cambia parcialmente.
+
+Cada nodo del trunk depende de un conjunto de campos del argumento: un Apply de
+know.GET_ATTR sobre el Leaf con un nombre constante (lo que genera `Node.attr`)
+depende solo de ese campo; el propio Leaf, y cualquier otro uso del argumento
+completo, depende de todos (WHOLE_ARGUMENT). El resto de nodos une las
+dependencias de sus operandos; las ramas Trunk de un Switch, los Loop y las
+aplicaciones de trunks solo reciben valores a traves de sus operandos, por lo
+que heredan las dependencias de estos.
+
+IncrementalSession conserva los valores de la ultima evaluacion y, ante un nuevo
+argumento, invalida solo el cono de nodos que dependen de los campos que han
+cambiado. Como en CallCache, se asume que las entidades del scope son
+deterministas: un nodo limpio no se vuelve a calcular.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from ..tuple import Tuple
+from .analysis import WHOLE_ARGUMENT, graph_index
+from .cache import CallCache
+from .eval import Evaluator
+from .loop import LoopLimits
+from .model import Entity, Node, Trunk
+
+__all__ = [
+    "leaf_dependencies",
+    "IncrementalSession",
+]
+
+
+def leaf_dependencies(trunk: Trunk) -> dict[Node, frozenset[Any]]:
+    """
+    Campos del argumento de los que depende cada nodo de `trunk`, en orden de
+    evaluacion (ver GraphIndex.fields).
+    """
+    return graph_index(trunk).fields
+
+
+def changed_fields(old: Any, new: Any) -> Optional[set[Any]]:
+    """
+    Campos que difieren entre dos argumentos, o None si no son comparables campo
+    a campo (no son Tuple o no tienen las mismas claves).
+    """
+    if not (isinstance(old, Tuple) and isinstance(new, Tuple)):
+        return None if old is not new else set()
+    if old.keys() != new.keys():
+        return None
+    return {key for key in new.keys() if not _same(old[key], new[key])}
+
+
+def _same(a: Any, b: Any) -> bool:
+    if a is b:
+        return True
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):  # p.ej. arrays, que comparan elemento a elemento
+        return False
+
+
+class IncrementalSession[T]:
+    """
+    Evaluaciones sucesivas de `trunk` que solo recalculan los nodos afectados
+    por los campos del argumento que cambian:
+
+        session = IncrementalSession(trunk, scope)
+        result, recomputed = session.eval(Tuple(a=1, b=2))
+        result, recomputed = session.eval(Tuple(a=1, b=3))  # solo el cono de b
+    """
+
+    def __init__(
+        self,
+        trunk: Trunk,
+        scope: dict[Entity, T],
+        cache: Optional[CallCache] = None,
+        limits: Optional[LoopLimits] = None,
+    ):
+        self.trunk = trunk
+        self.scope = scope
+        self.cache = cache
+        self.limits = limits
+        self.dependencies = leaf_dependencies(trunk)
+        self.argument: Any = None
+        self.result: Any = None
+        self._values: Optional[dict[Node, T]] = None
+
+        # indice inverso: campo -> nodos que dependen de el, en orden de evaluacion
+        self._order = graph_index(trunk).position
+        self._readers: dict[Any, list[Node]] = {}
+        for node, fields in self.dependencies.items():
+            for field in fields:
+                self._readers.setdefault(field, []).append(node)
+
+    def dirty(self, changed: Optional[set[Any]]) -> list[Node]:
+        """
+        Nodos que dependen de `changed` (None: de cualquier campo), en orden de
+        evaluacion.
+        """
+        if changed is None:
+            return list(self.dependencies)
+        if not changed:
+            return []
+        dirty = set(self._readers.get(WHOLE_ARGUMENT, ()))
+        for field in changed:
+            dirty.update(self._readers.get(field, ()))
+        return sorted(dirty, key=self._order.__getitem__)
+
+    def eval(self, argument: T) -> tuple[T, list[Node]]:
+        """
+        Evalua el trunk con `argument`. Devuelve el resultado y los nodos
+        recalculados, en orden de evaluacion.
+        """
+        evaluator = Evaluator(
+            argument=argument,
+            parent=None,
+            scope=self.scope,
+            cache=self.cache,
+            limits=self.limits,
+        )
+
+        if (
+            self._values is None
+            or (changed := changed_fields(self.argument, argument)) is None
+        ):
+            result = evaluator(self.trunk)
+            recomputed = list(self.dependencies)
+        else:
+            dirty = self.dirty(changed)
+            values = self._values
+            for node in dirty:
+                values.pop(node, None)
+            # los operandos de cada nodo sucio estan limpios o se calcularon antes
+            evaluator._visited_nodes = values
+            for node in dirty:
+                evaluator(node)
+            result = evaluator(self.trunk.result)
+            recomputed = dirty
+
+        self.argument = argument
+        self.result = result
+        self._values = evaluator._visited_nodes
+        return result, recomputed
+
+    def invalidate(self):
+        """
+        Descarta los valores conservados; la siguiente evaluacion es completa.
+        """
+        self._values = None
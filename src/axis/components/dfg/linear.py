@@ -0,0 +1,491 @@
+"""
+Backend lineal para la evaluacion de Trunks.
+
+Un Trunk se ordena topologicamente una unica vez y se traduce a un array plano
+de instrucciones que operan sobre registros (slots de una lista) en lugar del
+diccionario de nodos visitados del Evaluator. El programa resultante se cachea
+por Trunk y se ejecuta en un bucle sin recursion por nodo; solo la aplicacion de
+un Trunk anidado crea un nuevo marco de registros.
+
+Cada instruccion es una tupla de ancho fijo (opcode, dst, a, b, c).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Collection, Iterable, Iterator, Optional
+from weakref import WeakKeyDictionary
+
+from ..tuple import Tuple
+from .cache import PURE_BUILTINS, is_pure
+from .dispatch import dispatcher
+from .loop import NO_LOOP_LIMITS, LoopGuard, LoopLimits, loop_step
+from .model import (
+    Apply,
+    Composition,
+    Constant,
+    Entity,
+    Leaf,
+    Loop,
+    Node,
+    Switch,
+    Trunk,
+    Use,
+)
+
+__all__ = [
+    "Program",
+    "operands",
+    "schedule",
+    "loop_invariants",
+    "linearize",
+    "eval_linear",
+]
+
+# opcodes
+USE = 0
+COMPOSE = 1
+CALL = 2
+APPLY = 3
+SWITCH = 4
+LOOP = 5
+
+_MISSING = object()
+
+_programs: WeakKeyDictionary[Trunk, Program] = WeakKeyDictionary()
+_invariants: WeakKeyDictionary[Trunk, frozenset[Node]] = WeakKeyDictionary()
+
+
+def operands(node: Node) -> tuple[Node, ...]:
+    """
+    Nodos de los que depende directamente `node` dentro de su trunk.
+
+    Las ramas Trunk de un Switch, los Trunk de las Constant y la iteracion de un
+    Loop no son operandos: se evaluan en su propio marco.
+    """
+    match node:
+        case Composition(inputs=inputs):
+            return tuple(inputs.values())
+        case Apply(function=function, argument=argument):
+            return function, argument
+        case Switch(input=input, selector=selector, branches=branches):
+            branch_nodes = tuple(
+                branch for branch in branches.values() if not isinstance(branch, Trunk)
+            )
+            if input is None:
+                return (selector, *branch_nodes)
+            return (input, selector, *branch_nodes)
+        case Loop(input=input):
+            return () if input is None else (input,)
+        case Trunk(children=children, result=result):
+            return (*children, result)
+    return ()
+
+
+def schedule(trunk: Trunk) -> Iterator[Node]:
+    """
+    Recorre los nodos de un trunk en orden topologico (post-orden desde cada
+    children y finalmente desde result) sin repetir nodos.
+
+    El orden coincide con el orden de evaluacion del Evaluator recursivo
+    (function antes que argument), por lo que los efectos laterales se preservan.
+    Los Trunk alcanzados directamente como nodo se expanden en linea.
+    """
+    visited = set()
+
+    for root in (*trunk.children, trunk.result):
+        if root in visited:
+            continue
+        visited.add(root)
+        stack = [(root, iter(operands(root)))]
+        while stack:
+            node, pending = stack[-1]
+            for operand in pending:
+                if operand not in visited:
+                    visited.add(operand)
+                    stack.append((operand, iter(operands(operand))))
+                    break
+            else:
+                stack.pop()
+                yield node
+
+
+def _hoistable(node: Node, pure: Collection[Entity]) -> bool:
+    # pureza del propio nodo, sin considerar sus operandos
+    match node:
+        case Leaf():
+            return False
+        case Use(entity=entity):
+            return entity in pure
+        case Apply(function=Use()):
+            return True
+        case Apply(function=Constant(value=Trunk() as trunk)):
+            return is_pure(trunk, pure)
+        case Apply():
+            return False
+        case Switch(branches=branches):
+            return all(
+                is_pure(branch, pure)
+                for branch in branches.values()
+                if isinstance(branch, Trunk)
+            )
+        case Loop(iteration=iteration):
+            return is_pure(iteration, pure)
+    return True
+
+
+def loop_invariants(
+    trunk: Trunk, pure: Collection[Entity] = PURE_BUILTINS
+) -> frozenset[Node]:
+    """
+    Nodos de `trunk` que no dependen de su leaf y cuya evaluacion es pura: su
+    valor es el mismo en todas las iteraciones de un Loop y puede calcularse una
+    unica vez.
+    """
+    cached = pure is PURE_BUILTINS
+    if cached and (invariants := _invariants.get(trunk)) is not None:
+        return invariants
+
+    hoistable: set[Node] = set()
+    for node in schedule(trunk):
+        if _hoistable(node, pure) and all(op in hoistable for op in operands(node)):
+            hoistable.add(node)
+
+    invariants = frozenset(hoistable)
+    if cached:
+        _invariants[trunk] = invariants
+    return invariants
+
+
+class Program:
+    """
+    Forma compilada (lineal) de un Trunk.
+
+    Los registros de Constant y Leaf se precargan en la plantilla de registros,
+    por lo que solo Use, Composition, Apply, Switch y Loop generan instrucciones.
+    Una Composition utilizada unicamente como argumento de un Apply no se
+    materializa: el Apply se emite como CALL con los registros de sus entradas.
+
+    Cuando el programa es la iteracion de un Loop (`iterate`) se reutiliza un
+    unico array de registros y las instrucciones invariantes se ejecutan una vez.
+    """
+
+    trunk: Trunk
+    code: list[tuple]
+    nodes: list[Node]
+    template: list[Any]
+    leaf_registers: tuple[int, ...]
+    result_register: int
+    _loop_code: tuple[list[tuple], list[tuple]] | None
+
+    def __init__(self, trunk: Trunk):
+        self.trunk = trunk
+        self.code = []
+        self.nodes = []
+        self.template = []
+        self._loop_code = None
+
+        order = list(schedule(trunk))
+        registers: dict[Node, int] = {}
+        leaf_registers = []
+
+        # numero de consumidores de cada nodo
+        uses: dict[Node, int] = {}
+        for node in order:
+            match node:
+                case Composition(inputs=inputs):
+                    for input in inputs.values():
+                        uses[input] = uses.get(input, 0) + 1
+                case Apply(function=function, argument=argument):
+                    uses[function] = uses.get(function, 0) + 1
+                    uses[argument] = uses.get(argument, 0) + 1
+                case Switch(input=input, selector=selector, branches=branches):
+                    uses[selector] = uses.get(selector, 0) + 1
+                    if input is not None:
+                        uses[input] = uses.get(input, 0) + 1
+                    for branch in branches.values():
+                        uses[branch] = uses.get(branch, 0) + 1
+                case Loop(input=input) if input is not None:
+                    uses[input] = uses.get(input, 0) + 1
+        uses[trunk.result] = uses.get(trunk.result, 0) + 1
+
+        applied = {node.argument for node in order if isinstance(node, Apply)}
+        deferred: dict[Composition, tuple[tuple[int, ...], tuple]] = {}
+
+        def register_of(node: Node) -> int:
+            if isinstance(node, Trunk):
+                return registers[node.result]
+            return registers[node]
+
+        def allocate(node: Node, initial: Any = None) -> int:
+            register = registers[node] = len(self.template)
+            self.template.append(initial)
+            return register
+
+        def emit(node: Node, opcode: int, dst: int, a=None, b=None, c=None):
+            self.code.append((opcode, dst, a, b, c))
+            self.nodes.append(node)
+
+        for node in order:
+            match node:
+                case Leaf():
+                    leaf_registers.append(allocate(node))
+                case Constant(value=value):
+                    allocate(node, value)
+                case Use(entity=entity):
+                    emit(node, USE, allocate(node), entity)
+                case Composition(inputs=inputs):
+                    arguments = _call_arguments(inputs, register_of)
+                    if (
+                        arguments is not None
+                        and node in applied
+                        and uses.get(node, 0) == 1
+                    ):
+                        deferred[node] = arguments
+                        continue
+                    keys = tuple(inputs.keys())
+                    sources = tuple(register_of(input) for input in inputs.values())
+                    emit(node, COMPOSE, allocate(node), keys, sources)
+                case Apply(function=function, argument=argument):
+                    if (arguments := deferred.pop(argument, None)) is not None:
+                        positional, keyword = arguments
+                        emit(
+                            node,
+                            CALL,
+                            allocate(node),
+                            register_of(function),
+                            positional,
+                            keyword,
+                        )
+                    else:
+                        emit(
+                            node,
+                            APPLY,
+                            allocate(node),
+                            register_of(function),
+                            register_of(argument),
+                        )
+                case Switch(input=input, selector=selector, branches=branches):
+                    dispatch = dispatcher(node)
+                    targets = [branches[key] for key in dispatch.keys]
+                    if Switch.DEFAULT in branches:
+                        targets.append(branches[Switch.DEFAULT])
+                    table = [
+                        branch if isinstance(branch, Trunk) else register_of(branch)
+                        for branch in targets
+                    ]
+                    input_register = None if input is None else register_of(input)
+                    emit(
+                        node,
+                        SWITCH,
+                        allocate(node),
+                        register_of(selector),
+                        (dispatch, table),
+                        input_register,
+                    )
+                case Loop(input=input, iteration=iteration):
+                    input_register = None if input is None else register_of(input)
+                    emit(node, LOOP, allocate(node), input_register, iteration)
+                case Trunk():
+                    # expandido en linea por schedule, su valor es el de result
+                    pass
+
+        self.leaf_registers = tuple(leaf_registers)
+        self.result_register = register_of(trunk.result)
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.trunk.leaf.name}, "
+            f"{len(self.code)} instructions, {len(self.template)} registers)"
+        )
+
+    def run(
+        self,
+        argument: Any,
+        scope: dict[Entity, Any],
+        limits: LoopLimits = NO_LOOP_LIMITS,
+    ) -> Any:
+        regs = self.template.copy()
+        for register in self.leaf_registers:
+            regs[register] = argument
+
+        self._execute(self.code, regs, scope, limits)
+        return regs[self.result_register]
+
+    def iterate(
+        self,
+        state: Any,
+        scope: dict[Entity, Any],
+        limits: LoopLimits = NO_LOOP_LIMITS,
+    ) -> Any:
+        """
+        Ejecuta el programa como iteracion de un Loop partiendo de `state`.
+        """
+        invariant_code, variant_code = self.split_invariants()
+
+        regs = self.template.copy()
+        # los invariantes no leen el leaf y toda iteracion ejecuta todo el codigo
+        self._execute(invariant_code, regs, scope, limits)
+
+        guard = LoopGuard(limits)
+        leaf_registers = self.leaf_registers
+        result_register = self.result_register
+        while True:
+            for register in leaf_registers:
+                regs[register] = state
+            self._execute(variant_code, regs, scope, limits)
+            done, state = loop_step(regs[result_register], state)
+            if done:
+                return state
+            guard.tick()
+
+    def stream(
+        self,
+        arguments: Iterable[Any],
+        scope: dict[Entity, Any],
+        limits: LoopLimits = NO_LOOP_LIMITS,
+    ) -> Iterator[Any]:
+        """
+        Ejecuta el programa con cada uno de `arguments` sobre un unico array de
+        registros; las instrucciones invariantes se ejecutan una sola vez.
+        """
+        invariant_code, variant_code = self.split_invariants()
+
+        regs = self.template.copy()
+        self._execute(invariant_code, regs, scope, limits)
+
+        leaf_registers = self.leaf_registers
+        result_register = self.result_register
+        for argument in arguments:
+            for register in leaf_registers:
+                regs[register] = argument
+            self._execute(variant_code, regs, scope, limits)
+            yield regs[result_register]
+
+    def split_invariants(self) -> tuple[list[tuple], list[tuple]]:
+        """
+        Separa el codigo en las instrucciones de los nodos que no dependen del
+        leaf (`loop_invariants`) y el resto, conservando el orden.
+        """
+        if self._loop_code is None:
+            invariants = loop_invariants(self.trunk)
+            self._loop_code = (
+                [i for i, n in zip(self.code, self.nodes) if n in invariants],
+                [i for i, n in zip(self.code, self.nodes) if n not in invariants],
+            )
+        return self._loop_code
+
+    def _execute(
+        self,
+        code: list[tuple],
+        regs: list[Any],
+        scope: dict[Entity, Any],
+        limits: LoopLimits,
+    ):
+        try:
+            for instruction in code:
+                opcode, dst, a, b, c = instruction
+                if opcode == CALL:
+                    function = regs[a]
+                    if function.__class__ is Trunk:
+                        argument = _call_tuple(regs, b, c)
+                        regs[dst] = linearize(function).run(argument, scope, limits)
+                    elif callable(function):
+                        if c:
+                            regs[dst] = function(
+                                *[regs[r] for r in b], **{k: regs[r] for k, r in c}
+                            )
+                        else:
+                            regs[dst] = function(*[regs[r] for r in b])
+                    else:
+                        raise TypeError(f"Invalid function type {function.__class__}")
+                elif opcode == USE:
+                    if (value := scope.get(a, _MISSING)) is _MISSING:
+                        raise NotImplementedError(f"Use {a} not found in {self}")
+                    regs[dst] = value
+                elif opcode == COMPOSE:
+                    regs[dst] = Tuple(zip(a, [regs[r] for r in b]))
+                elif opcode == APPLY:
+                    regs[dst] = _apply(regs[a], regs[b], scope, limits)
+                elif opcode == SWITCH:
+                    regs[dst] = self._switch(regs, a, b, c, scope, limits)
+                elif opcode == LOOP:
+                    state = None if a is None else regs[a]
+                    regs[dst] = linearize(b).iterate(state, scope, limits)
+        except Exception as e:
+            e.add_note(
+                f"Error while processing {self.nodes[self.code.index(instruction)]}"
+            )
+            raise
+
+    def _switch(self, regs, selector_register, dispatch, input_register, scope, limits):
+        # el indice -1 (Switch.DEFAULT) es el ultimo elemento de la tabla
+        dispatcher, table = dispatch
+        branch = table[dispatcher.index(regs[selector_register])]
+
+        if isinstance(branch, Trunk):
+            return linearize(branch).run(regs[input_register], scope, limits)
+
+        return regs[branch]
+
+
+def _call_arguments(inputs: Tuple[Node], register_of) -> tuple | None:
+    positional = []
+    keyword = []
+    for key, input in inputs.items():
+        if isinstance(key, int):
+            if key != len(positional) or keyword:
+                return None
+            positional.append(register_of(input))
+        elif isinstance(key, str):
+            keyword.append((key, register_of(input)))
+        else:
+            return None
+    return tuple(positional), tuple(keyword)
+
+
+def _call_tuple(regs: list, positional: tuple[int, ...], keyword: tuple) -> Tuple:
+    return Tuple(
+        {n: regs[r] for n, r in enumerate(positional)}
+        | {k: regs[r] for k, r in keyword}
+    )
+
+
+def _apply(
+    function: Any, argument: Any, scope: dict[Entity, Any], limits: LoopLimits
+) -> Any:
+    if isinstance(function, Trunk):
+        return linearize(function).run(argument, scope, limits)
+
+    if callable(function):
+        if isinstance(argument, Tuple):
+            args, kwargs = argument.to_args()
+            return function(*args, **kwargs)
+
+        raise TypeError(
+            f"Invalid argument type {argument.__class__} for function {function}"
+        )
+    raise TypeError(f"Invalid function type {function.__class__}")
+
+
+def linearize(trunk: Trunk) -> Program:
+    """
+    Devuelve el programa lineal de un trunk, compilandolo la primera vez.
+    """
+    if (program := _programs.get(trunk)) is None:
+        program = _programs[trunk] = Program(trunk)
+    return program
+
+
+def eval_linear[T](
+    trunk: Trunk,
+    argument: T,
+    /,
+    scope: dict[Entity, T],
+    max_iterations: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> T:
+    """
+    Evalua `trunk` con el backend lineal. `max_iterations` y `timeout` limitan
+    cada ejecucion de un Loop.
+    """
+    return linearize(trunk).run(argument, scope, LoopLimits(max_iterations, timeout))
@@ -0,0 +1,79 @@
+"""
+Semantica comun de la ejecucion de Loops.
+
+Cada iteracion recibe el estado y devuelve el siguiente. Si el resultado es un
+Tuple con el campo Loop.CONTROL, este se elimina del estado y decide el paso:
+Loop.BREAK termina el loop y Loop.CONTINUE fuerza otra iteracion. Sin campo de
+control el loop termina al alcanzar un punto fijo (el estado no cambia).
+
+Las ejecuciones se acotan en iteraciones y en tiempo con LoopLimits.
+"""
+
+from __future__ import annotations
+
+from time import perf_counter
+from typing import Any, NamedTuple, Optional
+
+from ..tuple import Tuple
+from .model import Loop
+
+__all__ = [
+    "LoopLimitError",
+    "LoopLimits",
+    "NO_LOOP_LIMITS",
+    "LoopGuard",
+    "loop_step",
+]
+
+
+class LoopLimitError(RuntimeError):
+    pass
+
+
+class LoopLimits(NamedTuple):
+    max_iterations: Optional[int] = None
+    timeout: Optional[float] = None  # segundos por ejecucion del loop
+
+
+NO_LOOP_LIMITS = LoopLimits()
+
+
+class LoopGuard:
+    """
+    Cuenta las iteraciones de una ejecucion y lanza LoopLimitError al superar
+    los limites.
+    """
+
+    def __init__(self, limits: LoopLimits):
+        self.iterations = 0
+        self.max_iterations = limits.max_iterations
+        self.deadline = (
+            None if limits.timeout is None else perf_counter() + limits.timeout
+        )
+
+    def tick(self):
+        self.iterations += 1
+        if self.max_iterations is not None and self.iterations >= self.max_iterations:
+            raise LoopLimitError(f"Loop exceeded {self.max_iterations} iterations")
+        if self.deadline is not None and perf_counter() > self.deadline:
+            raise LoopLimitError(
+                f"Loop exceeded its timeout after {self.iterations} iterations"
+            )
+
+
+def loop_step(result: Any, state: Any) -> tuple[bool, Any]:
+    """
+    Interpreta el resultado de una iteracion sobre `state`. Devuelve si el loop
+    ha terminado y el nuevo estado (sin el campo de control).
+    """
+    if not (isinstance(result, Tuple) and Loop.CONTROL in result.keys()):
+        return result == state, result
+
+    control = result[Loop.CONTROL]
+    result = Tuple({key: value for key, value in result.items() if key != Loop.CONTROL})
+
+    if control == Loop.BREAK:
+        return True, result
+    if control == Loop.CONTINUE:
+        return False, result
+    raise ValueError(f"Invalid loop control {control!r}")
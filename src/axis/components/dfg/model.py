@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import inspect
 from types import FunctionType
-from typing import Dict, Optional, TypeAlias
+from typing import Dict, Iterator, Optional, TypeAlias
 
 from frozendict import frozendict
 from protobase import Object, traits
@@ -23,6 +23,7 @@ __all__ = [
     "Switch",
     "ConstructionContext",
     "compile",
+    "references",
 ]
 
 
@@ -115,6 +116,9 @@ class Node(traits.Repr, traits.Consed):
     def switch(self, branches: Switch.Branches):
         return Switch.build(self, branches)
 
+    def loop(self, iteration: Trunk):
+        return Loop.build(self, iteration)
+
 
 class Leaf(Object, Node):
     name: str
@@ -193,6 +197,19 @@ class Switch(Object, Node):
 
 
 class Loop(Object, Node):
+    """
+    Aplica `iteration` repetidamente, empezando por el valor de `input`, hasta
+    alcanzar un punto fijo (el resultado coincide con el estado anterior) o hasta
+    que la iteracion devuelve un Tuple con el campo de control CONTROL a BREAK.
+    Con CONTROL a CONTINUE se itera de nuevo aunque el estado no haya cambiado.
+
+    El campo de control se elimina del Tuple antes de usarlo como nuevo estado.
+    """
+
+    CONTROL = "$ctrl"
+    BREAK = "break"
+    CONTINUE = "continue"
+
     input: Node
     iteration: Trunk
 
@@ -229,3 +246,30 @@ def compile(fn):
         trunk = Trunk.build(result)
 
     return trunk
+
+
+def references(node: Node) -> Iterator[Node]:
+    """
+    Nodos que referencia directamente `node`, incluidos los Trunk de las Constant,
+    las ramas de un Switch y la iteracion de un Loop.
+    """
+    match node:
+        case Constant(value=Trunk() as trunk):
+            yield trunk
+        case Composition(inputs=inputs):
+            yield from inputs.values()
+        case Apply(function=function, argument=argument):
+            yield function
+            yield argument
+        case Switch(input=input, selector=selector, branches=branches):
+            if input is not None:
+                yield input
+            yield selector
+            yield from branches.values()
+        case Loop(input=input, iteration=iteration):
+            if input is not None:
+                yield input
+            yield iteration
+        case Trunk(children=children, result=result):
+            yield from children
+            yield result
@@ -0,0 +1,223 @@
+"""
+Evaluacion paralela de los subgrafos independientes de un Trunk.
+
+El Scheduler usa el indice de dependencias de cada trunk (ver analysis) y
+evalua los nodos en cuanto sus operandos estan disponibles. Los Apply de
+entidades caras se envian a un executor de concurrent.futures mientras el resto
+del grafo sigue avanzando; los nodos baratos se evaluan en linea.
+
+El coste estimado (en segundos por llamada) de cada entidad se declara en el
+propio scope, bajo la clave EXPENSIVE. Por ejemplo, para una entidad "fetch" cuya
+funcion hace una peticion de red:
+
+    scope["fetch"] = fetch
+    scope[EXPENSIVE] = {"fetch": 0.05}
+
+Solo se envian al executor las entidades cuyo coste alcanza `granularity`. Con un
+ThreadPoolExecutor conviene para builtins de entrada/salida o que liberan el GIL;
+con un ProcessPoolExecutor para builtins de CPU, cuyas funciones y argumentos
+deben poder serializarse con pickle.
+
+El orden de los efectos laterales entre nodos independientes no esta definido.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Any, Literal, Mapping, Optional
+
+from ..tuple import Tuple
+from .analysis import graph_index
+from .dispatch import dispatcher
+from .loop import NO_LOOP_LIMITS, LoopGuard, LoopLimits, loop_step
+from .model import (
+    Apply,
+    Composition,
+    Constant,
+    Entity,
+    Leaf,
+    Loop,
+    Node,
+    Switch,
+    Trunk,
+    Use,
+)
+
+__all__ = [
+    "EXPENSIVE",
+    "Scheduler",
+    "eval_parallel",
+]
+
+EXPENSIVE = "$expensive"
+
+_MISSING = object()
+
+
+class Scheduler:
+    """
+    Evalua trunks enviando los Apply caros a `executor`.
+    """
+
+    def __init__(
+        self,
+        scope: dict[Entity, Any],
+        executor: Executor,
+        granularity: float = 1e-3,
+        limits: LoopLimits = NO_LOOP_LIMITS,
+    ):
+        self.scope = scope
+        self.executor = executor
+        self.granularity = granularity
+        self.limits = limits
+        costs: Mapping[Entity, float] = scope.get(EXPENSIVE, {})
+        self.expensive = {
+            entity for entity, cost in costs.items() if cost >= granularity
+        }
+
+    def run(self, trunk: Trunk, argument: Any) -> Any:
+        graph = graph_index(trunk)
+        values: dict[Node, Any] = {}
+        pending = graph.indegree.copy()
+        ready = deque(graph.sources)
+        futures: dict[Future, Node] = {}
+
+        def release(node: Node):
+            for dependent in graph.users[node]:
+                pending[dependent] -= 1
+                if not pending[dependent]:
+                    ready.append(dependent)
+
+        try:
+            while ready or futures:
+                while ready:
+                    node = ready.popleft()
+                    if (future := self.submit(node, values)) is not None:
+                        futures[future] = node
+                        continue
+                    try:
+                        values[node] = self.evaluate(node, values, argument)
+                    except Exception as e:
+                        e.add_note(f"Error while processing {node}")
+                        raise
+                    release(node)
+
+                if futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        node = futures.pop(future)
+                        try:
+                            values[node] = future.result()
+                        except Exception as e:
+                            e.add_note(f"Error while processing {node}")
+                            raise
+                        release(node)
+        finally:
+            for future in futures:
+                future.cancel()
+
+        return values[trunk.result]
+
+    def submit(self, node: Node, values: dict[Node, Any]) -> Optional[Future]:
+        """
+        Envia `node` al executor si es un Apply de una entidad cara.
+        """
+        match node:
+            case Apply(function=Use(entity=entity) as function, argument=argument):
+                if entity not in self.expensive:
+                    return None
+                function = values[function]
+                argument = values[argument]
+                if isinstance(function, Trunk) or not isinstance(argument, Tuple):
+                    return None
+                args, kwargs = argument.to_args()
+                return self.executor.submit(function, *args, **kwargs)
+        return None
+
+    def evaluate(self, node: Node, values: dict[Node, Any], argument: Any) -> Any:
+        match node:
+            case Leaf():
+                return argument
+            case Constant(value=value):
+                return value
+            case Use(entity=entity):
+                if (value := self.scope.get(entity, _MISSING)) is _MISSING:
+                    raise NotImplementedError(f"Use {entity} not found in scope")
+                return value
+            case Composition(inputs=inputs):
+                return inputs.map(values.__getitem__)
+            case Apply(function=function, argument=argument):
+                return self.apply(values[function], values[argument])
+            case Switch(input=input, selector=selector):
+                branch = dispatcher(node).select(values[selector])
+                if isinstance(branch, Trunk):
+                    return self.run(branch, None if input is None else values[input])
+                return values[branch]
+            case Loop(input=input, iteration=iteration):
+                state = None if input is None else values[input]
+                guard = LoopGuard(self.limits)
+                while True:
+                    done, state = loop_step(self.run(iteration, state), state)
+                    if done:
+                        return state
+                    guard.tick()
+            case Trunk(result=result):
+                return values[result]
+        raise TypeError(f"Invalid node type {node.__class__}")
+
+    def apply(self, function: Any, argument: Any) -> Any:
+        if isinstance(function, Trunk):
+            return self.run(function, argument)
+
+        if callable(function):
+            if isinstance(argument, Tuple):
+                args, kwargs = argument.to_args()
+                return function(*args, **kwargs)
+
+            raise TypeError(
+                f"Invalid argument type {argument.__class__} for function {function}"
+            )
+        raise TypeError(f"Invalid function type {function.__class__}")
+
+
+def eval_parallel[T](
+    trunk: Trunk,
+    argument: T,
+    /,
+    scope: dict[Entity, T],
+    executor: Optional[Executor] = None,
+    kind: Literal["thread", "process"] = "thread",
+    max_workers: Optional[int] = None,
+    granularity: float = 1e-3,
+    max_iterations: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> T:
+    """
+    Evalua `trunk` ejecutando en paralelo los Apply independientes de entidades
+    con coste estimado (scope[EXPENSIVE]) de al menos `granularity` segundos.
+
+    Sin `executor` se crea, solo para esta evaluacion, un pool del tipo `kind`.
+    `max_iterations` y `timeout` limitan cada ejecucion de un Loop.
+    """
+    limits = LoopLimits(max_iterations, timeout)
+    if executor is not None:
+        return Scheduler(scope, executor, granularity, limits).run(trunk, argument)
+
+    match kind:
+        case "thread":
+            pool = ThreadPoolExecutor
+        case "process":
+            pool = ProcessPoolExecutor
+        case _:
+            raise ValueError(f"Invalid executor kind {kind!r}")
+
+    with pool(max_workers=max_workers) as executor:
+        return Scheduler(scope, executor, granularity, limits).run(trunk, argument)
@@ -0,0 +1,524 @@
+"""
+Serializacion de Trunks y cache en disco de las funciones compiladas.
+
+El formato es una tabla de nodos en orden topologico, codificada con marshal:
+cada nodo distinto aparece una sola vez y los demas lo referencian por su indice,
+de modo que los subgrafos compartidos (tambien entre trunks) no se duplican. Al
+cargar, los nodos se reconstruyen con sus constructores y por tanto vuelven a ser
+hash-consed: un trunk cargado es el mismo objeto que el trazado.
+
+Los valores admitidos en Constant, Use y ramas de Switch son los literales
+(None, bool, int, float, str, bytes), tuplas y Tuple de valores admitidos,
+Trunks, Switch.DEFAULT, los patrones Range e InstanceOf y las funciones y clases
+importables por su modulo y nombre. Otros valores lanzan TypeError.
+
+TrunkCache guarda el trunk de cada funcion en un directorio, bajo una clave que
+combina el codigo fuente y el bytecode de la funcion con todo lo que alcanza su
+traza: los globales, la closure y los valores por defecto que referencia, y
+recursivamente los de las funciones auxiliares que llama. Cambiar cualquiera de
+ellos invalida la entrada.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib
+import importlib.util
+import linecache
+import marshal
+import os
+from types import CodeType, FunctionType, ModuleType
+from typing import Any, Callable, Iterable, Iterator, Optional
+from weakref import WeakKeyDictionary, ref
+
+from frozendict import frozendict
+from protobase import attr, fields_of
+
+from ..tuple import Tuple
+from .dispatch import InstanceOf, Range
+from .model import (
+    Apply,
+    Composition,
+    Constant,
+    Leaf,
+    Loop,
+    Node,
+    Switch,
+    Trunk,
+    Use,
+    compile,
+    references,
+)
+
+__all__ = [
+    "FORMAT_VERSION",
+    "dumps",
+    "loads",
+    "TrunkCache",
+    "compile_cached",
+]
+
+FORMAT_VERSION = 1
+
+# codigo de cada tipo de nodo en la tabla
+_LEAF, _USE, _CONSTANT, _COMPOSITION, _APPLY, _SWITCH, _LOOP, _TRUNK = range(8)
+
+_NONE = -1  # referencia a un operando opcional ausente
+
+# los valores especiales se codifican como listas etiquetadas (marshal distingue
+# listas de tuplas, y ningun valor admitido es una lista)
+_LITERALS = (type(None), bool, int, float, str, bytes)
+
+
+class _Encoder:
+    def __init__(self):
+        self.index: dict[Node, int] = {}
+        self.table: list[tuple] = []
+
+    def add(self, root: Node) -> int:
+        # recorrido en postorden con pila explicita
+        stack = [(root, iter(references(root)))]
+        while stack:
+            node, pending = stack[-1]
+            for operand in pending:
+                if operand not in self.index:
+                    stack.append((operand, iter(references(operand))))
+                    break
+            else:
+                stack.pop()
+                if node not in self.index:
+                    self.index[node] = len(self.table)
+                    self.table.append(self.record(node))
+        return self.index[root]
+
+    def ref(self, node: Optional[Node]) -> int:
+        return _NONE if node is None else self.index[node]
+
+    def record(self, node: Node) -> tuple:
+        match node:
+            case Leaf(name=name):
+                return _LEAF, name
+            case Use(entity=entity):
+                return _USE, self.value(entity)
+            case Constant(value=value):
+                return _CONSTANT, self.value(value)
+            case Composition(inputs=inputs):
+                return (
+                    _COMPOSITION,
+                    tuple(inputs.keys()),
+                    tuple(map(self.ref, inputs.values())),
+                )
+            case Apply(function=function, argument=argument):
+                return _APPLY, self.ref(function), self.ref(argument)
+            case Switch(input=input, selector=selector, branches=branches):
+                return (
+                    _SWITCH,
+                    self.ref(input),
+                    self.ref(selector),
+                    tuple(map(self.value, branches.keys())),
+                    tuple(map(self.ref, branches.values())),
+                )
+            case Loop(input=input, iteration=iteration):
+                return _LOOP, self.ref(input), self.ref(iteration)
+            case Trunk(children=children, result=result):
+                return _TRUNK, tuple(map(self.ref, children)), self.ref(result)
+        raise TypeError(f"Invalid node type {node.__class__}")
+
+    def value(self, value: Any) -> Any:
+        if isinstance(value, _LITERALS):
+            return value
+        if isinstance(value, tuple):
+            return tuple(map(self.value, value))
+        if isinstance(value, Tuple):
+            return [
+                "T",
+                tuple(map(self.value, value.keys())),
+                self.value(tuple(value.values())),
+            ]
+        if isinstance(value, Trunk):
+            return ["N", self.ref(value)]
+        if value is Switch.DEFAULT:
+            return ["D"]
+        if isinstance(value, Range):
+            return ["R", self.value(value.lower), self.value(value.upper)]
+        if isinstance(value, InstanceOf):
+            return ["I", self.value(value.types)]
+        if isinstance(value, (FunctionType, type)):
+            module, qualname = value.__module__, value.__qualname__
+            if "<locals>" not in qualname and _import(module, qualname) is value:
+                return ["F", module, qualname]
+        raise TypeError(f"Cannot serialize value {value!r}")
+
+
+def _import(module: str, qualname: str) -> Any:
+    try:
+        value = importlib.import_module(module)
+        for name in qualname.split("."):
+            value = getattr(value, name)
+    except (ImportError, AttributeError):
+        return None
+    return value
+
+
+def _decode_value(value: Any, nodes: list[Node]) -> Any:
+    if isinstance(value, tuple):
+        return tuple(_decode_value(item, nodes) for item in value)
+    if not isinstance(value, list):
+        return value
+
+    match value:
+        case ["T", keys, values]:
+            return Tuple(
+                dict(zip(_decode_value(keys, nodes), _decode_value(values, nodes)))
+            )
+        case ["N", index]:
+            return nodes[index]
+        case ["D"]:
+            return Switch.DEFAULT
+        case ["R", lower, upper]:
+            return Range(_decode_value(lower, nodes), _decode_value(upper, nodes))
+        case ["I", types]:
+            return InstanceOf(*_decode_value(types, nodes))
+        case ["F", module, qualname]:
+            if (imported := _import(module, qualname)) is None:
+                raise ValueError(f"Cannot import {module}.{qualname}")
+            return imported
+    raise ValueError(f"Invalid serialized value {value!r}")
+
+
+def _encode(trunks: Iterable[Trunk]) -> tuple[tuple, tuple[int, ...]]:
+    encoder = _Encoder()
+    roots = tuple(map(encoder.add, trunks))
+    return tuple(encoder.table), roots
+
+
+def dumps(*trunks: Trunk) -> bytes:
+    """
+    Serializa `trunks` en una unica tabla de nodos compartida.
+    """
+    return marshal.dumps((FORMAT_VERSION, *_encode(trunks)))
+
+
+def _constructor(cls: type, *names: str) -> Callable[..., Any]:
+    """
+    Equivalente a `cls(**dict(zip(names, values)))` para una clase hash-consed,
+    sin el despacho de traits de protobase en cada llamada: asigna los campos y
+    busca el objeto en la tabla de consing de la clase una sola vez. Es el coste
+    dominante de `loads`.
+    """
+    setters = tuple(attr.setter(cls, name) for name in names)
+    defaults = tuple(
+        (attr.setter(cls, name), cls.__kwdefaults__[name])
+        for name in fields_of(cls)
+        if name not in names
+    )
+    consing = cls.__consing__
+    table = consing.data
+    new = object.__new__
+
+    def construct(*values: Any) -> Any:
+        node = new(cls)
+        for setter, value in zip(setters, values):
+            setter(node, value)
+        for setter, value in defaults:
+            setter(node, value)
+        if (existing := table.get(ref(node))) is not None:
+            if (consed := existing()) is not None:
+                return consed
+        consing[node] = ref(node)
+        return node
+
+    return construct
+
+
+_new_leaf = _constructor(Leaf, "name")
+_new_use = _constructor(Use, "entity")
+_new_constant = _constructor(Constant, "value")
+_new_tuple = _constructor(Tuple, "_inner")
+_new_composition = _constructor(Composition, "inputs")
+_new_apply = _constructor(Apply, "function", "argument")
+_new_switch = _constructor(Switch, "input", "selector", "branches")
+_new_loop = _constructor(Loop, "input", "iteration")
+_new_trunk = _constructor(Trunk, "children", "result")
+
+
+def loads(data: bytes) -> list[Trunk]:
+    """
+    Reconstruye los trunks serializados con `dumps`, en el mismo orden.
+    """
+    version, table, roots = marshal.loads(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported format version {version}")
+
+    nodes: list[Node] = []
+    append = nodes.append
+    for record in table:
+        match record[0]:
+            case 0:  # _LEAF
+                append(_new_leaf(record[1]))
+            case 1:  # _USE
+                append(_new_use(_decode_value(record[1], nodes)))
+            case 2:  # _CONSTANT
+                append(_new_constant(_decode_value(record[1], nodes)))
+            case 3:  # _COMPOSITION
+                _, keys, refs = record
+                inputs = frozendict(zip(keys, [nodes[ref] for ref in refs]))
+                append(_new_composition(_new_tuple(inputs)))
+            case 4:  # _APPLY
+                append(_new_apply(nodes[record[1]], nodes[record[2]]))
+            case 5:  # _SWITCH
+                _, input, selector, keys, refs = record
+                branches = {
+                    _decode_value(key, nodes): nodes[ref]
+                    for key, ref in zip(keys, refs)
+                }
+                append(
+                    _new_switch(
+                        None if input == _NONE else nodes[input],
+                        nodes[selector],
+                        frozendict(branches),
+                    )
+                )
+            case 6:  # _LOOP
+                _, input, iteration = record
+                append(
+                    _new_loop(
+                        None if input == _NONE else nodes[input], nodes[iteration]
+                    )
+                )
+            case 7:  # _TRUNK
+                _, children, result = record
+                append(_new_trunk(tuple(nodes[ref] for ref in children), nodes[result]))
+            case code:
+                raise ValueError(f"Invalid node code {code}")
+
+    return [nodes[root] for root in roots]
+
+
+def _source(fn: FunctionType) -> str:
+    # lineas de la definicion; mas barato que inspect.getsource, que tokeniza
+    code = fn.__code__
+    lines = linecache.getlines(code.co_filename, fn.__globals__)
+    last = max(
+        (line for *_, line in code.co_lines() if line is not None),
+        default=code.co_firstlineno,
+    )
+    return "".join(lines[code.co_firstlineno - 1 : last])
+
+
+def _update_code(digest: Any, code: CodeType):
+    # marshal.dumps(code) no es determinista: sus referencias internas dependen
+    # de los contadores de referencias de los objetos
+    digest.update(code.co_code)
+    digest.update(
+        repr(
+            (
+                code.co_names,
+                code.co_varnames,
+                code.co_freevars,
+                code.co_cellvars,
+                code.co_argcount,
+                code.co_kwonlyargcount,
+                code.co_flags,
+            )
+        ).encode()
+    )
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            _update_code(digest, const)
+        else:
+            digest.update(repr(const).encode())
+
+
+def _names(code: CodeType) -> Iterator[str]:
+    yield from code.co_names
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            yield from _names(const)
+
+
+def _referenced(fn: FunctionType) -> Iterator[tuple[str, Any]]:
+    # nombres sin global (builtins, atributos) no se resuelven: el interprete ya
+    # forma parte de la clave
+    for name in dict.fromkeys(_names(fn.__code__)):
+        if name in fn.__globals__:
+            yield name, fn.__globals__[name]
+    for name, cell in zip(fn.__code__.co_freevars, fn.__closure__ or ()):
+        try:
+            yield name, cell.cell_contents
+        except ValueError:  # celda aun vacia
+            pass
+    for value in fn.__defaults__ or ():
+        yield "", value
+    for name, value in (fn.__kwdefaults__ or {}).items():
+        yield name, value
+
+
+# clave de los trunks cargados o compilados con una TrunkCache, o hash de la
+# codificacion de los demas: un trunk referenciado se serializa a lo sumo una vez
+_trunk_keys: WeakKeyDictionary[Trunk, str] = WeakKeyDictionary()
+
+
+def _trunk_key(trunk: Trunk) -> str:
+    if (key := _trunk_keys.get(trunk)) is None:
+        digest = hashlib.sha256(repr(_encode([trunk])).encode())
+        key = _trunk_keys[trunk] = digest.hexdigest()
+    return key
+
+
+def _update_function(digest: Any, fn: FunctionType, seen: set[FunctionType]):
+    digest.update(f"{fn.__module__}:{fn.__qualname__}".encode())
+    digest.update(_source(fn).encode())
+    _update_code(digest, fn.__code__)
+
+    for name, value in _referenced(fn):
+        digest.update(f"\0{name}=".encode())
+        if isinstance(value, Trunk):
+            digest.update(_trunk_key(value).encode())
+        elif isinstance(value, FunctionType):
+            if value not in seen:
+                seen.add(value)
+                _update_function(digest, value, seen)
+            else:
+                digest.update(f"{value.__module__}:{value.__qualname__}".encode())
+        elif isinstance(value, type):
+            digest.update(f"{value.__module__}:{value.__qualname__}".encode())
+        elif isinstance(value, ModuleType):
+            digest.update(value.__name__.encode())
+        else:
+            try:
+                digest.update(repr(_Encoder().value(value)).encode())
+            except (TypeError, KeyError):
+                # repr puede incluir la direccion del objeto: en el peor caso la
+                # entrada no se reutiliza, pero nunca queda obsoleta
+                digest.update(f"{type(value).__qualname__}:{value!r}".encode())
+
+
+class TrunkCache:
+    """
+    Directorio con los trunks compilados de funciones Python.
+
+    Por defecto se usa $AXIS_CACHE_DIR/dfg o ~/.cache/axis/dfg. `hits` y `misses`
+    cuentan las cargas desde disco y las compilaciones.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        if directory is None:
+            root = os.environ.get("AXIS_CACHE_DIR") or os.path.join(
+                os.path.expanduser("~"), ".cache", "axis"
+            )
+            directory = os.path.join(root, "dfg")
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, fn: FunctionType) -> str:
+        """
+        Hash de la version del interprete y del formato, y del codigo (fuente y
+        bytecode) de `fn` y de todo lo que alcanza su traza: globales, closure y
+        valores por defecto, y los de las funciones a las que llama.
+        """
+        digest = hashlib.sha256()
+        digest.update(importlib.util.MAGIC_NUMBER)
+        digest.update(f"{FORMAT_VERSION}:".encode())
+
+        _update_function(digest, fn, {fn})
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.dfg")
+
+    def load(self, fn: FunctionType, key: Optional[str] = None) -> Optional[Trunk]:
+        """
+        Trunk guardado de `fn`, o None. `key` evita recalcular la clave.
+        """
+        if key is None:
+            key = self.key(fn)
+        try:
+            with open(self.path(key), "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+
+        try:
+            [trunk] = loads(data)
+        except (ValueError, EOFError, TypeError, IndexError, KeyError):
+            return None  # entrada corrupta u obsoleta
+        _trunk_keys.setdefault(trunk, key)
+        return trunk
+
+    def store(self, fn: FunctionType, trunk: Trunk, key: Optional[str] = None) -> bool:
+        """
+        Guarda el trunk de `fn`. Devuelve False si contiene valores que no se
+        pueden serializar.
+        """
+        try:
+            data = dumps(trunk)
+        except TypeError:
+            return False
+
+        if key is None:
+            key = self.key(fn)
+        _trunk_keys.setdefault(trunk, key)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # escritura atomica: otro proceso nunca lee una entrada a medias
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+        return True
+
+    def compile(self, fn: FunctionType) -> Trunk:
+        """
+        Como `dfg.compile`, pero carga el trunk del disco si ya fue compilado.
+        """
+        key = self.key(fn)
+        if (trunk := self.load(fn, key)) is not None:
+            self.hits += 1
+            return trunk
+
+        self.misses += 1
+        trunk = compile(fn)
+        self.store(fn, trunk, key)
+        return trunk
+
+    def clear(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".dfg"):
+                    os.remove(os.path.join(root, name))
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.directory!r}, "
+            f"hits={self.hits}, misses={self.misses})"
+        )
+
+
+_default_cache: Optional[TrunkCache] = None
+
+
+def compile_cached(
+    fn: Optional[FunctionType] = None, /, cache: Optional[TrunkCache] = None
+) -> Trunk | Callable[[FunctionType], Trunk]:
+    """
+    Decorador equivalente a `dfg.compile` que usa una TrunkCache (por defecto la
+    del directorio de cache del usuario):
+
+        @compile_cached
+        def f(a, b): ...
+
+        @compile_cached(cache=TrunkCache("build/dfg"))
+        def g(a, b): ...
+    """
+    global _default_cache
+
+    if cache is None:
+        if _default_cache is None:
+            _default_cache = TrunkCache()
+        cache = _default_cache
+
+    if fn is None:
+        return cache.compile
+    return cache.compile(fn)
@@ -1,7 +1,9 @@
-from typing import Iterator, Self
+from typing import Generator, Iterator, Self
 
 from .model import Apply, Composition, Constant, Leaf, Loop, Node, Switch, Trunk, Use
 
+type Step[T] = Generator[tuple[Processor[T], Node], T, T]
+
 
 class Processor[T]:
     CONTINUE = object()
@@ -42,10 +44,63 @@ class Processor[T]:
     def process_trunk(self, trunk: Trunk) -> T:
         raise NotImplementedError(f"process_trunk not implemented in {self.__class__}")
 
+    ## Pasos para el recorrido iterativo (walk)
+    # Un paso es un generador que produce pares (processor, node) cuyo resultado
+    # necesita y recibe via send; su valor de retorno es el resultado del nodo.
+    # None indica que el nodo se procesa directamente con process_*.
+
+    def step_composition(self, composition: Composition) -> Step[T] | None:
+        return None
+
+    def step_apply(self, apply: Apply) -> Step[T] | None:
+        return None
+
+    def step_switch(self, switch: Switch) -> Step[T] | None:
+        return None
+
+    def step_loop(self, loop: Loop) -> Step[T] | None:
+        return None
+
+    def step_trunk(self, trunk: Trunk) -> Step[T] | None:
+        return None
+
     def when_exception(self, node: Node, e: Exception):
         e.add_note(f"Error while processing {node}")
         raise e
 
+    def process(self, node: Node) -> T:
+        match node:
+            case Leaf() as leaf:
+                return self.process_leaf(leaf)
+            case Use() as use:
+                return self.process_use(use)
+            case Constant() as constant:
+                return self.process_constant(constant)
+            case Composition() as composition:
+                return self.process_composition(composition)
+            case Apply() as apply:
+                return self.process_apply(apply)
+            case Switch() as switch:
+                return self.process_switch(switch)
+            case Loop() as loop:
+                return self.process_loop(loop)
+            case Trunk() as trunk:
+                return self.process_trunk(trunk)
+
+    def steps(self, node: Node) -> Step[T] | None:
+        match node:
+            case Composition() as composition:
+                return self.step_composition(composition)
+            case Apply() as apply:
+                return self.step_apply(apply)
+            case Switch() as switch:
+                return self.step_switch(switch)
+            case Loop() as loop:
+                return self.step_loop(loop)
+            case Trunk() as trunk:
+                return self.step_trunk(trunk)
+        return None
+
     def __call__(self, node: Node):
         """
         Eval puede ser parametrizado via evaluation_context
@@ -56,28 +111,67 @@ class Processor[T]:
             return preprocess_result
 
         try:
-            match node:
-                case Leaf() as leaf:
-                    result = self.process_leaf(leaf)
-                case Use() as use:
-                    result = self.process_use(use)
-                case Constant() as constant:
-                    result = self.process_constant(constant)
-                case Composition() as composition:
-                    result = self.process_composition(composition)
-                case Apply() as apply:
-                    result = self.process_apply(apply)
-                case Switch() as switch:
-                    result = self.process_switch(switch)
-                case Loop() as loop:
-                    result = self.process_loop(loop)
-                case Trunk() as trunk:
-                    result = self.process_trunk(trunk)
+            result = self.process(node)
         except Exception as e:
             result = self.when_exception(node, e)
 
         return self.postprocess_node(node, result)
 
+    def walk(self, node: Node) -> T:
+        """
+        Equivalente iterativo de __call__.
+
+        Usa una pila explicita de pasos (step_*) en lugar de la pila de Python,
+        por lo que la profundidad del grafo o del anidamiento de Trunks no esta
+        limitada por el limite de recursion. Los hooks preprocess_node,
+        postprocess_node y when_exception se aplican igual que en __call__.
+        """
+        stack: list[tuple[Processor[T], Node, Step[T]]] = []
+        processor = self
+
+        while True:
+            error = None
+            try:
+                result = processor.preprocess_node(node)
+                if result is Processor.CONTINUE:
+                    if (steps := processor.steps(node)) is None:
+                        try:
+                            result = processor.process(node)
+                        except Exception as e:
+                            result = processor.when_exception(node, e)
+                        result = processor.postprocess_node(node, result)
+                    else:
+                        stack.append((processor, node, steps))
+                        result = None
+            except Exception as e:
+                error = e
+
+            # reanuda el paso en la cima de la pila hasta que pida otro nodo
+            while stack:
+                frame_processor, frame_node, steps = stack[-1]
+                try:
+                    if error is None:
+                        processor, node = steps.send(result)
+                    else:
+                        processor, node = steps.throw(error)
+                    break
+                except StopIteration as stop:
+                    stack.pop()
+                    result = frame_processor.postprocess_node(frame_node, stop.value)
+                    error = None
+                except Exception as e:
+                    stack.pop()
+                    try:
+                        result = frame_processor.when_exception(frame_node, e)
+                        result = frame_processor.postprocess_node(frame_node, result)
+                        error = None
+                    except Exception as raised:
+                        error = raised
+            else:
+                if error is not None:
+                    raise error
+                return result
+
 
 class BasicProcessor[T](Processor[T]):
     def __init__(self, parent: Self):
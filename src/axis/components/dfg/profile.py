@@ -0,0 +1,274 @@
+"""
+Perfilado de la evaluacion de un dfg.
+
+ProfilingEvaluator instrumenta los hooks preprocess_node / postprocess_node del
+Evaluator, por lo que funciona tanto en modo recursivo como con walk. Registra
+por nodo las evaluaciones, los aciertos en `_visited_nodes`, y el tiempo
+acumulado y propio; el tiempo propio de los Apply de un Use se agrega ademas
+por entidad (que builtin de know es el caliente).
+
+El Evaluator normal no tiene ningun coste adicional: el perfilado solo existe
+en esta subclase.
+"""
+
+from __future__ import annotations
+
+from time import perf_counter
+from typing import Any, Optional, Self
+
+from .binding import Bindings, Environment, bind
+from .cache import CallCache
+from .eval import Evaluator
+from .loop import LoopLimits
+from .model import (
+    Apply,
+    Composition,
+    Constant,
+    Entity,
+    Leaf,
+    Node,
+    Trunk,
+    Use,
+)
+
+__all__ = [
+    "NodeStats",
+    "Profile",
+    "ProfilingEvaluator",
+    "eval_profiled",
+]
+
+
+def _entity_label(entity: Entity) -> str:
+    if isinstance(entity, tuple):
+        return ".".join(map(str, entity))
+    return getattr(entity, "__qualname__", str(entity))
+
+
+def node_label(node: Node) -> str:
+    match node:
+        case Leaf(name=name):
+            label = f"Leaf {name}"
+        case Use(entity=entity):
+            label = f"Use {_entity_label(entity)}"
+        case Constant(value=Trunk() as trunk):
+            label = f"Constant {trunk.leaf.name}"
+        case Constant(value=value):
+            label = f"Constant {value!r}"[:40]
+        case Composition(inputs=inputs):
+            label = f"Composition({', '.join(map(str, inputs.keys()))})"
+        case Apply(function=Use(entity=entity)):
+            label = f"Apply {_entity_label(entity)}"
+        case Apply(function=Constant(value=Trunk() as trunk)):
+            label = f"Apply {trunk.leaf.name}"
+        case Trunk() as trunk:
+            label = f"Trunk {trunk.leaf.name}"
+        case _:
+            label = node.__class__.__name__
+    # ';' separa los marcos en el formato de pilas colapsadas
+    return label.replace(";", ",").replace("\n", " ")
+
+
+class NodeStats:
+    __slots__ = ("calls", "hits", "cumulative", "own")
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.cumulative = 0.0
+        self.own = 0.0
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(calls={self.calls}, hits={self.hits}, "
+            f"cumulative={self.cumulative:.6f}, own={self.own:.6f})"
+        )
+
+
+class Profile:
+    """
+    Estadisticas de una o varias evaluaciones.
+
+    - `nodes`: NodeStats por nodo (el tiempo acumulado de un nodo recursivo
+      solo cuenta su activacion mas externa),
+    - `entities`: NodeStats por entidad de los Apply de un Use,
+    - `stacks`: tiempo propio por pila de etiquetas, para flamegraphs.
+    """
+
+    def __init__(self):
+        self.nodes: dict[Node, NodeStats] = {}
+        self.entities: dict[Entity, NodeStats] = {}
+        self.stacks: dict[tuple[str, ...], float] = {}
+        # marcos activos: [node, inicio, tiempo de hijos, pila]
+        self._frames: list[list] = []
+        self._active: dict[Node, int] = {}
+
+    @property
+    def hits(self) -> int:
+        return sum(stats.hits for stats in self.nodes.values())
+
+    @property
+    def misses(self) -> int:
+        return sum(stats.calls for stats in self.nodes.values())
+
+    def _stats(self, node: Node) -> NodeStats:
+        if (stats := self.nodes.get(node)) is None:
+            stats = self.nodes[node] = NodeStats()
+        return stats
+
+    def hit(self, node: Node):
+        self._stats(node).hits += 1
+
+    def enter(self, node: Node):
+        frames = self._frames
+        stack = (frames[-1][3] if frames else ()) + (node_label(node),)
+        self._active[node] = self._active.get(node, 0) + 1
+        frames.append([node, perf_counter(), 0.0, stack])
+
+    def exit(self, node: Node):
+        node, start, children, stack = self._frames.pop()
+        elapsed = perf_counter() - start
+        own = elapsed - children
+        if self._frames:
+            self._frames[-1][2] += elapsed
+
+        stats = self._stats(node)
+        stats.calls += 1
+        stats.own += own
+        if (active := self._active[node] - 1) == 0:
+            del self._active[node]
+            stats.cumulative += elapsed
+        else:
+            self._active[node] = active
+
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + own
+
+        if isinstance(node, Apply) and isinstance(node.function, Use):
+            entity = node.function.entity
+            if (entity_stats := self.entities.get(entity)) is None:
+                entity_stats = self.entities[entity] = NodeStats()
+            entity_stats.calls += 1
+            entity_stats.own += own
+            entity_stats.cumulative += elapsed
+
+    def collapsed(self) -> str:
+        """
+        Pilas en formato colapsado (`marco;marco;... microsegundos`), compatible
+        con flamegraph.pl, speedscope o inferno.
+        """
+        return "".join(
+            f"{';'.join(stack)} {round(own * 1e6)}\n"
+            for stack, own in self.stacks.items()
+        )
+
+    def write_collapsed(self, path: str):
+        with open(path, "w") as file:
+            file.write(self.collapsed())
+
+    def table(self, limit: Optional[int] = 20) -> str:
+        """
+        Tabla de los nodos y entidades con mayor tiempo propio.
+        """
+        lines = [
+            f"{'calls':>10} {'hits':>10} {'cumulative ms':>14} {'own ms':>10}  node",
+        ]
+
+        def rows(stats: dict[Any, NodeStats], label) -> list[str]:
+            ordered = sorted(stats.items(), key=lambda item: item[1].own, reverse=True)
+            return [
+                f"{s.calls:>10} {s.hits:>10} {s.cumulative * 1e3:>14.3f} "
+                f"{s.own * 1e3:>10.3f}  {label(key)}"
+                for key, s in ordered[:limit]
+            ]
+
+        lines.extend(rows(self.nodes, node_label))
+        lines.append("")
+        lines.append(
+            f"{'calls':>10} {'':>10} {'cumulative ms':>14} {'own ms':>10}  entity"
+        )
+        lines.extend(rows(self.entities, _entity_label))
+        lines.append("")
+        lines.append(f"visited hits {self.hits}, misses {self.misses}")
+        return "\n".join(lines)
+
+    def clear(self):
+        self.nodes.clear()
+        self.entities.clear()
+        self.stacks.clear()
+        # descarta tambien los marcos de una evaluacion interrumpida
+        self._frames.clear()
+        self._active.clear()
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({len(self.nodes)} nodes, "
+            f"hits={self.hits}, misses={self.misses})"
+        )
+
+
+class ProfilingEvaluator[T](Evaluator[T]):
+    """
+    Evaluator que registra sus estadisticas en `profile`, compartido con sus
+    subevaluators.
+    """
+
+    def __init__(
+        self,
+        argument: T,
+        parent: Optional[Self] = None,
+        scope: Optional[dict[Entity, T]] = None,
+        cache: Optional[CallCache] = None,
+        limits: Optional[LoopLimits] = None,
+        bindings: Optional[Bindings] = None,
+        profile: Optional[Profile] = None,
+    ):
+        super().__init__(argument, parent, scope, cache, limits, bindings)
+        if profile is None:
+            profile = parent._profile if parent is not None else Profile()
+        self._profile = profile
+
+    def preprocess_node(self, node: Node) -> T:
+        result = super().preprocess_node(node)
+        if result is self.CONTINUE:
+            self._profile.enter(node)
+        else:
+            self._profile.hit(node)
+        return result
+
+    def postprocess_node(self, node: Node, result: T):
+        self._profile.exit(node)
+        return super().postprocess_node(node, result)
+
+    def when_exception(self, node: Node, e: Exception):
+        try:
+            return super().when_exception(node, e)
+        except BaseException:
+            self._profile.exit(node)
+            raise
+
+
+def eval_profiled[T](
+    node: Node,
+    argument: T,
+    /,
+    scope: dict[Entity, T],
+    profile: Optional[Profile] = None,
+    iterative: bool = False,
+) -> tuple[T, Profile]:
+    """
+    Evalua `node` como `eval` y devuelve el resultado junto a su Profile (nuevo
+    o el recibido, que acumula entre evaluaciones).
+    """
+    evaluator = ProfilingEvaluator(
+        argument=argument,
+        parent=None,
+        scope=scope,
+        bindings=(
+            bind(node, scope)
+            if isinstance(scope, Environment) and isinstance(node, Trunk)
+            else None
+        ),
+        profile=profile,
+    )
+    run = evaluator.walk if iterative else evaluator
+    return run(node), evaluator._profile
@@ -0,0 +1,252 @@
+"""
+Optimizacion por saturacion de igualdades (egglog).
+
+Las subexpresiones aritmeticas de un Trunk (Apply de know.ADD/SUB/MUL sobre una
+Composition de dos operandos) se traducen al sort `Term` de egglog; el resto de
+nodos son opacos y se representan como `Term.var`. Tras saturar con un conjunto
+de reglas acotado en iteraciones y tiempo, se extrae el termino de menor coste de
+cada raiz aritmetica y se traduce de vuelta a nodos del dfg.
+
+Los tipos de los operandos opacos no se conocen: `+` y `*` pueden ser
+concatenaciones o aritmetica en coma flotante, donde la conmutatividad, la
+asociatividad o la distributividad no se cumplen. Por eso las reglas por defecto
+(ARITHMETIC_RULES) solo pliegan constantes enteras; INTEGER_RULES anade las leyes
+algebraicas y solo es correcto si todos los operandos son enteros.
+
+Los literales son i64: si una regla falla (un plegado que desborda) el trunk se
+deja sin cambios.
+"""
+
+from __future__ import annotations
+
+from time import perf_counter
+from typing import Optional
+
+from egglog import (
+    EGraph,
+    Expr,
+    Ruleset,
+    StringLike,
+    get_callable_args,
+    get_literal_value,
+    i64,
+    i64Like,
+    method,
+    rewrite,
+    ruleset,
+)
+from egglog.bindings import EggSmolError
+
+from axis.components.entity import know
+
+from ..tuple import Tuple
+from .analysis import graph_index
+from .model import Apply, Composition, Constant, Node, Trunk, Use
+from .transform import Transform
+
+__all__ = [
+    "Term",
+    "ARITHMETIC_RULES",
+    "INTEGER_RULES",
+    "EqualitySaturation",
+]
+
+I64_MIN, I64_MAX = -(2**63), 2**63 - 1
+
+
+class Term(Expr):
+    def __init__(self, value: i64Like) -> None: ...
+
+    @classmethod
+    def var(cls, name: StringLike) -> Term: ...
+
+    def __add__(self, other: Term) -> Term: ...
+
+    def __sub__(self, other: Term) -> Term: ...
+
+    @method(cost=4)
+    def __mul__(self, other: Term) -> Term: ...
+
+
+def _fold_constants(i: i64, j: i64):
+    yield rewrite(Term(i) + Term(j)).to(Term(i + j))
+    yield rewrite(Term(i) - Term(j)).to(Term(i - j))
+    yield rewrite(Term(i) * Term(j)).to(Term(i * j))
+
+
+@ruleset
+def ARITHMETIC_RULES(i: i64, j: i64):
+    # plegado de constantes: solo opera sobre literales enteros
+    yield from _fold_constants(i, j)
+
+
+@ruleset
+def INTEGER_RULES(a: Term, b: Term, c: Term, i: i64, j: i64):
+    # conmutatividad y asociatividad
+    yield rewrite(a + b).to(b + a)
+    yield rewrite(a * b).to(b * a)
+    yield rewrite((a + b) + c).to(a + (b + c))
+    yield rewrite((a * b) * c).to(a * (b * c))
+    # distributividad (en ambos sentidos)
+    yield rewrite(a * (b + c)).to(a * b + a * c)
+    yield rewrite(a * b + a * c).to(a * (b + c))
+    yield from _fold_constants(i, j)
+
+
+_OPERATORS = {
+    know.ADD: Term.__add__,
+    know.SUB: Term.__sub__,
+    know.MUL: Term.__mul__,
+}
+
+
+def _arithmetic_operands(node: Node) -> Optional[tuple[Node, Node]]:
+    match node:
+        case Apply(function=Use(entity=entity), argument=Composition(inputs=inputs)):
+            if entity in _OPERATORS and tuple(inputs.keys()) == (0, 1):
+                return inputs[0], inputs[1]
+    return None
+
+
+def _is_i64(node: Node) -> bool:
+    match node:
+        case Constant(value=int() as value) if not isinstance(value, bool):
+            return I64_MIN <= value <= I64_MAX
+    return False
+
+
+class EqualitySaturation(Transform):
+    """
+    Reescribe las subexpresiones aritmeticas de cada trunk por su equivalente de
+    menor coste segun `rules`. La saturacion se detiene al alcanzar el punto fijo,
+    `max_iterations` iteraciones o `time_limit` segundos.
+
+    Con las reglas por defecto solo se pliegan constantes; usar INTEGER_RULES
+    unicamente si se sabe que todos los operandos del trunk son enteros.
+    """
+
+    def __init__(
+        self,
+        rules: Ruleset = ARITHMETIC_RULES,
+        max_iterations: int = 16,
+        time_limit: float = 1.0,
+    ):
+        self.rules = rules
+        self.max_iterations = max_iterations
+        self.time_limit = time_limit
+        self.iterations = 0
+
+    def transform_trunk(self, trunk: Trunk) -> Trunk:
+        if (transformed := self._trunks.get(trunk)) is not None:
+            return transformed
+
+        index = graph_index(trunk)
+        order = index.order
+        arithmetic = {node for node in order if _arithmetic_operands(node) is not None}
+
+        if not arithmetic:
+            return super().transform_trunk(trunk)
+
+        # raices: nodos aritmeticos consumidos fuera de la aritmetica
+        roots = {
+            node
+            for node in arithmetic
+            if node is trunk.result
+            or any(user not in arithmetic for user in index.users[node])
+        }
+
+        opaque: dict[str, Node] = {}
+        extracted = self.saturate(self.to_terms(order, arithmetic, roots, opaque))
+        if extracted is None:
+            return super().transform_trunk(trunk)
+
+        mapping: dict[Node, Node] = {}
+        for node in order:
+            if node in roots:
+                mapping[node] = self.from_term(extracted[node], opaque, mapping)
+                if mapping[node] is not node:
+                    self.rewritten += 1
+            elif node not in arithmetic:
+                mapping[node] = self.rewrite(self.rebuild(node, mapping))
+
+        transformed = self._trunks[trunk] = self.build_trunk(
+            (mapping[child] for child in trunk.children if child in mapping),
+            mapping[trunk.result],
+        )
+        return transformed
+
+    def to_terms(
+        self,
+        order: list[Node],
+        arithmetic: set[Node],
+        roots: set[Node],
+        opaque: dict[str, Node],
+    ) -> dict[Node, Term]:
+        """
+        Traduce los nodos aritmeticos a terminos; los operandos no aritmeticos se
+        registran en `opaque` por nombre de variable.
+        """
+        terms: dict[Node, Term] = {}
+        variables: dict[Node, Term] = {}
+
+        def term_of(node: Node) -> Term:
+            if node in arithmetic:
+                return terms[node]
+            if _is_i64(node):
+                return Term(node.value)
+            if (variable := variables.get(node)) is None:
+                name = f"n{len(opaque)}"
+                opaque[name] = node
+                variable = variables[node] = Term.var(name)
+            return variable
+
+        for node in order:
+            if node in arithmetic:
+                lhs, rhs = _arithmetic_operands(node)
+                operator = _OPERATORS[node.function.entity]
+                terms[node] = operator(term_of(lhs), term_of(rhs))
+
+        return {root: terms[root] for root in roots}
+
+    def saturate(self, terms: dict[Node, Term]) -> Optional[dict[Node, Term]]:
+        """
+        Terminos de menor coste equivalentes a `terms`, o None si una regla falla
+        (p.ej. el plegado de constantes desborda i64).
+        """
+        egraph = EGraph()
+        lets = {
+            node: egraph.let(f"r{n}", term)
+            for n, (node, term) in enumerate(terms.items())
+        }
+
+        start = perf_counter()
+        for _ in range(self.max_iterations):
+            try:
+                report = egraph.run(1, ruleset=self.rules)
+            except EggSmolError:
+                return None
+            self.iterations += 1
+            if not report.updated or perf_counter() - start > self.time_limit:
+                break
+
+        return {node: egraph.extract(term) for node, term in lets.items()}
+
+    def from_term(
+        self, term: Term, opaque: dict[str, Node], mapping: dict[Node, Node]
+    ) -> Node:
+        if (args := get_callable_args(term, Term.var)) is not None:
+            node = opaque[get_literal_value(args[0])]
+            return mapping.get(node, node)
+
+        if (args := get_callable_args(term, Term)) is not None:
+            return Constant(value=get_literal_value(args[0]))
+
+        for entity, operator in _OPERATORS.items():
+            if (args := get_callable_args(term, operator)) is not None:
+                lhs, rhs = (self.from_term(arg, opaque, mapping) for arg in args)
+                return Apply(
+                    function=Use(entity=entity),
+                    argument=Composition(inputs=Tuple.from_args(lhs, rhs)),
+                )
+
+        raise ValueError(f"Cannot translate term {term} back to a dfg node")
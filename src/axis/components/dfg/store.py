@@ -0,0 +1,468 @@
+"""
+Almacen compacto de nodos en arrays (struct of arrays).
+
+Cada nodo ocupa una posicion en tres arrays paralelos: `opcodes` (int8) y los
+campos `first` y `second` (int32). Los valores (nombres de Leaf, entidades de
+Use, valores de Constant, claves de Composition y Switch) se guardan una sola vez
+en el pool de constantes `pool`; los operandos de longitud variable se guardan en
+el array `operands` (int32) y el nodo guarda su rango [first, second):
+
+    LEAF         first = pool(name)
+    USE          first = pool(entity)
+    CONSTANT     first = pool(value), second = -1
+                 first = indice del Trunk, second = NODE_VALUE si el valor es un
+                 Trunk
+    COMPOSITION  operands[first:second] = pool(keys), *inputs
+    APPLY        first = function, second = argument
+    SWITCH       operands[first:second] = selector, input | -1, pool(keys), *branches
+    LOOP         first = input | -1, second = iteration
+    TRUNK        operands[first:second] = result, *children
+
+Un nodo ocupa 9 bytes mas sus operandos, frente a los cientos de bytes de un
+Object de protobase con su Tuple, su frozendict y su entrada en la tabla de
+consing. `add` convierte nodos del modelo (deduplicando los compartidos) y
+`node` los reconstruye; los Processor trabajan sobre los nodos reconstruidos,
+que por ser hash-consed son los mismos objetos que los originales.
+
+StoreEvaluator (y `eval_store`) evalua directamente sobre los arrays, sin
+reconstruir los nodos, con la semantica de Evaluator. Solo reconstruye los Trunk
+usados como valor (Constant), que pueden salir del almacen como resultado.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Any, Iterable, Iterator, Mapping, Optional
+
+from frozendict import frozendict
+
+from ..tuple import Tuple
+from .dispatch import Dispatcher
+from .eval import Evaluator
+from .loop import NO_LOOP_LIMITS, LoopGuard, LoopLimits, loop_step
+from .model import (
+    Apply,
+    Composition,
+    Constant,
+    Entity,
+    Leaf,
+    Loop,
+    Node,
+    Switch,
+    Trunk,
+    Use,
+    references,
+)
+
+__all__ = [
+    "NodeStore",
+    "StoreEvaluator",
+    "eval_store",
+]
+
+NONE = -1  # operando opcional ausente
+NODE_VALUE = 1  # el valor de un CONSTANT es un nodo (un Trunk) del almacen
+
+_MISSING = object()
+
+
+class NodeStore:
+    LEAF, USE, CONSTANT, COMPOSITION, APPLY, SWITCH, LOOP, TRUNK = range(8)
+
+    def __init__(self):
+        self.opcodes = array("b")
+        self.first = array("i")
+        self.second = array("i")
+        self.operands = array("i")
+        self.pool: list[Any] = []
+        # tipo -> valor -> indice: 1, 1.0 y True son valores distintos
+        self._pool_index: dict[type, dict[Any, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memoria de los arrays y del pool (sin contar los valores del pool).
+        """
+        arrays = (self.opcodes, self.first, self.second, self.operands)
+        return sum(a.buffer_info()[1] * a.itemsize for a in arrays) + (
+            8 * len(self.pool)
+        )
+
+    ## Construccion directa
+
+    def intern(self, value: Any) -> int:
+        """
+        Indice de `value` en el pool, añadiendolo si no esta.
+        """
+        if (indices := self._pool_index.get(value.__class__)) is None:
+            indices = self._pool_index[value.__class__] = {}
+        if (index := indices.get(value)) is None:
+            index = indices[value] = len(self.pool)
+            self.pool.append(value)
+        return index
+
+    def _append(self, opcode: int, first: int, second: int = NONE) -> int:
+        self.opcodes.append(opcode)
+        self.first.append(first)
+        self.second.append(second)
+        return len(self.opcodes) - 1
+
+    def _append_operands(self, opcode: int, operands: Iterable[int]) -> int:
+        start = len(self.operands)
+        self.operands.extend(operands)
+        return self._append(opcode, start, len(self.operands))
+
+    def leaf(self, name: str) -> int:
+        return self._append(self.LEAF, self.intern(name))
+
+    def use(self, entity: Entity) -> int:
+        return self._append(self.USE, self.intern(entity))
+
+    def constant(self, value: Any) -> int:
+        return self._append(self.CONSTANT, self.intern(value))
+
+    def constant_trunk(self, trunk: int) -> int:
+        return self._append(self.CONSTANT, trunk, NODE_VALUE)
+
+    def composition(self, keys: tuple, inputs: Iterable[int]) -> int:
+        return self._append_operands(self.COMPOSITION, [self.intern(keys), *inputs])
+
+    def apply(self, function: int, argument: int) -> int:
+        return self._append(self.APPLY, function, argument)
+
+    def switch(
+        self, selector: int, keys: tuple, branches: Iterable[int], input: int = NONE
+    ) -> int:
+        return self._append_operands(
+            self.SWITCH, [selector, input, self.intern(keys), *branches]
+        )
+
+    def loop(self, input: int, iteration: int) -> int:
+        return self._append(self.LOOP, input, iteration)
+
+    def trunk(self, children: Iterable[int], result: int) -> int:
+        return self._append_operands(self.TRUNK, [result, *children])
+
+    ## Lectura
+
+    def opcode(self, index: int) -> int:
+        return self.opcodes[index]
+
+    def operands_of(self, index: int) -> list[int]:
+        """
+        Indices de los nodos que usa el nodo `index` (sin los valores del pool).
+        """
+        opcode, first, second = (
+            self.opcodes[index],
+            self.first[index],
+            self.second[index],
+        )
+        match opcode:
+            case self.CONSTANT if second == NODE_VALUE:
+                return [first]
+            case self.COMPOSITION:
+                return list(self.operands[first + 1 : second])
+            case self.TRUNK:
+                return list(self.operands[first:second])
+            case self.APPLY:
+                return [first, second]
+            case self.SWITCH:
+                selector, input = self.operands[first], self.operands[first + 1]
+                branches = list(self.operands[first + 3 : second])
+                return [selector, *([] if input == NONE else [input]), *branches]
+            case self.LOOP:
+                return [second] if first == NONE else [first, second]
+        return []
+
+    def children(self, index: int) -> array:
+        """
+        Indices de los children de un TRUNK.
+        """
+        assert self.opcodes[index] == self.TRUNK
+        return self.operands[self.first[index] + 1 : self.second[index]]
+
+    ## Conversion con el modelo
+
+    def add(self, *roots: Node) -> list[int]:
+        """
+        Añade los nodos del modelo alcanzables desde `roots` (incluidos los trunks
+        anidados) y devuelve los indices de las raices. Los nodos compartidos se
+        almacenan una sola vez.
+        """
+        indices: dict[Node, int] = {}
+        for root in roots:
+            # recorrido en postorden con pila explicita
+            stack = [(root, iter(references(root)))]
+            while stack:
+                node, pending = stack[-1]
+                for operand in pending:
+                    if operand not in indices:
+                        stack.append((operand, iter(references(operand))))
+                        break
+                else:
+                    stack.pop()
+                    if node not in indices:
+                        indices[node] = self._add_node(node, indices)
+        return [indices[root] for root in roots]
+
+    def _add_node(self, node: Node, indices: dict[Node, int]) -> int:
+        match node:
+            case Leaf(name=name):
+                return self.leaf(name)
+            case Use(entity=entity):
+                return self.use(entity)
+            case Constant(value=Trunk() as trunk):
+                return self.constant_trunk(indices[trunk])
+            case Constant(value=value):
+                return self.constant(value)
+            case Composition(inputs=inputs):
+                return self.composition(
+                    tuple(inputs.keys()), [indices[i] for i in inputs.values()]
+                )
+            case Apply(function=function, argument=argument):
+                return self.apply(indices[function], indices[argument])
+            case Switch(input=input, selector=selector, branches=branches):
+                return self.switch(
+                    indices[selector],
+                    tuple(branches.keys()),
+                    [indices[branch] for branch in branches.values()],
+                    NONE if input is None else indices[input],
+                )
+            case Loop(input=input, iteration=iteration):
+                return self.loop(
+                    NONE if input is None else indices[input], indices[iteration]
+                )
+            case Trunk(children=children, result=result):
+                return self.trunk([indices[c] for c in children], indices[result])
+        raise TypeError(f"Invalid node type {node.__class__}")
+
+    def node(self, index: int) -> Node:
+        """
+        Reconstruye el nodo `index` (y los que usa) como nodo del modelo.
+        """
+        return self.nodes([index])[0]
+
+    def nodes(self, indices: Iterable[int]) -> list[Node]:
+        indices = list(indices)
+        built: dict[int, Node] = {}
+        for root in indices:
+            stack = [(root, iter(self.operands_of(root)))]
+            while stack:
+                index, pending = stack[-1]
+                for operand in pending:
+                    if operand not in built:
+                        stack.append((operand, iter(self.operands_of(operand))))
+                        break
+                else:
+                    stack.pop()
+                    if index not in built:
+                        built[index] = self._build_node(index, built)
+        return [built[index] for index in indices]
+
+    def _build_node(self, index: int, built: dict[int, Node]) -> Node:
+        opcode, first, second = (
+            self.opcodes[index],
+            self.first[index],
+            self.second[index],
+        )
+        pool, operands = self.pool, self.operands
+        match opcode:
+            case self.LEAF:
+                return Leaf(name=pool[first])
+            case self.USE:
+                return Use(entity=pool[first])
+            case self.CONSTANT:
+                value = built[first] if second == NODE_VALUE else pool[first]
+                return Constant(value=value)
+            case self.COMPOSITION:
+                keys = pool[operands[first]]
+                inputs = [built[i] for i in operands[first + 1 : second]]
+                return Composition(inputs=Tuple(dict(zip(keys, inputs))))
+            case self.APPLY:
+                return Apply(function=built[first], argument=built[second])
+            case self.SWITCH:
+                selector, input, keys = operands[first : first + 3]
+                branches = [built[i] for i in operands[first + 3 : second]]
+                return Switch(
+                    input=None if input == NONE else built[input],
+                    selector=built[selector],
+                    branches=frozendict(zip(pool[keys], branches)),
+                )
+            case self.LOOP:
+                return Loop(
+                    input=None if first == NONE else built[first],
+                    iteration=built[second],
+                )
+            case self.TRUNK:
+                return Trunk(
+                    children=tuple(built[i] for i in operands[first + 1 : second]),
+                    result=built[operands[first]],
+                )
+        raise ValueError(f"Invalid opcode {opcode}")
+
+    @classmethod
+    def from_nodes(cls, *roots: Node) -> tuple[NodeStore, list[int]]:
+        store = cls()
+        return store, store.add(*roots)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self.opcodes)))
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({len(self)} nodes, "
+            f"{len(self.pool)} constants, {self.nbytes} bytes)"
+        )
+
+
+class StoreEvaluator:
+    """
+    Evaluador que recorre los arrays de un NodeStore.
+
+    Cada aplicacion de un Trunk usa un marco propio (sus valores por indice de
+    nodo). Los Trunk que no estan en el almacen (p.ej. los del scope) se evaluan
+    con Evaluator.
+    """
+
+    def __init__(
+        self,
+        store: NodeStore,
+        scope: Mapping[Entity, Any],
+        limits: Optional[LoopLimits] = None,
+    ):
+        self.store = store
+        self.scope = scope
+        self.limits = limits if limits is not None else NO_LOOP_LIMITS
+        self._dispatchers: dict[int, Dispatcher] = {}
+        # Trunk usados como valor, reconstruidos una vez, y su indice
+        self._trunks: dict[int, Trunk] = {}
+        self._indices: dict[Trunk, int] = {}
+
+    def __call__(self, index: int, argument: Any) -> Any:
+        """
+        Evalua el nodo `index` con `argument` como valor del Leaf.
+        """
+        return self.eval(index, argument, {})
+
+    def eval(self, index: int, argument: Any, values: dict[int, Any]) -> Any:
+        if (value := values.get(index, _MISSING)) is not _MISSING:
+            return value
+
+        store = self.store
+        opcode, first, second = (
+            store.opcodes[index],
+            store.first[index],
+            store.second[index],
+        )
+        match opcode:
+            case NodeStore.LEAF:
+                value = argument
+            case NodeStore.USE:
+                entity = store.pool[first]
+                if entity not in self.scope:
+                    raise NotImplementedError(f"Use {entity} not found in {self}")
+                value = self.scope[entity]
+            case NodeStore.CONSTANT if second == NODE_VALUE:
+                value = self.trunk(first)
+            case NodeStore.CONSTANT:
+                value = store.pool[first]
+            case NodeStore.COMPOSITION:
+                keys = store.pool[store.operands[first]]
+                inputs = [
+                    self.eval(i, argument, values)
+                    for i in store.operands[first + 1 : second]
+                ]
+                value = Tuple(dict(zip(keys, inputs)))
+            case NodeStore.APPLY:
+                function = self.eval(first, argument, values)
+                value = self.apply(function, self.eval(second, argument, values))
+            case NodeStore.SWITCH:
+                value = self.switch(index, argument, values)
+            case NodeStore.LOOP:
+                state = None if first == NONE else self.eval(first, argument, values)
+                value = self.loop(second, state)
+            case NodeStore.TRUNK:
+                for child in store.operands[first + 1 : second]:
+                    self.eval(child, argument, values)
+                value = self.eval(store.operands[first], argument, values)
+            case _:
+                raise ValueError(f"Invalid opcode {opcode}")
+
+        values[index] = value
+        return value
+
+    def trunk(self, index: int) -> Trunk:
+        """
+        Trunk `index` como nodo del modelo.
+        """
+        if (trunk := self._trunks.get(index)) is None:
+            trunk = self._trunks[index] = self.store.node(index)
+            self._indices[trunk] = index
+        return trunk
+
+    def apply(self, function: Any, argument: Any) -> Any:
+        if isinstance(function, Trunk):
+            if (index := self._indices.get(function)) is not None:
+                return self.eval(index, argument, {})
+            evaluator = Evaluator(argument, scope=self.scope, limits=self.limits)
+            return evaluator(function)
+
+        if callable(function):
+            if isinstance(argument, Tuple):
+                args, kwargs = argument.to_args()
+                return function(*args, **kwargs)
+
+            raise TypeError(
+                f"Invalid argument type {argument.__class__} for function {function}"
+            )
+        raise TypeError(f"Invalid function type {function.__class__}")
+
+    def switch(self, index: int, argument: Any, values: dict[int, Any]) -> Any:
+        store = self.store
+        first, second = store.first[index], store.second[index]
+        selector, input, keys = store.operands[first : first + 3]
+
+        if (dispatcher := self._dispatchers.get(index)) is None:
+            branches = dict(zip(store.pool[keys], store.operands[first + 3 : second]))
+            dispatcher = self._dispatchers[index] = Dispatcher(branches)
+        branch = dispatcher.select(self.eval(selector, argument, values))
+
+        if store.opcodes[branch] == NodeStore.TRUNK:
+            input = None if input == NONE else self.eval(input, argument, values)
+            return self.eval(branch, input, {})
+
+        assert input == NONE
+
+        return self.eval(branch, argument, values)
+
+    def loop(self, iteration: int, state: Any) -> Any:
+        guard = LoopGuard(self.limits)
+        while True:
+            done, state = loop_step(self.eval(iteration, state, {}), state)
+            if done:
+                return state
+            guard.tick()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.store!r})"
+
+
+def eval_store(
+    store: NodeStore,
+    index: int,
+    argument: Any,
+    /,
+    scope: Mapping[Entity, Any],
+    max_iterations: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Any:
+    """
+    Evalua el nodo `index` de `store` con `argument` como valor del Leaf, sin
+    reconstruir los nodos del modelo. Equivale a
+    `eval(store.node(index), argument, scope=scope)`.
+    """
+    limits = LoopLimits(max_iterations, timeout)
+    return StoreEvaluator(store, scope, limits)(index, argument)
@@ -0,0 +1,80 @@
+"""
+Evaluacion de un Trunk sobre un flujo de argumentos.
+
+eval_stream evalua `trunk` con cada argumento de un iterable y produce los
+resultados a medida que se consumen, sin materializar el iterable. Las filas se
+ejecutan con el programa lineal del trunk (Program.stream) sobre un unico array
+de registros, preasignado a partir de su plantilla: las Constant ya estan
+precargadas y los nodos que no dependen del argumento (`loop_invariants`: Use y
+subgrafos puros que solo dependen de ellos y de las Constant) se calculan una
+sola vez, como en la iteracion de un Loop.
+
+Con `chunk_size` las filas se agrupan en bloques de ese tamaño que se evaluan
+con eval_batch, una unica evaluacion por bloque sobre columnas de NumPy; los
+resultados se siguen produciendo fila a fila.
+"""
+
+from __future__ import annotations
+
+from itertools import islice, repeat
+from typing import Any, Iterable, Iterator, Optional
+
+from ..tuple import Tuple
+from .batch import eval_batch, np
+from .linear import linearize
+from .loop import LoopLimits
+from .model import Entity, Trunk
+
+__all__ = [
+    "eval_stream",
+]
+
+
+def _eval_chunks(
+    trunk: Trunk, arguments: Iterable[Tuple], scope: dict[Entity, Any], size: int
+) -> Iterator[Any]:
+    iterator = iter(arguments)
+    while chunk := list(islice(iterator, size)):
+        columns = {key: [row[key] for row in chunk] for key in chunk[0].keys()}
+        result = eval_batch(trunk, columns, scope)
+        if isinstance(result, dict):
+            raise TypeError(
+                f"Chunked evaluation requires a column result, got {result.keys()}"
+            )
+
+        result = np.asarray(result)
+        if result.ndim == 0:
+            yield from repeat(result.item(), len(chunk))
+        else:
+            yield from result.tolist()
+
+
+def eval_stream[T](
+    trunk: Trunk,
+    arguments: Iterable[T],
+    /,
+    scope: dict[Entity, T],
+    chunk_size: Optional[int] = None,
+    max_iterations: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Iterator[T]:
+    """
+    Iterador perezoso con el resultado de evaluar `trunk` con cada uno de
+    `arguments`, en orden. Solo mantiene en memoria la fila en curso (o el
+    bloque en curso con `chunk_size`).
+
+    Con `chunk_size` los argumentos deben ser Tuple con las mismas claves y el
+    trunk debe poder evaluarse por lotes (ver eval_batch).
+
+    `max_iterations` y `timeout` limitan cada ejecucion de un Loop.
+    """
+    if chunk_size is not None:
+        if chunk_size < 1:
+            raise ValueError(f"Invalid chunk size {chunk_size}")
+        if np is None:
+            raise ImportError("Chunked eval_stream requires numpy, install axis[batch]")
+        return _eval_chunks(trunk, arguments, scope, chunk_size)
+
+    return linearize(trunk).stream(
+        arguments, scope, LoopLimits(max_iterations, timeout)
+    )
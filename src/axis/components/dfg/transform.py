@@ -0,0 +1,489 @@
+"""
+Transformaciones (pasadas de optimizacion) sobre Trunks.
+
+Los nodos son inmutables y hash-consed, de modo que una pasada no modifica el
+grafo: lo reconstruye de abajo a arriba y los nodos cuyos operandos no cambian
+se recuperan identicos de la tabla de consing. Las pasadas se aplican tambien a
+los trunks anidados (Constant, ramas de Switch e iteraciones de Loop).
+
+Cada pasada informa del numero de nodos eliminados y del de nodos reescritos
+para poder medir su efecto sobre la evaluacion: una pasada como FoldConstants
+reescribe nodos sin eliminarlos (sus operandos los elimina EliminateDeadNodes).
+
+Los recorridos usan el GraphIndex de cada trunk (ver analysis.graph_index), que
+se calcula una vez y se comparte con el resto de pasadas y analisis.
+"""
+
+from __future__ import annotations
+
+import operator as op
+import sys
+from types import ModuleType
+from typing import Any, Callable, Collection, Iterable, Iterator, NamedTuple, Optional
+
+from frozendict import frozendict
+
+from axis.components.entity import know
+
+from ..tuple import Tuple
+from .analysis import graph_index
+from .cache import PURE_BUILTINS, is_pure
+from .dispatch import dispatcher
+from .model import (
+    Apply,
+    Composition,
+    Constant,
+    Entity,
+    Leaf,
+    Loop,
+    Node,
+    Switch,
+    Trunk,
+    Use,
+)
+
+__all__ = [
+    "FOLDABLE_BUILTINS",
+    "COMMUTATIVE_BUILTINS",
+    "PassReport",
+    "Transform",
+    "FoldConstants",
+    "CollapseSwitches",
+    "EliminateDeadNodes",
+    "CommonSubexpressions",
+    "SharingReport",
+    "DEFAULT_PASSES",
+    "iter_nodes",
+    "count_nodes",
+    "optimize",
+    "share",
+    "share_module",
+]
+
+FOLDABLE_BUILTINS: dict[Entity, Callable] = {
+    know.EQ: op.eq,
+    know.NE: op.ne,
+    know.LT: op.lt,
+    know.LE: op.le,
+    know.GT: op.gt,
+    know.GE: op.ge,
+    know.ADD: op.add,
+    know.SUB: op.sub,
+    know.MUL: op.mul,
+    know.TRUEDIV: op.truediv,
+    know.FLOORDIV: op.floordiv,
+    know.MOD: op.mod,
+    know.POW: op.pow,
+    know.LSHIFT: op.lshift,
+    know.RSHIFT: op.rshift,
+    know.AND: op.and_,
+    know.OR: op.or_,
+    know.XOR: op.xor,
+    know.GET_ATTR: op.getitem,
+}
+
+# operadores cuyo orden de operandos es irrelevante sea cual sea su tipo; ADD
+# no lo es con cadenas, listas o tuplas (concatenacion)
+COMMUTATIVE_BUILTINS: frozenset[Entity] = frozenset(
+    {know.EQ, know.NE, know.MUL, know.AND, know.OR, know.XOR}
+)
+
+
+class PassReport(NamedTuple):
+    name: str
+    before: int
+    after: int
+    rewritten: int = 0
+
+    @property
+    def removed(self) -> int:
+        return self.before - self.after
+
+
+def iter_nodes(*trunks: Trunk) -> Iterator[Node]:
+    """
+    Recorre los nodos distintos de `trunks`, incluyendo sus trunks anidados.
+    """
+    seen = set()
+    visited_trunks = set()
+    pending = list(trunks)
+
+    while pending:
+        current = pending.pop()
+        if current in visited_trunks:
+            continue
+        visited_trunks.add(current)
+        index = graph_index(current)
+        for node in index.order:
+            if node not in seen:
+                seen.add(node)
+                yield node
+        pending.extend(index.nested)
+
+
+def count_nodes(trunk: Trunk) -> int:
+    """
+    Numero de nodos distintos de un trunk, incluyendo sus trunks anidados.
+    """
+    return sum(1 for _ in iter_nodes(trunk))
+
+
+class Transform:
+    """
+    Pasada de reescritura de un Trunk.
+
+    Las subclases redefinen `rewrite` (por nodo, con los operandos ya reescritos)
+    y/o `build_trunk` (por trunk, con los children ya reescritos).
+    """
+
+    @property
+    def name(self) -> str:
+        return self.__class__.__name__
+
+    rewritten: int = 0
+
+    def __call__(self, trunk: Trunk) -> Trunk:
+        self._trunks: dict[Trunk, Trunk] = {}
+        self.rewritten = 0
+        try:
+            return self.transform_trunk(trunk)
+        finally:
+            del self._trunks
+
+    def rewrite(self, node: Node) -> Node:
+        return node
+
+    def build_trunk(self, children: Iterable[Node], result: Node) -> Trunk:
+        return Trunk(children=tuple(dict.fromkeys(children)), result=result)
+
+    def transform_trunk(self, trunk: Trunk) -> Trunk:
+        if (transformed := self._trunks.get(trunk)) is not None:
+            return transformed
+
+        mapping: dict[Node, Node] = {}
+        for node in graph_index(trunk).order:
+            rebuilt = self.rebuild(node, mapping)
+            mapping[node] = rewritten = self.rewrite(rebuilt)
+            if rewritten is not rebuilt:
+                self.rewritten += 1
+
+        transformed = self._trunks[trunk] = self.build_trunk(
+            (mapping[child] for child in trunk.children), mapping[trunk.result]
+        )
+        return transformed
+
+    def rebuild(self, node: Node, mapping: dict[Node, Node]) -> Node:
+        """
+        Reconstruye `node` con sus operandos reescritos.
+        """
+
+        def mapped(operand: Any) -> Any:
+            return mapping.get(operand, operand)
+
+        match node:
+            case Constant(value=Trunk() as value):
+                return Constant(value=self.transform_trunk(value))
+            case Composition(inputs=inputs):
+                return Composition(inputs=inputs.map(mapped))
+            case Apply(function=function, argument=argument):
+                return Apply(function=mapped(function), argument=mapped(argument))
+            case Switch(input=input, selector=selector, branches=branches):
+                return Switch(
+                    input=None if input is None else mapped(input),
+                    selector=mapped(selector),
+                    branches=frozendict(
+                        {
+                            match: (
+                                self.transform_trunk(branch)
+                                if isinstance(branch, Trunk)
+                                else mapped(branch)
+                            )
+                            for match, branch in branches.items()
+                        }
+                    ),
+                )
+            case Loop(input=input, iteration=iteration):
+                return Loop(
+                    input=None if input is None else mapped(input),
+                    iteration=self.transform_trunk(iteration),
+                )
+            case Trunk(children=children, result=result):
+                return self.build_trunk(map(mapped, children), mapped(result))
+        return node
+
+
+class FoldConstants(Transform):
+    """
+    Sustituye Apply(Use(know.X), Composition(Constant, ...)) por una Constant
+    cuando know.X es un builtin puro de `builtins`.
+    """
+
+    def __init__(self, builtins: Optional[dict[Entity, Callable]] = None):
+        self.builtins = builtins if builtins is not None else FOLDABLE_BUILTINS
+
+    def rewrite(self, node: Node) -> Node:
+        match node:
+            case Apply(
+                function=Use(entity=entity), argument=Composition(inputs=inputs)
+            ):
+                if (function := self.builtins.get(entity)) is None:
+                    return node
+                if not all(_is_value_constant(input) for input in inputs.values()):
+                    return node
+                try:
+                    args, kwargs = inputs.map(lambda input: input.value).to_args()
+                    return Constant(value=function(*args, **kwargs))
+                except Exception:
+                    # el error se produce (y se informa) al evaluar
+                    return node
+        return node
+
+
+def _is_value_constant(node: Any) -> bool:
+    return isinstance(node, Constant) and not isinstance(node.value, Trunk)
+
+
+class CollapseSwitches(Transform):
+    """
+    Sustituye los Switch cuyo selector es constante por la rama seleccionada.
+    Una rama Trunk se convierte en su aplicacion sobre el input del Switch.
+    """
+
+    def rewrite(self, node: Node) -> Node:
+        match node:
+            case Switch(selector=Constant(value=selector)):
+                try:
+                    branch = dispatcher(node).select(selector)
+                except ValueError:
+                    # sin rama, el error se produce al evaluar
+                    return node
+                if isinstance(branch, Trunk):
+                    if node.input is None:
+                        return node
+                    return Apply(function=Constant(value=branch), argument=node.input)
+                return branch
+        return node
+
+
+class EliminateDeadNodes(Transform):
+    """
+    Elimina de los children los nodos que no alcanzan trunk.result.
+
+    Los Apply con efectos (que no son puros respecto a `pure`) se conservan
+    aunque su resultado no se use, junto a los nodos de los que dependen.
+    """
+
+    def __init__(self, pure: Collection[Entity] = PURE_BUILTINS):
+        self.pure = pure
+
+    def build_trunk(self, children: Iterable[Node], result: Node) -> Trunk:
+        trunk = super().build_trunk(children, result)
+        index = graph_index(trunk)
+
+        live = {result} | index.dependencies(result)
+        for child in trunk.children:
+            if isinstance(child, Apply) and not is_pure(child, self.pure):
+                if child not in live:
+                    live.add(child)
+                    live.update(index.dependencies(child))
+
+        # el leaf encabeza siempre el trunk (Trunk.leaf)
+        return Trunk(
+            children=tuple(
+                child
+                for n, child in enumerate(trunk.children)
+                if n == 0 or child in live
+            ),
+            result=result,
+        )
+
+
+class CommonSubexpressions(Transform):
+    """
+    Numeracion de valores global.
+
+    Los nodos ya son hash-consed, de modo que dos subgrafos estructuralmente
+    iguales son el mismo objeto; esta pasada canonicaliza los que no lo son
+    pero calculan lo mismo:
+
+    - los operandos de los operadores conmutativos se ordenan por su numero de
+      valor (a*b y b*a pasan a ser el mismo nodo),
+    - know.GET_ATTR sobre una Composition con clave constante se sustituye por
+      la entrada correspondiente,
+    - los children se ordenan por numero de valor (que respeta el orden
+      topologico), salvo el leaf que encabeza el trunk,
+    - con `anonymous_leaves` todos los Leaf se sustituyen por un Leaf anonimo,
+      de modo que trunks que solo difieren en el nombre de la funcion compilada
+      se convierten en el mismo trunk.
+
+    La tabla de numeros de valor y los trunks ya transformados se conservan entre
+    llamadas, por lo que todos los trunks procesados por una misma instancia
+    comparten sus subgrafos comunes.
+    """
+
+    ANONYMOUS_LEAF = Leaf(name="_")
+
+    def __init__(
+        self,
+        commutative: Collection[Entity] = COMMUTATIVE_BUILTINS,
+        anonymous_leaves: bool = False,
+    ):
+        self.commutative = commutative
+        self.anonymous_leaves = anonymous_leaves
+        self._numbers: dict[Node, int] = {}
+        self._trunks: dict[Trunk, Trunk] = {}
+
+    def __call__(self, trunk: Trunk) -> Trunk:
+        return self.transform_trunk(trunk)
+
+    def number(self, node: Node) -> int:
+        if (number := self._numbers.get(node)) is None:
+            number = self._numbers[node] = len(self._numbers)
+        return number
+
+    def rewrite(self, node: Node) -> Node:
+        match node:
+            case Leaf() if self.anonymous_leaves:
+                node = self.ANONYMOUS_LEAF
+            case Apply(
+                function=Use(entity=entity), argument=Composition(inputs=inputs)
+            ) if entity in self.commutative and tuple(inputs.keys()) == (0, 1):
+                lhs, rhs = inputs[0], inputs[1]
+                if self.number(rhs) < self.number(lhs):
+                    node = Apply(
+                        function=node.function,
+                        argument=Composition(inputs=Tuple.from_args(rhs, lhs)),
+                    )
+            case Apply(
+                function=Use(entity=know.GET_ATTR),
+                argument=Composition(inputs=inputs),
+            ) if tuple(inputs.keys()) == (0, 1):
+                match inputs[0], inputs[1]:
+                    case Composition(inputs=fields), Constant(value=key):
+                        if key in fields.keys():
+                            node = fields[key]
+
+        self.number(node)
+        return node
+
+    def build_trunk(self, children: Iterable[Node], result: Node) -> Trunk:
+        leaf, *rest = dict.fromkeys(children)
+        return Trunk(children=(leaf, *sorted(rest, key=self.number)), result=result)
+
+
+class SharingReport(NamedTuple):
+    trunks: int
+    nodes_before: int  # suma de nodos por trunk (trabajo de evaluacion)
+    nodes_after: int
+    distinct_before: int  # nodos distintos entre todos los trunks
+    distinct_after: int
+    bytes_before: int  # memoria de los nodos distintos
+    bytes_after: int
+
+    @property
+    def removed(self) -> int:
+        return self.nodes_before - self.nodes_after
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+def _node_size(node: Node) -> int:
+    size = sys.getsizeof(node)
+    if isinstance(node, Composition):
+        size += sys.getsizeof(node.inputs) + sys.getsizeof(node.inputs._inner)
+    elif isinstance(node, Trunk):
+        size += sys.getsizeof(node.children)
+    return size
+
+
+def share(
+    trunks: Iterable[Trunk],
+    /,
+    passes: Optional[Iterable[Transform]] = None,
+    anonymous_leaves: bool = False,
+) -> tuple[list[Trunk], SharingReport]:
+    """
+    Aplica una misma instancia de CommonSubexpressions (seguida de `passes`, por
+    defecto EliminateDeadNodes) a todos los `trunks`, de modo que comparten sus
+    subgrafos comunes, e informa de la reduccion de nodos y memoria.
+    """
+    trunks = list(trunks)
+    cse = CommonSubexpressions(anonymous_leaves=anonymous_leaves)
+    passes = [EliminateDeadNodes()] if passes is None else list(passes)
+
+    shared = []
+    for trunk in trunks:
+        trunk = cse(trunk)
+        for transform in passes:
+            trunk = transform(trunk)
+        shared.append(trunk)
+
+    before = list(iter_nodes(*trunks))
+    after = list(iter_nodes(*shared))
+
+    return shared, SharingReport(
+        trunks=len(trunks),
+        nodes_before=sum(map(count_nodes, trunks)),
+        nodes_after=sum(map(count_nodes, shared)),
+        distinct_before=len(before),
+        distinct_after=len(after),
+        bytes_before=sum(map(_node_size, before)),
+        bytes_after=sum(map(_node_size, after)),
+    )
+
+
+def share_module(module: ModuleType, anonymous_leaves: bool = False) -> SharingReport:
+    """
+    Aplica `share` a todos los Trunks definidos en `module` y los reemplaza en el
+    modulo por sus versiones compartidas.
+    """
+    names = [name for name, value in vars(module).items() if isinstance(value, Trunk)]
+    shared, report = share(
+        (getattr(module, name) for name in names), anonymous_leaves=anonymous_leaves
+    )
+
+    for name, trunk in zip(names, shared):
+        setattr(module, name, trunk)
+
+    return report
+
+
+DEFAULT_PASSES: tuple[type[Transform], ...] = (
+    FoldConstants,
+    CollapseSwitches,
+    EliminateDeadNodes,
+)
+
+
+def optimize(
+    trunk: Trunk,
+    passes: Optional[Iterable[Transform]] = None,
+    /,
+    fixpoint: bool = True,
+) -> tuple[Trunk, list[PassReport]]:
+    """
+    Aplica `passes` (por defecto DEFAULT_PASSES) en orden y devuelve el trunk
+    optimizado junto al informe de cada pasada. Con `fixpoint` la secuencia se
+    repite mientras alguna pasada cambie el trunk.
+    """
+    if passes is None:
+        passes = [cls() for cls in DEFAULT_PASSES]
+    else:
+        passes = list(passes)
+
+    reports = []
+    while True:
+        start = trunk
+        for transform in passes:
+            before = count_nodes(trunk)
+            trunk = transform(trunk)
+            reports.append(
+                PassReport(
+                    transform.name, before, count_nodes(trunk), transform.rewritten
+                )
+            )
+
+        if not fixpoint or trunk is start:
+            return trunk, reports
@@ -0,0 +1,185 @@
+"""
+Reparseo incremental de un fichero a partir de sus bloques de outline.
+
+Una IncrementalParseSession conserva las lineas del fichero, sus bloques y, por
+cada bloque, una huella de su contenido y el resultado de parsearlo. Ante una
+edicion (un rango de texto sustituido, como en un editor) solo se vuelven a
+dividir en bloques las lineas de los bloques que toca la edicion, y solo se
+parsean los bloques resultantes cuya huella no estaba ya en la sesion: el resto
+del fichero, incluidos los bloques que solo cambian de posicion, reutiliza su
+resultado.
+
+Los bloques se guardan sin posicion, junto a la linea en que empieza cada uno;
+una edicion solo actualiza esas lineas desde el primer bloque editado.
+
+El texto se divide en lineas por "\n", de modo que `text` reproduce exactamente
+el texto de la sesion. Un fichero vacio no tiene lineas ni bloques.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Callable, NamedTuple
+
+from .parser import Block, Location, LocationRange, OutlineParser
+
+__all__ = [
+    "IncrementalParseSession",
+]
+
+
+class _Entry[T](NamedTuple):
+    keyword: str
+    content: tuple[str, ...]
+    fingerprint: bytes
+    result: T
+
+
+def fingerprint(keyword: str, content: tuple[str, ...]) -> bytes:
+    digest = hashlib.blake2b(keyword.encode(), digest_size=16)
+    for line in content:
+        digest.update(b"\n")
+        digest.update(line.encode())
+    return digest.digest()
+
+
+def _split_text(text: str) -> list[str]:
+    return text.split("\n") if text else []
+
+
+def _starts(entries: list[_Entry], first_line: int) -> list[int]:
+    # linea de inicio de cada bloque
+    return list(
+        accumulate((len(entry.content) for entry in entries), initial=first_line)
+    )[:-1]
+
+
+class IncrementalParseSession[T]:
+    """
+    Parseo de un fichero por bloques que solo reparsea los bloques que cambian:
+
+        session = IncrementalParseSession(OutlineParser(["fn"]), parse_block)
+        session.reset(text)
+        session.edit(Location(line=10, column=4), Location(line=10, column=9), "beta")
+        session.results()
+    """
+
+    def __init__(self, outline: OutlineParser, parse: Callable[[Block], T]):
+        self.outline = outline
+        self.parse = parse
+        self.lines: list[str] = []
+        self._entries: list[_Entry[T]] = []
+        self._starts: list[int] = []
+        self.parsed = 0
+        self.reused = 0
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    def reset(self, text: str):
+        """
+        Parsea `text` completo, descartando los resultados anteriores.
+        """
+        self.lines = _split_text(text)
+        self._entries = self._split(self.lines, 0, None, {})
+        self._starts = _starts(self._entries, 0)
+
+    def edit(self, start: Location, end: Location, text: str) -> list[Block]:
+        """
+        Sustituye el texto entre `start` y `end` por `text` y reparsea los
+        bloques afectados. Devuelve los bloques que se han parseado.
+        """
+        lines = self.lines
+        starts = self._starts
+        length = len(lines)
+
+        if not length:
+            # fichero vacio: no hay bloques que reutilizar ni lineas que conservar
+            self.reset(text)
+            return self.blocks()
+
+        prefix = lines[start.line][: start.column] if start.line < length else ""
+        suffix = lines[end.line][end.column :] if end.line < length else ""
+        replacement = (prefix + text + suffix).split("\n")
+        lines[start.line : end.line + 1] = replacement
+        if lines == [""]:
+            # se ha borrado todo el texto
+            self.reset("")
+            return []
+        delta = len(replacement) - (min(end.line, length - 1) - start.line + 1)
+
+        # bloques que contienen las lineas editadas; si la edicion toca la
+        # linea del keyword del primero, su contenido puede unirse al anterior
+        first = max(bisect_right(starts, start.line) - 1, 0)
+        last = max(bisect_right(starts, end.line) - 1, first)
+        if first > 0 and starts[first] == start.line:
+            first -= 1
+
+        # la region termina donde empieza el siguiente bloque, cuya linea de
+        # keyword no ha cambiado
+        region_start = starts[first]
+        region_end = (starts[last + 1] if last + 1 < len(starts) else length) + delta
+        head = self._entries[first].keyword if first > 0 else None
+
+        previous = {
+            entry.fingerprint: entry for entry in self._entries[first : last + 1]
+        }
+        entries = self._split(
+            lines[region_start:region_end], region_start, head, previous
+        )
+        self._entries[first : last + 1] = entries
+        # los bloques editados empiezan en region_start; los siguientes se
+        # desplazan tantas lineas como haya cambiado la longitud del fichero
+        starts[first : last + 1] = _starts(entries, region_start)
+        if delta:
+            following = first + len(entries)
+            starts[following:] = [line + delta for line in starts[following:]]
+
+        blocks = []
+        block_start = region_start
+        for entry in entries:
+            if entry.fingerprint not in previous:
+                blocks.append(self._block(entry, block_start))
+            block_start += len(entry.content)
+        return blocks
+
+    def _split(
+        self,
+        lines: list[str],
+        first_line: int,
+        head: str | None,
+        previous: dict[bytes, _Entry[T]],
+    ) -> list[_Entry[T]]:
+        entries = []
+        for block in self.outline.split_lines(lines, first_line, head):
+            key = fingerprint(block.keyword, block.content)
+            if (entry := previous.get(key)) is not None:
+                self.reused += 1
+            else:
+                self.parsed += 1
+                entry = _Entry(block.keyword, block.content, key, self.parse(block))
+            entries.append(entry)
+        return entries
+
+    def _block(self, entry: _Entry[T], start: int) -> Block:
+        end = start + len(entry.content)
+        return Block(
+            keyword=entry.keyword,
+            content=entry.content,
+            location_range=LocationRange(
+                start=Location(line=start, column=0),
+                end=Location(line=end, column=0),
+            ),
+        )
+
+    def blocks(self) -> list[Block]:
+        return [
+            self._block(entry, start)
+            for entry, start in zip(self._entries, self._starts)
+        ]
+
+    def results(self) -> list[T]:
+        return [entry.result for entry in self._entries]
@@ -1,8 +1,22 @@
-from typing import Optional
+from typing import Any, Mapping, Optional
 from protobase import Object, traits
 
+
 class Rule(Object, traits.Basic):
     name: str
-    file_extension: Optional[str]
-    keyword: Optional[str]
-    
\ No newline at end of file
+    file_extension: Optional[str] = None
+    keyword: Optional[str] = None
+    first_block: Optional[str] = None
+    block_keywords: tuple[str, ...] = ()
+    block_processor: Optional[str] = None
+    block_integrator: Optional[str] = None
+
+    @classmethod
+    def from_conf(cls, conf: Mapping[str, Any]) -> "Rule":
+        """
+        Regla a partir de una entrada de `outline-rules` (axis-conf.yml).
+        """
+        fields = {key.replace("-", "_"): value for key, value in conf.items()}
+        if "block_keywords" in fields:
+            fields["block_keywords"] = tuple(fields["block_keywords"])
+        return cls(**fields)
@@ -51,23 +51,88 @@ class Directive:
     block_keyword: str
 
 
-from protobase import Obj, traits
-from typing import Generator
+import mmap
+import os
+import re
+from protobase import Object, traits
+from typing import Generator, Iterator, Optional, Sequence
 
 
-class Location(Obj, *traits.Common):
+class Location(Object, *traits.Common):
     line: int
     column: int
 
 
-class LocationRange(Obj, *traits.Common):
+class LocationRange(Object, *traits.Common):
     start: Location
     end: Location
 
 
-class Block(Obj, *traits.Common):
+class LineView(Sequence[str]):
+    """
+    Lines of a block as a view over a byte buffer (usually an mmap): only
+    the offsets are stored and lines are decoded on access. Lines end with
+    b"\\n" (a trailing b"\\r" is dropped).
+
+    Compares and hashes as the tuple of its lines, like the content of a
+    Block split from text.
+    """
+
+    __slots__ = ("buffer", "start", "end", "lines", "encoding")
+
+    def __init__(
+        self, buffer, start: int, end: int, lines: int, encoding: str = "utf-8"
+    ):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+        self.lines = lines
+        self.encoding = encoding
+
+    def __len__(self) -> int:
+        return self.lines
+
+    def __iter__(self) -> Iterator[str]:
+        buffer, position, end = self.buffer, self.start, self.end
+        for _ in range(self.lines):
+            newline = buffer.find(b"\n", position, end)
+            line_end = end if newline == -1 else newline
+            yield _decode(buffer[position:line_end], self.encoding)
+            position = line_end + 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        if index < 0:
+            index += self.lines
+        if not 0 <= index < self.lines:
+            raise IndexError("LineView index out of range")
+        for n, line in enumerate(self):
+            if n == index:
+                return line
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LineView | tuple):
+            return len(self) == len(other) and tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+
+    def __repr__(self) -> str:
+        return f"LineView(start={self.start}, end={self.end}, lines={self.lines})"
+
+    def tobytes(self) -> bytes:
+        return self.buffer[self.start : self.end]
+
+
+def _decode(line: bytes, encoding: str) -> str:
+    return line[:-1].decode(encoding) if line.endswith(b"\r") else line.decode(encoding)
+
+
+class Block(Object, *traits.Common):
     keyword: str
-    content: list[str]
+    content: tuple[str, ...] | LineView
     location_range: LocationRange
 
 
@@ -90,13 +155,31 @@ class OutlineParser:
         Returns:
             Generator[Block, None, None]: Generator of Blocks
         """
+        return self.split_lines(text.splitlines())
+
+    def split_lines(
+        self,
+        lines: Sequence[str],
+        first_line: int = 0,
+        head: Optional[str] = None,
+    ) -> Generator[Block, None, None]:
+        """
+        Splits `lines` into Blocks, numbering them from `first_line`.
 
-        lines = text.splitlines()
+        Args:
+            lines (Sequence[str]): Lines to split
+            first_line (int): Line number of the first line
+            head (str, optional): Keyword of the lines before the first keyword
+                line, by default the parser head
 
-        block_keyword = self.head
+        Returns:
+            Generator[Block, None, None]: Generator of Blocks
+        """
+
+        block_keyword = self.head if head is None else head
         block_content = []
-        block_start_location = Location(line=0, column=0)
-        for n, line in enumerate(lines):
+        block_start_location = Location(line=first_line, column=0)
+        for n, line in enumerate(lines, first_line):
             si = line.find(" ")
 
             if si == -1:
@@ -110,7 +193,7 @@ class OutlineParser:
                     block_end_location = Location(line=n, column=len(line))
                     yield Block(
                         keyword=block_keyword,
-                        content=block_content,
+                        content=tuple(block_content),
                         location_range=LocationRange(
                             start=block_start_location, end=block_end_location
                         ),
@@ -121,6 +204,83 @@ class OutlineParser:
             else:
                 block_content.append(line)
 
+        if block_content:
+            end = first_line + len(lines)
+            yield Block(
+                keyword=block_keyword,
+                content=tuple(block_content),
+                location_range=LocationRange(
+                    start=block_start_location,
+                    end=Location(line=end, column=0),
+                ),
+            )
+
+    def parse_outline_file(
+        self, path: str | os.PathLike, encoding: str = "utf-8"
+    ) -> Generator[Block, None, None]:
+        """
+        Generator of the Blocks of the file at `path`, memory-mapped: the file
+        is never read as a whole and the content of each Block is a LineView
+        into the mapping, which stays open while any view is alive.
+
+        Keyword lines are found with a regular expression over the mapping, so
+        lines are not visited one by one; only the line count of each block
+        copies its bytes, transiently.
+
+        Args:
+            path (str | os.PathLike): File to parse
+            encoding (str): Encoding of the file
+
+        Returns:
+            Generator[Block, None, None]: Generator of Blocks
+        """
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        keywords = b"|".join(re.escape(k.encode(encoding)) for k in self.keywords)
+        keyword_lines = re.compile(rb"^(%s) " % keywords, re.MULTILINE)
+        matches = keyword_lines.finditer(buffer) if self.keywords else ()
+
+        block_keyword = self.head
+        block_start = 0
+        line = 0
+        for match in matches:
+            start = match.start()
+            if start > block_start:
+                # el bloque acaba con el salto de linea previo al keyword
+                lines = buffer[block_start:start].count(b"\n")
+                newline = buffer.find(b"\n", start)
+                keyword_line = buffer[start : len(buffer) if newline == -1 else newline]
+                yield Block(
+                    keyword=block_keyword,
+                    content=LineView(buffer, block_start, start, lines, encoding),
+                    location_range=LocationRange(
+                        start=Location(line=line, column=0),
+                        end=Location(
+                            line=line + lines,
+                            column=len(_decode(keyword_line, encoding)),
+                        ),
+                    ),
+                )
+                line += lines
+            block_keyword = match.group(1).decode(encoding)
+            block_start = start
+
+        end = len(buffer)
+        if end > block_start:
+            lines = buffer[block_start:end].count(b"\n")
+            lines += not buffer[block_start:end].endswith(b"\n")
+            yield Block(
+                keyword=block_keyword,
+                content=LineView(buffer, block_start, end, lines, encoding),
+                location_range=LocationRange(
+                    start=Location(line=line, column=0),
+                    end=Location(line=line + lines, column=0),
+                ),
+            )
+
 
 parser = OutlineParser(["fn", "type", "use"])
 example = """
@@ -0,0 +1,343 @@
+"""
+Carga de un proyecto: arbol de entidades de outline de un directorio fuente.
+
+Cada fichero cuya extension tiene una regla en `outline-rules` (axis-conf.yml)
+se divide en bloques con los keywords de la regla y el cuerpo de cada bloque se
+parsea con el parser de AXIS. Los ficheros se reparten entre los procesos de un
+pool; cada proceso carga una sola vez el parser (tablas LALR precompiladas, ver
+ast.tables) al arrancar y lo reutiliza para todos sus ficheros.
+
+Reconstruir los AST en el proceso principal cuesta casi tanto como parsearlos,
+y ese proceso es el cuello de botella del pool: los procesos devuelven los AST de
+cada fichero serializados (ast.cache.dumps) y se decodifican, una vez por
+fichero, al leer `blocks` de una de sus entidades.
+
+Los resultados se integran en un unico arbol de SourceEntity, direccionable con
+rutas al estilo de outline:
+
+    project = load_project("src")
+    project.find("/mod:lambda/fn:sin")
+
+Los directorios y los ficheros son modulos (`mod:<nombre>`), de forma que
+`lambda.ax` y el directorio `lambda/` se integran en la misma entidad; los
+bloques de un fichero son entidades hijas de su modulo (`fn:sin`).
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator, Optional, Sequence
+
+import lark
+from protobase import Object, traits
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover
+    yaml = None
+
+from ..ast.ast import Parser
+from ..ast.cache import ParseCache, dumps, loads
+from .model import Rule
+from .parser import Block, OutlineParser
+
+__all__ = [
+    "CONF_PATH",
+    "MODULE_KEYWORD",
+    "ParsedBlock",
+    "SourceEntity",
+    "load_rules",
+    "parse_file",
+    "load_project",
+]
+
+CONF_PATH: Path = Path(__file__).parents[4] / "data" / "axis-conf.yml"
+MODULE_KEYWORD = "mod"
+
+_NAME = re.compile(r"\w+")
+
+
+class ParsedBlock(Object, *traits.Common):
+    """
+    Bloque de un fichero con el AST de su cuerpo, o el error de sintaxis.
+    """
+
+    path: str
+    block: Block
+    ast: Optional[Any] = None
+    error: Optional[str] = None
+
+
+class SourceEntity:
+    """
+    Nodo del arbol de entidades de un proyecto.
+    """
+
+    def __init__(self, keyword: str, name: str, parent: Optional[SourceEntity] = None):
+        self.keyword = keyword
+        self.name = name
+        self.parent = parent
+        self.children: dict[str, SourceEntity] = {}
+        self._blocks: list[ParsedBlock | _LazyBlock] = []
+
+    def __repr__(self) -> str:
+        return f"SourceEntity({self.path!r})"
+
+    @property
+    def blocks(self) -> list[ParsedBlock]:
+        blocks = self._blocks
+        for n, block in enumerate(blocks):
+            if block.__class__ is _LazyBlock:
+                blocks[n] = block.parsed()
+        return blocks
+
+    @property
+    def path(self) -> str:
+        if self.parent is None:
+            return "/"
+        prefix = self.parent.path.rstrip("/")
+        return f"{prefix}/{self.keyword}:{self.name}"
+
+    def child(self, keyword: str, name: str) -> SourceEntity:
+        """
+        Entidad hija `keyword:name`, creandola si no existe.
+        """
+        key = f"{keyword}:{name}"
+        if (entity := self.children.get(key)) is None:
+            entity = self.children[key] = SourceEntity(keyword, name, self)
+        return entity
+
+    def find(self, path: str) -> Optional[SourceEntity]:
+        entity = self
+        for key in filter(None, path.split("/")):
+            if (entity := entity.children.get(key)) is None:
+                return None
+        return entity
+
+    def walk(self) -> Iterator[SourceEntity]:
+        yield self
+        for child in self.children.values():
+            yield from child.walk()
+
+    @property
+    def errors(self) -> list[ParsedBlock]:
+        # los bloques con error nunca son perezosos: no hace falta decodificar
+        return [
+            block
+            for entity in self.walk()
+            for block in entity._blocks
+            if block.__class__ is ParsedBlock and block.error is not None
+        ]
+
+
+class _Trees:
+    """
+    AST serializados de un fichero, decodificados la primera vez que se piden.
+    """
+
+    __slots__ = ("data", "trees")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.trees: Optional[list[Any]] = None
+
+    def __getitem__(self, index: int) -> Any:
+        if self.trees is None:
+            self.trees = loads(self.data)
+            self.data = None
+        return self.trees[index]
+
+
+class _LazyBlock:
+    __slots__ = ("path", "block", "trees", "index")
+
+    def __init__(self, path: str, block: Block, trees: _Trees, index: int):
+        self.path = path
+        self.block = block
+        self.trees = trees
+        self.index = index
+
+    def parsed(self) -> ParsedBlock:
+        return ParsedBlock(path=self.path, block=self.block, ast=self.trees[self.index])
+
+
+def load_rules(path: Path = CONF_PATH) -> list[Rule]:
+    """
+    Reglas de `outline-rules` del fichero de configuracion.
+    """
+    if yaml is None:
+        raise ImportError("load_rules requires PyYAML, install axis[project]")
+    with open(path) as file:
+        conf = yaml.safe_load(file)
+    return [Rule.from_conf(entry) for entry in conf["outline-rules"]]
+
+
+def parse_file(
+    path: str, rule: Rule, cache: Optional[ParseCache] = None
+) -> list[ParsedBlock]:
+    """
+    Divide el fichero `path` en bloques segun `rule` y parsea el cuerpo de cada
+    uno: las lineas que siguen a la del keyword (todas en el bloque de cabecera).
+
+    Con `cache` los arboles del fichero se cargan de la cache si su contenido y
+    la gramatica no han cambiado, y se guardan si ningun bloque tiene errores.
+    """
+    with open(path, encoding="utf-8") as file:
+        text = file.read()
+
+    outline = OutlineParser(list(rule.block_keywords), head=rule.keyword)
+    blocks = list(outline.parse_outline_blocks(text))
+
+    if cache is not None:
+        key = cache.key(text, rule.keyword or "", *rule.block_keywords)
+        if (trees := cache.load(key, count=True)) is not None:
+            return [
+                ParsedBlock(path=path, block=block, ast=tree)
+                for block, tree in zip(blocks, trees)
+            ]
+
+    parser = Parser()
+    parsed = []
+    for block in blocks:
+        header = block.keyword not in rule.block_keywords
+        body = "\n".join(block.content if header else block.content[1:])
+        if not body.strip():
+            parsed.append(ParsedBlock(path=path, block=block))
+            continue
+        try:
+            parsed.append(ParsedBlock(path=path, block=block, ast=parser.expr(body)))
+        except lark.exceptions.LarkError as error:
+            parsed.append(ParsedBlock(path=path, block=block, error=str(error)))
+
+    if cache is not None and all(block.error is None for block in parsed):
+        cache.store(key, [block.ast for block in parsed])
+    return parsed
+
+
+def _initialize():
+    # carga las tablas del parser del proceso (ver ast.tables.axis_lark)
+    Parser()
+
+
+type _Serialized = tuple[list[Block | ParsedBlock], Optional[bytes]]
+
+
+def _parse_serialized(
+    path: str, rule: Rule, cache: Optional[ParseCache] = None
+) -> _Serialized:
+    # los bloques con AST viajan como Block y sus arboles en un unico `dumps`;
+    # si no se pueden serializar se devuelven los ParsedBlock completos
+    parsed = parse_file(path, rule, cache)
+    try:
+        data = dumps(*(block.ast for block in parsed if block.ast is not None))
+    except TypeError:
+        return parsed, None
+    return [block.block if block.ast is not None else block for block in parsed], data
+
+
+def _deserialize(path: str, result: _Serialized) -> list[ParsedBlock | _LazyBlock]:
+    entries, data = result
+    if data is None:
+        return entries
+    trees = _Trees(data)
+    blocks = []
+    index = 0
+    for entry in entries:
+        if entry.__class__ is ParsedBlock:
+            blocks.append(entry)
+        else:
+            blocks.append(_LazyBlock(path, entry, trees, index))
+            index += 1
+    return blocks
+
+
+def _sources(root: Path, rules: dict[str, Rule]) -> Iterator[tuple[Path, Rule]]:
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = sorted(d for d in subdirectories if not d.startswith("."))
+        for name in sorted(files):
+            if (rule := rules.get(os.path.splitext(name)[1])) is not None:
+                yield Path(directory) / name, rule
+
+
+def _integrate(
+    project: SourceEntity,
+    root: Path,
+    path: Path,
+    rule: Rule,
+    blocks: list[ParsedBlock | _LazyBlock],
+):
+    module = project
+    for part in path.relative_to(root).with_suffix("").parts:
+        module = module.child(MODULE_KEYWORD, part)
+    for parsed in blocks:
+        block = parsed.block
+        if block.keyword in rule.block_keywords:
+            signature = block.content[0][len(block.keyword) :]
+            if (name := _NAME.search(signature)) is not None:
+                module.child(block.keyword, name.group())._blocks.append(parsed)
+                continue
+        module._blocks.append(parsed)
+
+
+def load_project(
+    root: str | os.PathLike,
+    rules: Optional[Sequence[Rule]] = None,
+    executor: Optional[Executor] = None,
+    max_workers: Optional[int] = None,
+    chunksize: Optional[int] = None,
+    cache: Optional[ParseCache] = None,
+) -> SourceEntity:
+    """
+    Arbol de entidades de los ficheros de `root` con regla en `rules` (por
+    defecto las de axis-conf.yml).
+
+    Sin `executor` los ficheros se parsean en un ProcessPoolExecutor de
+    `max_workers` procesos creado solo para esta carga; con max_workers=1 se
+    parsean en el propio proceso.
+
+    Con `cache` (ver parse_file) cada proceso usa su propia copia: sus
+    contadores de aciertos solo se actualizan con max_workers=1.
+
+    Los AST parseados en otros procesos se decodifican al leer `blocks` de cada
+    entidad (ver el docstring del modulo); `errors` no los decodifica.
+    """
+    root = Path(root)
+    if rules is None:
+        rules = load_rules()
+    by_extension = {rule.file_extension: rule for rule in rules if rule.file_extension}
+    sources = list(_sources(root, by_extension))
+    paths = [str(path) for path, _ in sources]
+    file_rules = [rule for _, rule in sources]
+    caches = [cache] * len(sources)
+
+    project = SourceEntity("", "")
+
+    def integrate(results: Iterator[list[ParsedBlock | _LazyBlock]]):
+        for (path, rule), blocks in zip(sources, results):
+            _integrate(project, root, path, rule, blocks)
+
+    if executor is None and max_workers == 1:
+        integrate(map(parse_file, paths, file_rules, caches))
+        return project
+
+    if chunksize is None:
+        # varios lotes por proceso: reparto equilibrado con poco coste de IPC
+        workers = max_workers or os.cpu_count() or 1
+        chunksize = max(1, len(sources) // (workers * 4))
+
+    if executor is not None:
+        results = executor.map(
+            _parse_serialized, paths, file_rules, caches, chunksize=chunksize
+        )
+        integrate(map(_deserialize, paths, results))
+        return project
+
+    with ProcessPoolExecutor(max_workers, initializer=_initialize) as executor:
+        results = executor.map(
+            _parse_serialized, paths, file_rules, caches, chunksize=chunksize
+        )
+        integrate(map(_deserialize, paths, results))
+    return project
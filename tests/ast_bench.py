@@ -0,0 +1,226 @@
+# %%
+"""
+ast parsing benchmarks
+
+    python tests/ast_bench.py
+"""
+
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from rich import print
+
+from axis.components.ast import ast, tables
+from axis.components.ast.cache import ParseCache, dumps, loads
+from axis.components.outline.incremental import IncrementalParseSession
+from axis.components.outline.model import Rule
+from axis.components.outline.parser import Block, Location, OutlineParser
+from axis.components.outline.project import load_project
+
+
+def measure(name: str, fn, number: int = 1):
+    start = time.perf_counter()
+    for _ in range(number):
+        result = fn()
+    elapsed = (time.perf_counter() - start) / number
+    print(f"{name:<32} {elapsed * 1e3:10.2f} ms")
+    return elapsed, result
+
+
+# %% construccion del parser: gramatica vs tablas LALR precompiladas
+directory = tempfile.mkdtemp()
+
+cold, built = measure("build (grammar)", tables.build_lark)
+first, _ = measure("load_lark (cold, stores)", lambda: tables.load_lark(directory))
+warm, loaded = measure("load_lark (warm)", lambda: tables.load_lark(directory), 10)
+tables.axis_lark()
+shared, _ = measure("axis_lark (singleton)", tables.axis_lark, 1000)
+
+text = "(a, b) -> Object if a > b {a} else {b}"
+assert built.parse(text) == loaded.parse(text)
+print(f"speedup {cold / warm:.1f}x")
+
+
+# %% arbol de Lark + transformacion vs AST construido en linea, 50k lineas
+def source(lines: int) -> str:
+    statements = (
+        f"x{n} = f(a{n}: {n}, b.c{n} * (y - {n}) ** 2, ..rest) "
+        f"if x{n} > {n} {{a}} else {{b}};"
+        for n in range(lines)
+    )
+    return "{\n" + "\n".join(statements) + "\n}"
+
+
+text = source(50_000)
+tree_parser = tables.axis_lark()
+ast_parser = ast.Parser()
+
+
+def two_pass():
+    return ast.BUILDER.transform(tree_parser.parse(text))
+
+
+def peak(fn) -> float:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+separate, expected = measure("parse + transform", two_pass)
+inline, result = measure("parse (inline builder)", lambda: ast_parser.expr(text))
+assert result == expected
+
+print(f"peak parse + transform {peak(two_pass):10.1f} MiB")
+print(f"peak inline builder    {peak(lambda: ast_parser.expr(text)):10.1f} MiB")
+print(f"speedup {separate / inline:.1f}x")
+
+
+# %% reparseo incremental por bloques de outline: fichero completo vs edicion
+def module(functions: int) -> str:
+    return "\n".join(
+        f"fn f{n}\n{{\n"
+        + "\n".join(f"x{k} = g(a: {k}, b.c * (y - {n}) ** 2);" for k in range(10))
+        + "\n}"
+        for n in range(functions)
+    )
+
+
+def parse_block(block: Block) -> ast.Expr:
+    return ast_parser.expr("\n".join(block.content[1:]))
+
+
+text = module(2_000)
+session = IncrementalParseSession(OutlineParser(["fn"]), parse_block)
+
+full, _ = measure("reset (2k blocks)", lambda: session.reset(text))
+line = session.lines.index("x3 = g(a: 3, b.c * (y - 1000) ** 2);")
+edited = Location(line=line, column=len("x3 = g(a: "))
+incremental, reparsed = measure(
+    "edit (1 line)", lambda: session.edit(edited, edited, "1 + "), 10
+)
+assert len(reparsed) == 1
+assert session.results() == [
+    parse_block(block) for block in OutlineParser(["fn"]).split_lines(session.lines)
+]
+print(f"parsed {session.parsed} reused {session.reused}")
+print(f"speedup {full / incremental:.1f}x")
+
+# una sesion vacia es un fichero vacio; el texto se conserva tal cual
+empty = IncrementalParseSession(OutlineParser(["fn"]), parse_block)
+origin = Location(line=0, column=0)
+assert len(empty.edit(origin, origin, module(3) + "\n")) == 3
+assert empty.text == module(3) + "\n"
+
+
+# %% carga de un proyecto de 2k ficheros: en serie vs pool de procesos
+def project(directory: Path, files: int, per_directory: int = 100):
+    for n in range(files):
+        path = directory / f"pkg{n // per_directory}" / f"mod{n}.ax"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(
+            "\n".join(
+                f"fn f{k}\n{{\n  x = g(a: {k}, b.c * (y - {n}) ** 2);\n  x + {k};\n}}"
+                for k in range(5)
+            )
+        )
+
+
+root = Path(tempfile.mkdtemp())
+project(root, 2_000)
+rules = [
+    Rule(
+        name="axis/module", file_extension=".ax", keyword="mod", block_keywords=("fn",)
+    )
+]
+
+serial, expected = measure(
+    "load_project (1 worker)", lambda: load_project(root, rules, max_workers=1)
+)
+workers = os.cpu_count() or 1
+pooled, loaded = measure(
+    f"load_project ({workers} workers)", lambda: load_project(root, rules)
+)
+assert [e.path for e in loaded.walk()] == [e.path for e in expected.walk()]
+assert (
+    loaded.find("/mod:pkg3/mod:mod321/fn:f4").blocks
+    == expected.find("/mod:pkg3/mod:mod321/fn:f4").blocks
+)
+print(f"speedup {serial / pooled:.1f}x on {workers} cores")
+
+# los AST de los procesos se decodifican al leer `blocks`, fuera de la carga
+decoded, blocks = measure(
+    "decode blocks", lambda: [entity.blocks for entity in loaded.walk()]
+)
+assert blocks == [entity.blocks for entity in expected.walk()]
+
+
+# %% division en bloques de un fichero de ~100 MB: texto completo vs mmap
+path = Path(tempfile.mkdtemp()) / "generated.ax"
+with path.open("w") as file:
+    for n in range(200_000):
+        file.write(f"fn f{n}\n{{\n")
+        file.writelines(
+            f"  x{k} = g(a: {k}, b.c * (y - {n}) ** 2);\n" for k in range(12)
+        )
+        file.write("}\n")
+outline = OutlineParser(["fn"])
+
+
+def from_text() -> list[Block]:
+    return list(outline.parse_outline_blocks(path.read_text()))
+
+
+def from_mmap() -> list[Block]:
+    return list(outline.parse_outline_file(path))
+
+
+text_time, text_blocks = measure("parse_outline_blocks (text)", from_text)
+mmap_time, mmap_blocks = measure("parse_outline_file (mmap)", from_mmap)
+assert len(text_blocks) == len(mmap_blocks)
+assert text_blocks[-1] == mmap_blocks[-1]
+del text_blocks, mmap_blocks
+
+print(f"size                   {path.stat().st_size / 2**20:10.1f} MiB")
+print(f"peak text              {peak(from_text):10.1f} MiB")
+print(f"peak mmap              {peak(from_mmap):10.1f} MiB")
+
+
+# %% cache de parseo en disco: compilacion en frio vs proyecto sin cambios
+cache = ParseCache(tempfile.mkdtemp())
+load = lambda: load_project(root, rules, max_workers=1, cache=cache)
+
+cold, _ = measure("load_project (cold cache)", load)
+print(cache)
+warm, cached = measure("load_project (unchanged)", load)
+print(cache, f"hit rate {cache.hit_rate:.0%}")
+assert cached.find("/mod:pkg3/mod:mod321/fn:f4").blocks == (
+    expected.find("/mod:pkg3/mod:mod321/fn:f4").blocks
+)
+print(f"speedup {cold / warm:.1f}x")
+
+# reescribir una entrada no cuenta su tamano dos veces
+key = cache.key("a + b", "expr")
+cache.store(key, [ast_parser.expr("a + b")])
+size = cache._size
+cache.store(key, [ast_parser.expr("a + b")])
+assert cache._size == size
+
+# ida y vuelta del formato, tambien con expresiones tupla como raiz
+trees = [ast_parser.expr(text) for text in ("a + b", "(a, b)", "(1, (c, d), ..x)")]
+assert loads(dumps(*trees, None)) == [*trees, None]
+assert cache.expr("(a, b)") == cache.expr("(a, b)") == trees[1]
+
+# el directorio por defecto cuelga de $AXIS_CACHE_DIR; solo cuentan las cargas
+# con count
+os.environ["AXIS_CACHE_DIR"] = cache.directory
+assert ParseCache().directory == os.path.join(cache.directory, "ast")
+del os.environ["AXIS_CACHE_DIR"]
+hits, misses = cache.hits, cache.misses
+assert cache.load(key) is not None and cache.load("0" * 64) is None
+assert (cache.hits, cache.misses) == (hits, misses)
+assert cache.load("0" * 64, count=True) is None and cache.misses == misses + 1
@@ -3,6 +3,7 @@
 dfg evaluation toolkit
 """
 
+import asyncio
 import operator as op
 from types import FunctionType
 from typing import TypeAlias
@@ -45,6 +46,11 @@ def test_add(a, b):
     return a + b
 
 
+@dfg.compile
+def test_add_swapped(a, b):
+    return b + a
+
+
 @dfg.compile
 def test_apply(x, y, z):
     return test_add(a=x, b=y) * z
@@ -55,10 +61,205 @@ def test_max(a, b):
     return (a > b).switch({True: a, False: b})
 
 
+@dfg.compile
+def test_fold(x):
+    five = dfg.model.Constant.build(2) + dfg.model.Constant.build(3)
+    return (five > dfg.model.Constant.build(4)).switch({True: x * five, False: x})
+
+
 print(dfg.eval(test_add, Tuple(a=10, b=5), scope=GLOBALS))
 print(dfg.eval(test_max, Tuple(a=10, b=5), scope=GLOBALS))
 
 
+@dfg.compile
+def test_collatz(n, steps):
+    two = dfg.model.Constant.build(2)
+    one = dfg.model.Constant.build(1)
+    following = (
+        (n % two)
+        .eq(dfg.model.Constant.build(0))
+        .switch({True: n // two, False: n * dfg.model.Constant.build(3) + one})
+    )
+    return n.eq(one).switch(
+        {
+            True: dfg.Composition.build(
+                n=n,
+                steps=steps,
+                **{dfg.Loop.CONTROL: dfg.model.Constant.build(dfg.Loop.BREAK)},
+            ),
+            False: dfg.Composition.build(n=following, steps=steps + one),
+        }
+    )
+
+
+@dfg.compile
+def test_loop(n):
+    start = dfg.Composition.build(n=n, steps=dfg.model.Constant.build(0))
+    return start.loop(test_collatz)
+
+
+@dfg.compile
+def test_grade(score):
+    return score.switch(
+        {
+            dfg.Range(90, None): dfg.model.Constant.build("A"),
+            dfg.Range(50, 90): dfg.model.Constant.build("B"),
+            dfg.InstanceOf(str): dfg.model.Constant.build("?"),
+            dfg.Switch.DEFAULT: dfg.model.Constant.build("C"),
+        }
+    )
+
+
+print([dfg.eval(test_grade, Tuple(score=s), scope=GLOBALS) for s in (95, 50, 7, "x")])
+print(dfg.eval_linear(test_grade, Tuple(score=89.5), scope=GLOBALS))
+
+print(dfg.eval(test_loop, Tuple(n=27), scope=GLOBALS))
+print(dfg.eval_linear(test_loop, Tuple(n=27), scope=GLOBALS, max_iterations=1000))
+
+print(dfg.eval_linear(test_apply, Tuple(x=10, y=5, z=2), scope=GLOBALS))
+print(dfg.eval_linear(test_max, Tuple(a=10, b=5), scope=GLOBALS))
+
+print(dfg.eval(test_apply, Tuple(x=10, y=5, z=2), scope=GLOBALS, iterative=True))
+print(dfg.eval(test_max, Tuple(a=10, b=5), scope=GLOBALS, iterative=True))
+
+test_fold_optimized, reports = dfg.optimize(test_fold)
+print([(report.name, report.removed, report.rewritten) for report in reports])
+assert reports[0].name == "FoldConstants" and reports[0].rewritten > 0, reports[0]
+print(dfg.eval(test_fold_optimized, Tuple(x=10), scope=GLOBALS))
+
+test_max_python = dfg.to_python(test_max, GLOBALS)
+print(test_max_python(Tuple(a=10, b=5)), test_max_python(Tuple(a=1, b=5)))
+print(dfg.to_python(test_loop, GLOBALS, max_iterations=1000)(Tuple(n=27)))
+
+# un trunk que se llama a si mismo a traves del scope
+FACT = "user", "fact"
+
+
+@dfg.compile
+def fact_base(n):
+    return dfg.model.Constant.build(1)
+
+
+@dfg.compile
+def fact_step(n):
+    return n * dfg.Use.build(FACT)(n=n - dfg.model.Constant.build(1))
+
+
+@dfg.compile
+def test_fact(n):
+    return dfg.Switch.build(
+        n < dfg.model.Constant.build(2),
+        {True: fact_base, False: fact_step},
+        input=dfg.Composition.build(n=n),
+    )
+
+
+FACT_SCOPE = {**GLOBALS, FACT: test_fact}
+assert dfg.eval(test_fact, Tuple(n=5), scope=FACT_SCOPE) == 120
+assert dfg.to_python(test_fact, FACT_SCOPE)(Tuple(n=5)) == 120
+
+cache = dfg.CallCache(maxsize=128)
+for _ in range(3):
+    dfg.eval(test_apply, Tuple(x=10, y=5, z=2), scope=GLOBALS, cache=cache)
+print(cache.info())
+
+# la clave incluye el scope: redefinir ADD no devuelve resultados anteriores
+SUBTRACTING = {**GLOBALS, know.ADD: op.sub}
+assert dfg.eval(test_add, Tuple(a=1, b=2), scope=GLOBALS, cache=cache) == 3
+assert dfg.eval(test_add, Tuple(a=1, b=2), scope=SUBTRACTING, cache=cache) == -1
+assert dfg.eval(test_apply, Tuple(x=1, y=2, z=3), scope=SUBTRACTING, cache=cache) == -3
+
+print(dfg.eval_batch(test_add, dict(a=[10, 1, 7], b=[5, 2, 7]), scope=GLOBALS))
+print(dfg.eval_batch(test_max, dict(a=[10, 1, 7], b=[5, 2, 7]), scope=GLOBALS))
+print(dfg.eval_batch(test_max, dict(a=3, b=5), scope=GLOBALS))
+grades = dfg.eval_batch(test_grade, dict(score=[95, 50, 7, 89.5]), scope=GLOBALS)
+assert list(grades) == ["A", "B", "C", "B"], grades
+print(grades)
+
+_, profile = dfg.eval_profiled(test_apply, Tuple(x=10, y=5, z=2), scope=GLOBALS)
+print(profile.table(limit=5))
+
+shared, report = dfg.share([test_add, test_apply, test_max], anonymous_leaves=True)
+print(report)
+print(dfg.eval(shared[1], Tuple(x=10, y=5, z=2), scope=GLOBALS))
+
+# la suma no es conmutativa con cadenas: a+b y b+a no se comparten
+shared, _ = dfg.share([test_add, test_add_swapped])
+concatenated = [dfg.eval(t, Tuple(a="x", b="y"), scope=GLOBALS) for t in shared]
+assert concatenated == ["xy", "yx"], concatenated
+print(concatenated)
+
+print(dfg.eval_parallel(test_apply, Tuple(x=10, y=5, z=2), scope=GLOBALS))
+print(asyncio.run(dfg.eval_async(test_apply, Tuple(x=10, y=5, z=2), scope=GLOBALS)))
+
+data = dfg.dumps(test_apply, test_loop, test_grade)
+print(len(data), dfg.loads(data) == [test_apply, test_loop, test_grade])
+
+# la clave de la cache cubre las funciones auxiliares y los globales que alcanza
+OFFSET = 1
+
+
+def helper(x):
+    return x + OFFSET
+
+
+def test_helper(x):
+    return helper(x) * x
+
+
+trunk_cache = dfg.TrunkCache("/nonexistent")
+key = trunk_cache.key(test_helper)
+OFFSET = 2
+assert trunk_cache.key(test_helper) != key
+key = trunk_cache.key(test_helper)
+helper = lambda x: x - OFFSET  # noqa: E731
+assert trunk_cache.key(test_helper) != key
+
+store, roots = dfg.NodeStore.from_nodes(test_apply, test_loop, test_grade)
+print(store, store.nodes(roots) == [test_apply, test_loop, test_grade])
+
+# evaluacion sobre los arrays, sin reconstruir los nodos
+apply_root, loop_root, grade_root = roots
+assert dfg.eval_store(store, apply_root, Tuple(x=10, y=5, z=2), scope=GLOBALS) == 30
+assert dfg.eval_store(store, loop_root, Tuple(n=27), scope=GLOBALS) == dfg.eval(
+    test_loop, Tuple(n=27), scope=GLOBALS
+)
+evaluator = dfg.StoreEvaluator(store, GLOBALS)
+assert [evaluator(grade_root, Tuple(score=s)) for s in (95, 50, 7, "x")] == [
+    "A",
+    "B",
+    "C",
+    "?",
+]
+fact_store, (fact_root,) = dfg.NodeStore.from_nodes(test_fact)
+assert dfg.eval_store(fact_store, fact_root, Tuple(n=5), scope=FACT_SCOPE) == 120
+
+session = dfg.IncrementalSession(test_apply, GLOBALS)
+result, recomputed = session.eval(Tuple(x=10, y=5, z=2))
+print(result, len(recomputed))
+result, recomputed = session.eval(Tuple(x=10, y=5, z=3))
+print(result, len(recomputed))
+
+index = dfg.graph_index(test_apply)
+print(index, sorted(index.result_fields), index.fan_out(test_apply.leaf))
+
+rows = (Tuple(a=n, b=10 - n) for n in range(6))
+print(list(dfg.eval_stream(test_max, rows, scope=GLOBALS)))
+rows = (Tuple(a=n, b=10 - n) for n in range(6))
+print(list(dfg.eval_stream(test_max, rows, scope=GLOBALS, chunk_size=4)))
+rows = (Tuple(score=s) for s in (95, 50, 7))
+print(list(dfg.eval_stream(test_grade, rows, scope=GLOBALS, chunk_size=2)))
+
+ENVIRONMENT = dfg.freeze(GLOBALS)
+print(dfg.eval(test_apply, Tuple(x=10, y=5, z=2), scope=ENVIRONMENT))
+result, _ = dfg.eval_profiled(test_apply, Tuple(x=10, y=5, z=2), scope=ENVIRONMENT)
+assert result == 30
+print(
+    len(dfg.bind(test_apply, ENVIRONMENT)),
+    hash(ENVIRONMENT) == hash(dfg.freeze(GLOBALS)),
+)
+
+
 # with dfg.VisualizationContext(Tuple(a=10, b=5), scope=GLOBALS):
 #     dfg.eval(test_max)
 
@@ -0,0 +1,606 @@
+# %%
+"""
+dfg evaluation benchmarks
+
+    python tests/dfg_bench.py
+"""
+
+import asyncio
+import importlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from timeit import timeit
+
+import numpy as np
+
+from rich import print
+
+from axis.components import dfg
+from axis.components.entity import know
+from axis.components.tuple import Tuple
+
+from dfg import GLOBALS, test_add, test_apply, test_fold, test_max
+
+NUMBER = 10_000
+
+
+def bench(name: str, fn, number: int = NUMBER) -> float:
+    elapsed = timeit(fn, number=number)
+    print(f"{name:<32} {elapsed / number * 1e6:10.2f} us/call")
+    return elapsed
+
+
+# %% recursive evaluator vs linear backend
+for trunk, argument in [
+    (test_apply, Tuple(x=10, y=5, z=2)),
+    (test_max, Tuple(a=10, b=5)),
+]:
+    name = trunk.leaf.name
+    recursive = bench(f"eval {name}", lambda: dfg.eval(trunk, argument, scope=GLOBALS))
+    linear = bench(
+        f"eval_linear {name}",
+        lambda: dfg.eval_linear(trunk, argument, scope=GLOBALS),
+    )
+    print(f"speedup {recursive / linear:.1f}x")
+
+
+# %% interpreted vs generated python
+for trunk, argument in [
+    (test_apply, Tuple(x=10, y=5, z=2)),
+    (test_max, Tuple(a=10, b=5)),
+    (test_fold, Tuple(x=10)),
+]:
+    function = dfg.to_python(trunk, GLOBALS)
+    assert function(argument) == dfg.eval(trunk, argument, scope=GLOBALS)
+    name = trunk.leaf.name
+    recursive = bench(f"eval {name}", lambda: dfg.eval(trunk, argument, scope=GLOBALS))
+    linear = bench(
+        f"eval_linear {name}",
+        lambda: dfg.eval_linear(trunk, argument, scope=GLOBALS),
+    )
+    generated = bench(f"to_python {name}", lambda: function(argument))
+    print(
+        f"speedup {recursive / generated:.1f}x over eval, "
+        f"{linear / generated:.1f}x over eval_linear"
+    )
+
+
+# %% row by row vs batch evaluation
+ROWS = 10_000
+rng = np.random.default_rng(0)
+columns = dict(a=rng.integers(0, 100, ROWS), b=rng.integers(0, 100, ROWS))
+rows = [Tuple(a=int(a), b=int(b)) for a, b in zip(columns["a"], columns["b"])]
+
+for trunk in [test_add, test_max]:
+    name = trunk.leaf.name
+    rowwise = bench(
+        f"eval x{ROWS} {name}",
+        lambda: [dfg.eval(trunk, row, scope=GLOBALS) for row in rows],
+        number=1,
+    )
+    batch = bench(
+        f"eval_batch {name}",
+        lambda: dfg.eval_batch(trunk, columns, scope=GLOBALS),
+        number=10,
+    )
+    print(f"speedup {rowwise / (batch / 10):.1f}x")
+
+
+# %% repeated calls with and without the call cache
+cache = dfg.CallCache(maxsize=1024)
+arguments = [Tuple(x=x % 16, y=5, z=2) for x in range(1_000)]
+uncached = bench(
+    "eval x1000 test_apply",
+    lambda: [dfg.eval(test_apply, a, scope=GLOBALS) for a in arguments],
+    number=1,
+)
+cached = bench(
+    "eval x1000 test_apply (cache)",
+    lambda: [dfg.eval(test_apply, a, scope=GLOBALS, cache=cache) for a in arguments],
+    number=1,
+)
+print(f"speedup {uncached / cached:.1f}x {cache.info()}")
+
+
+# %% evaluation before and after the transform pipeline
+test_fold_optimized, reports = dfg.optimize(test_fold)
+print(f"removed {sum(report.removed for report in reports)} nodes")
+before = bench(
+    "eval test_fold", lambda: dfg.eval(test_fold, Tuple(x=10), scope=GLOBALS)
+)
+after = bench(
+    "eval test_fold optimized",
+    lambda: dfg.eval(test_fold_optimized, Tuple(x=10), scope=GLOBALS),
+)
+print(f"speedup {before / after:.1f}x")
+
+
+# %% recursive vs iterative (explicit stack) evaluation
+from axis.components.dfg.model import Constant
+
+CHAIN = 100_000
+DEPTH = 2_000
+
+
+@dfg.compile
+def chain(x):
+    one = Constant.build(1)
+    for _ in range(CHAIN):
+        x = x + one
+    return x
+
+
+def nested(depth: int) -> dfg.Trunk:
+    @dfg.compile
+    def level(v):
+        return v
+
+    for _ in range(depth):
+        inner = level
+
+        @dfg.compile
+        def level(v):
+            return inner(v=v) + Constant.build(1)
+
+    return level
+
+
+deep = nested(DEPTH)
+
+for name, node, argument in [
+    (f"chain {CHAIN}", chain.result, Tuple(x=0)),
+    (f"nested trunks {DEPTH}", deep, Tuple(v=0)),
+]:
+    try:
+        bench(f"eval {name}", lambda: dfg.eval(node, argument, scope=GLOBALS), 1)
+    except RecursionError:
+        print(f"eval {name}: RecursionError")
+    bench(
+        f"eval iterative {name}",
+        lambda: dfg.eval(node, argument, scope=GLOBALS, iterative=True),
+        number=1,
+    )
+
+# trunk evaluation of the chain (children already in post-order) on both paths
+recursive = bench(
+    f"eval {chain.leaf.name}", lambda: dfg.eval(chain, Tuple(x=0), scope=GLOBALS), 1
+)
+iterative = bench(
+    f"eval iterative {chain.leaf.name}",
+    lambda: dfg.eval(chain, Tuple(x=0), scope=GLOBALS, iterative=True),
+    number=1,
+)
+print(f"iterative/recursive {iterative / recursive:.2f}")
+
+
+# %% node sharing across trunks (global value numbering)
+trunks = [test_add, test_apply, test_max, test_fold]
+for anonymous_leaves in (False, True):
+    _, report = dfg.share(trunks, anonymous_leaves=anonymous_leaves)
+    print(
+        f"anonymous_leaves={anonymous_leaves}: "
+        f"{report.distinct_before} -> {report.distinct_after} distinct nodes, "
+        f"{report.bytes_saved} bytes saved"
+    )
+
+
+# %% loops of 1M iterations
+def counter(n: int) -> dfg.Trunk:
+    with dfg.ConstructionContext():
+        i = dfg.Leaf.build("i")
+        # invariante: se calcula una unica vez por ejecucion del loop
+        limit = dfg.model.Constant.build(n // 2) * dfg.model.Constant.build(2)
+        following = (i < limit).switch(
+            {True: i + dfg.model.Constant.build(1), False: i}
+        )
+        return dfg.Trunk.build(following)
+
+
+def counting_loop(n: int) -> dfg.Trunk:
+    with dfg.ConstructionContext():
+        dfg.Leaf.build("main")
+        return dfg.Trunk.build(dfg.model.Constant.build(0).loop(counter(n)))
+
+
+million = counting_loop(1_000_000)
+print(f"invariants {len(dfg.loop_invariants(million.result.iteration))}")
+linear = bench(
+    "linear 1M iterations", lambda: dfg.eval_linear(million, None, scope=GLOBALS), 1
+)
+print(f"linear {linear / 1_000_000:.2e} s/iteration")
+million_python = dfg.to_python(million, GLOBALS)
+generated = bench("to_python 1M iterations", lambda: million_python(None), 1)
+print(f"to_python {generated / 1_000_000:.2e} s/iteration")
+
+# el evaluador recursivo es mas lento por nodo, se mide sobre 100k iteraciones
+hundred_k = counting_loop(100_000)
+recursive = bench(
+    "recursive 100k iterations", lambda: dfg.eval(hundred_k, None, scope=GLOBALS), 1
+)
+iterative = bench(
+    "iterative 100k iterations",
+    lambda: dfg.eval(hundred_k, None, scope=GLOBALS, iterative=True),
+    1,
+)
+print(f"recursive {recursive / 100_000:.2e} s/iteration")
+print(f"linear speedup {recursive * 10 / linear:.1f}x")
+
+
+# %% switch dispatch: decision tree vs linear scan over range patterns
+branches = {dfg.Range(10 * i, 10 * (i + 1)): i for i in range(64)}
+branches[dfg.Switch.DEFAULT] = -1
+dispatcher = dfg.Dispatcher(branches)
+print(dispatcher)
+
+
+rows = [
+    (pattern.conditions().items(), branch)
+    for pattern, branch in branches.items()
+    if pattern is not dfg.Switch.DEFAULT
+]
+
+
+def scan(selector):
+    # cada rama prueba sus condiciones por separado
+    for conditions, branch in rows:
+        if all(
+            condition.test(selector) == expected for condition, expected in conditions
+        ):
+            return branch
+    return branches[dfg.Switch.DEFAULT]
+
+
+selectors = [7 * n % 700 for n in range(100)]
+linear_scan = bench("linear scan", lambda: [scan(s) for s in selectors], 100)
+tree = bench("decision tree", lambda: [dispatcher.select(s) for s in selectors], 100)
+print(f"speedup {linear_scan / tree:.1f}x")
+
+# perfil con una rama caliente y reordenacion guiada por el perfil
+hot = [635] * 100
+dispatcher.profile()
+for selector in hot:
+    dispatcher.select(selector)
+dispatcher.profile(False)
+cold = bench("hot branch", lambda: [dispatcher.select(s) for s in hot], 100)
+dispatcher.reorder()
+warm = bench("hot branch reordered", lambda: [dispatcher.select(s) for s in hot], 100)
+print(f"speedup {cold / warm:.1f}x")
+
+
+# %% profiling overhead (el Evaluator sin perfilar no cambia)
+argument = Tuple(x=10, y=5, z=2)
+plain = bench("eval", lambda: dfg.eval(test_apply, argument, scope=GLOBALS))
+profiled = bench(
+    "eval_profiled", lambda: dfg.eval_profiled(test_apply, argument, scope=GLOBALS)
+)
+print(f"profiling overhead {profiled / plain:.1f}x")
+
+_, profile = dfg.eval_profiled(counting_loop(10_000), None, scope=GLOBALS)
+print(profile.table(limit=5))
+folded = os.path.join(tempfile.gettempdir(), "dfg_loop.folded")
+profile.write_collapsed(folded)
+print(f"collapsed stacks in {folded}")
+
+
+# %% parallel scheduler: Apply independientes en un pool
+def fetch(key, delay):
+    time.sleep(delay)  # entrada/salida simulada
+    return key * 2
+
+
+def burn(n):
+    total = 0
+    for i in range(n):
+        total += i * i % 7
+    return total
+
+
+parallel_scope = dict(GLOBALS, fetch=fetch, burn=burn)
+parallel_scope[dfg.EXPENSIVE] = {"fetch": 0.01, "burn": 0.05}
+
+
+@dfg.compile
+def fetch_all(a, b, c, d):
+    fetch = dfg.Use.build("fetch")
+    delay = dfg.model.Constant.build(0.01)
+    return fetch(a, delay) + fetch(b, delay) + fetch(c, delay) + fetch(d, delay)
+
+
+@dfg.compile
+def burn_all(a, b, c, d):
+    burn = dfg.Use.build("burn")
+    return burn(a) + burn(b) + burn(c) + burn(d)
+
+
+argument = Tuple(a=1, b=2, c=3, d=4)
+serial = bench(
+    "fetch serial", lambda: dfg.eval(fetch_all, argument, scope=parallel_scope), 20
+)
+threads = bench(
+    "fetch thread pool",
+    lambda: dfg.eval_parallel(fetch_all, argument, scope=parallel_scope),
+    20,
+)
+print(f"speedup {serial / threads:.1f}x")
+
+argument = Tuple(a=500_000, b=500_000, c=500_000, d=500_000)
+serial = bench(
+    "burn serial", lambda: dfg.eval(burn_all, argument, scope=parallel_scope), 5
+)
+processes = bench(
+    "burn process pool",
+    lambda: dfg.eval_parallel(burn_all, argument, scope=parallel_scope, kind="process"),
+    5,
+)
+print(f"speedup {serial / processes:.1f}x (cpus {os.cpu_count()})")
+
+
+# %% asyncio: Apply independientes de funciones corutina
+async def fetch_async(key, delay):
+    await asyncio.sleep(delay)  # entrada/salida simulada
+    return key * 2
+
+
+async_scope = dict(GLOBALS, fetch=fetch_async)
+
+
+@dfg.compile
+def fetch_chain(a, b, c, d):
+    # camino critico de dos llamadas: cuatro fetch independientes y uno final
+    fetch = dfg.Use.build("fetch")
+    delay = dfg.model.Constant.build(0.01)
+    first = fetch(a, delay) + fetch(b, delay) + fetch(c, delay) + fetch(d, delay)
+    return fetch(first, delay)
+
+
+async def sequential(a, b, c, d):
+    first = 0
+    for key in (a, b, c, d):
+        first += await fetch_async(key, 0.01)
+    return await fetch_async(first, 0.01)
+
+
+argument = Tuple(a=1, b=2, c=3, d=4)
+assert asyncio.run(sequential(1, 2, 3, 4)) == asyncio.run(
+    dfg.eval_async(fetch_chain, argument, scope=async_scope)
+)
+serial = bench(
+    "fetch awaited in sequence", lambda: asyncio.run(sequential(1, 2, 3, 4)), 20
+)
+concurrent = bench(
+    "fetch eval_async",
+    lambda: asyncio.run(dfg.eval_async(fetch_chain, argument, scope=async_scope)),
+    20,
+)
+limited = bench(
+    "fetch eval_async concurrency 2",
+    lambda: asyncio.run(
+        dfg.eval_async(
+            fetch_chain, argument, scope=async_scope, concurrency={"fetch": 2}
+        )
+    ),
+    20,
+)
+print(f"speedup {serial / concurrent:.1f}x, with limit {serial / limited:.1f}x")
+
+
+# %% startup: compilar un modulo de 300 funciones vs cargarlas de la TrunkCache
+FUNCTION = """
+@compile
+def f{n}(a, b, c):
+    k = Constant.build({n})
+    x = (a + b) * c - k
+    y = x * x + a
+    return (y - x) // (c + k) + (a < b)
+"""
+
+
+def write_module(directory: str, name: str, compile: str):
+    with open(os.path.join(directory, f"{name}.py"), "w") as file:
+        file.write("from axis.components import dfg\n\n")
+        file.write(f"Constant = dfg.model.Constant\ncompile = {compile}\n")
+        file.write("".join(FUNCTION.format(n=n) for n in range(300)))
+
+
+def import_fresh(name: str):
+    sys.modules.pop(name, None)
+    return importlib.import_module(name)
+
+
+with tempfile.TemporaryDirectory() as directory:
+    cache = dfg.TrunkCache(os.path.join(directory, "cache"))
+    write_module(directory, "dfg_startup_plain", "dfg.compile")
+    write_module(
+        directory,
+        "dfg_startup_cached",
+        f"dfg.compile_cached(cache=dfg.TrunkCache({cache.directory!r}))",
+    )
+    sys.path.insert(0, directory)
+    importlib.invalidate_caches()
+
+    def cold():
+        cache.clear()
+        import_fresh("dfg_startup_cached")
+
+    plain = bench("startup dfg.compile", lambda: import_fresh("dfg_startup_plain"), 5)
+    cold_time = bench("startup cold (trace + store)", cold, 5)
+    warm = bench("startup warm (load)", lambda: import_fresh("dfg_startup_cached"), 5)
+    # los nodos cargados vuelven a ser hash-consed
+    assert import_fresh("dfg_startup_cached").f7 is import_fresh("dfg_startup_plain").f7
+    print(
+        f"warm speedup {plain / warm:.1f}x vs compile, {cold_time / warm:.1f}x vs cold"
+    )
+    sys.path.remove(directory)
+
+
+# %% memoria: nodos del modelo vs NodeStore (struct of arrays), 1M nodos
+# (construir el grafo del modelo bajo tracemalloc tarda unos minutos)
+STEPS = 500_000  # dos nodos distintos por paso: Composition y Apply
+
+
+def chain_model(steps: int) -> dfg.Trunk:
+    with dfg.ConstructionContext():
+        x = dfg.Leaf.build("chain")
+        for i in range(steps):
+            x = x + dfg.model.Constant.build(i % 1000)
+        return dfg.Trunk.build(x)
+
+
+def chain_store(steps: int) -> tuple[dfg.NodeStore, int]:
+    store = dfg.NodeStore()
+    children = [store.leaf("chain")]
+    x = children[0]
+    add = store.use(know.ADD)
+    constants = {}
+    for i in range(steps):
+        if (constant := constants.get(i % 1000)) is None:
+            constant = constants[i % 1000] = store.constant(i % 1000)
+        composition = store.composition((0, 1), (x, constant))
+        x = store.apply(add, composition)
+        children.extend((add, constant, composition, x))
+    return store, store.trunk(children, x)
+
+
+def traced(fn, *args):
+    tracemalloc.start()
+    try:
+        result = fn(*args)
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+trunk, model_bytes = traced(chain_model, STEPS)
+(store, root), store_bytes = traced(chain_store, STEPS)
+nodes = len(store)
+print(f"model      {model_bytes / nodes:8.1f} bytes/node ({nodes} nodes)")
+print(f"NodeStore  {store_bytes / nodes:8.1f} bytes/node")
+print(f"reduction  {model_bytes / store_bytes:.1f}x")
+
+converted, [converted_root] = dfg.NodeStore.from_nodes(trunk)
+assert len(converted) == nodes and converted.node(converted_root) is trunk
+del trunk, converted
+
+# evaluar sobre los arrays evita reconstruir los nodos del modelo
+rebuilt = bench(
+    "eval (store.node)", lambda: dfg.eval(store.node(root), 0, scope=GLOBALS), 1
+)
+direct = bench("eval_store", lambda: dfg.eval_store(store, root, 0, scope=GLOBALS), 1)
+assert dfg.eval_store(store, root, 0, scope=GLOBALS) == sum(
+    i % 1000 for i in range(STEPS)
+)
+print(f"speedup {rebuilt / direct:.1f}x")
+del store
+
+
+# %% reevaluacion incremental: un campo de 64 cambia
+def wide(fields: int, depth: int) -> dfg.Trunk:
+    with dfg.ConstructionContext():
+        leaf = dfg.Leaf.build("wide")
+        total = None
+        for n in range(fields):
+            x = leaf.attr(f"f{n}")
+            for i in range(depth):
+                x = x * dfg.model.Constant.build(3) + dfg.model.Constant.build(i)
+            total = x if total is None else total + x
+        return dfg.Trunk.build(total)
+
+
+wide_trunk = wide(64, 8)
+base = {f"f{n}": n for n in range(64)}
+arguments = [Tuple(dict(base, f63=value)) for value in range(100)]
+
+session = dfg.IncrementalSession(wide_trunk, GLOBALS)
+session.eval(arguments[0])
+_, recomputed = session.eval(arguments[1])
+print(f"recomputed {len(recomputed)} of {len(session.dependencies)} nodes")
+
+full = bench(
+    "eval (full)",
+    lambda: [dfg.eval(wide_trunk, a, scope=GLOBALS) for a in arguments],
+    10,
+)
+incremental = bench(
+    "IncrementalSession", lambda: [session.eval(a) for a in arguments], 10
+)
+assert session.eval(arguments[7])[0] == dfg.eval(wide_trunk, arguments[7], GLOBALS)
+print(f"speedup {full / incremental:.1f}x")
+
+
+# %% indice de dependencias: consultas con GraphIndex vs recorridos completos
+def users_by_traversal(trunk: dfg.Trunk, entity) -> list:
+    return [
+        node
+        for node in dfg.linear.schedule(trunk)
+        if isinstance(node, dfg.Apply)
+        and isinstance(node.function, dfg.Use)
+        and node.function.entity is entity
+    ]
+
+
+index = dfg.graph_index(wide_trunk)
+entity = know.GET_ATTR
+assert index.applications(entity) == users_by_traversal(wide_trunk, entity)
+
+traversal = bench(
+    "applications (traversal)", lambda: users_by_traversal(wide_trunk, entity), 100
+)
+indexed = bench("applications (GraphIndex)", lambda: index.applications(entity), 100)
+print(f"speedup {traversal / indexed:.1f}x")
+
+
+# %% streaming: eval por fila vs eval_stream (un array de registros) vs bloques
+stream_trunk = wide(8, 8)
+stream_rows = [Tuple({f"f{n}": n + row for n in range(8)}) for row in range(2_000)]
+
+per_row = bench(
+    "eval per row",
+    lambda: [dfg.eval(stream_trunk, row, scope=GLOBALS) for row in stream_rows],
+    5,
+)
+linear_row = bench(
+    "eval_linear per row",
+    lambda: [dfg.eval_linear(stream_trunk, row, scope=GLOBALS) for row in stream_rows],
+    5,
+)
+streamed = bench(
+    "eval_stream",
+    lambda: list(dfg.eval_stream(stream_trunk, iter(stream_rows), scope=GLOBALS)),
+    5,
+)
+chunked = bench(
+    "eval_stream (chunk_size=500)",
+    lambda: list(
+        dfg.eval_stream(stream_trunk, iter(stream_rows), scope=GLOBALS, chunk_size=500)
+    ),
+    5,
+)
+assert list(dfg.eval_stream(stream_trunk, stream_rows, scope=GLOBALS)) == list(
+    dfg.eval_stream(stream_trunk, stream_rows, scope=GLOBALS, chunk_size=500)
+)
+print(
+    f"speedup stream {per_row / streamed:.1f}x "
+    f"(vs linear {linear_row / streamed:.1f}x), chunked {per_row / chunked:.1f}x"
+)
+
+
+# %% resolucion de Use: cadena de scopes vs Bindings, segun la profundidad
+environment = dfg.freeze(GLOBALS)
+use = dfg.Use(entity=know.ADD)
+bindings = dfg.bind(test_add, environment)
+assert use in bindings
+
+for depth in (1, 8, 64):
+    chained = dfg.Evaluator(None, scope=GLOBALS)
+    bound = dfg.Evaluator(None, scope=environment, bindings=bindings)
+    for _ in range(depth - 1):
+        chained = chained.subevaluator(None)
+        bound = bound.subevaluator(None)
+    scoped = bench(
+        f"process_use scope (depth {depth})", lambda: chained.process_use(use)
+    )
+    direct = bench(f"process_use bound (depth {depth})", lambda: bound.process_use(use))
+    print(f"speedup {scoped / direct:.1f}x")
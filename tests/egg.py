@@ -29,3 +29,46 @@ expr2 = egraph.let("expr2", Num(6) + Num(2) * Num.var("x"))
 
 
 egraph.saturate()
+
+
+# %% equality saturation over a dfg trunk
+from axis.components import dfg
+from axis.components.dfg.model import Constant
+from axis.components.dfg.saturation import INTEGER_RULES, EqualitySaturation
+from axis.components.tuple import Tuple
+
+from dfg import GLOBALS
+
+
+@dfg.compile
+def test_distribute(x, y):
+    return x * Constant.build(2) + x * Constant.build(3) + y
+
+
+saturation = EqualitySaturation(INTEGER_RULES, max_iterations=8, time_limit=0.5)
+optimized, reports = dfg.optimize(
+    test_distribute, [saturation, dfg.EliminateDeadNodes()]
+)
+print([(report.name, report.removed, report.rewritten) for report in reports])
+print(dfg.eval(test_distribute, Tuple(x=4, y=1), scope=GLOBALS))
+print(dfg.eval(optimized, Tuple(x=4, y=1), scope=GLOBALS))
+
+
+# %% the default rules only fold constants: string concatenation keeps its order
+@dfg.compile
+def test_concat(a, b):
+    return b + a + b
+
+
+optimized, _ = dfg.optimize(test_concat, [EqualitySaturation()])
+assert dfg.eval(optimized, Tuple(a="x", b="y"), scope=GLOBALS) == "yxy"
+
+
+# %% a fold that overflows i64 leaves the trunk unchanged
+@dfg.compile
+def test_overflow(x):
+    return Constant.build(2**62) + Constant.build(2**62) + x
+
+
+optimized, _ = dfg.optimize(test_overflow, [EqualitySaturation()])
+assert dfg.eval(optimized, Tuple(x=1), scope=GLOBALS) == 2**63 + 1
@@ -1,5 +1,6 @@
 import unittest
-from axis.front.syn.ast import Parser, Infix, Prefix, Lit, Id
+from axis.components.ast import op
+from axis.components.ast.ast import BUILDER, Parser, Infix, Prefix, Lit, Id
 from rich import print
 
 
@@ -18,6 +19,26 @@ class TestParser(unittest.TestCase):
     def test_tuple(self):
         self.print_expr_ast("(a: 1, 2, ..4)")
 
+    def test_inline_builder(self):
+        ast = self.expr_parser.expr("-a + 1")
+        self.assertIsInstance(ast, Infix)
+        self.assertEqual(ast.op, op.ADD)
+        self.assertIsInstance(ast.lhs, Prefix)
+        self.assertEqual(ast.rhs.value, 1)
+
+    def test_builder_coverage(self):
+        rules = {
+            rule.alias or rule.options.template_source or rule.origin.name
+            for rule in self.expr_parser.lark.rules
+            if rule.alias or not rule.options.expand1
+        }
+        missing = {
+            name
+            for name in rules
+            if not name.startswith("_") and not hasattr(BUILDER, name)
+        }
+        self.assertEqual(missing, set())
+
 
 if __name__ == "__main__":
     unittest.main()